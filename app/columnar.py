@@ -0,0 +1,207 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import os
+import sys
+import glob
+import shutil
+import warnings
+
+# ============================================
+# 定数
+# ============================================
+DATA_PATH = "data/"
+
+# 年で分割した列指向ファイル（Parquet）の配置先: {COLUMNAR_DIR}/{テーブル名}/{年の列}={年}/part-0.parquet
+COLUMNAR_DIR = os.environ.get("INBOUND_COLUMNAR_DIR", os.path.join(DATA_PATH, "columnar"))
+COMPRESSION = "zstd"
+
+# テーブル名: (CSVファイル名, 年の列, 国・地域の列)
+SOURCE_TABLES = {
+    'visitors': ('inbound_visiter.csv', 'Year', 'Country/Area'),
+    'spending': ('inbound_spending.csv', 'year', 'country'),
+    'destination': ('inbound_destination.csv', 'Year', None),
+    'action': ('inbound_action.csv', 'Year', 'Country/Area'),
+}
+
+# テーブルごとの列の型（変換時は型推論を行わず、この定義で読み込む）
+TABLE_SCHEMAS = {
+    'visitors': pa.schema([
+        ('Year', pa.int64()),
+        ('Month_Numeric', pa.int64()),
+        ('Country/Area', pa.string()),
+        ('Visitor_Numeric', pa.int64()),
+    ]),
+    'spending': pa.schema([
+        ('year', pa.int64()),
+        ('country', pa.string()),
+        ('Quarter', pa.string()),
+        ('expense_items', pa.string()),
+        ('details', pa.string()),
+        ('consumption_unit', pa.float64()),
+        ('composition_ratio', pa.float64()),
+    ]),
+    'destination': pa.schema([
+        ('Year', pa.int64()),
+        ('Prefecture', pa.string()),
+        ('Visit Rate(%)', pa.float64()),
+    ]),
+    'action': pa.schema([
+        ('Country/Area', pa.string()),
+        ('Year', pa.int64()),
+        ('Action', pa.string()),
+        ('Composition ratio', pa.float64()),
+    ]),
+}
+
+
+# ============================================
+# ファイル配置
+# ============================================
+
+def get_partition_dir(table):
+    """
+    テーブルの年分割ファイルのディレクトリを返す。
+    """
+    return os.path.join(COLUMNAR_DIR, table)
+
+
+def list_partition_files(table):
+    """
+    テーブルの年分割ファイルの一覧を返す（変換前は空のリスト）。
+    """
+    return sorted(glob.glob(os.path.join(get_partition_dir(table), '*', '*.parquet')))
+
+
+def has_current_partitions(table, data_path=DATA_PATH):
+    """
+    年分割ファイルがあり、かつ CSV より新しいか（CSV から変換した後に CSV が更新されていないか）を返す。
+    CSV の方が新しい場合は、変換後に CSV が編集・置換されたものとして False を返します（警告を表示し、CSV を読み込むため）。
+    """
+    partition_files = list_partition_files(table)
+    if not partition_files:
+        return False
+
+    filename, _, _ = SOURCE_TABLES[table]
+    csv_path = os.path.join(data_path, filename)
+    if not os.path.exists(csv_path):
+        return True
+    if os.path.getmtime(csv_path) > min(os.path.getmtime(path) for path in partition_files):
+        warnings.warn(
+            f"'{csv_path}' が年分割ファイルより新しいため、CSV を読み込みます。"
+            f"python -m app.columnar convert {table} で再変換してください。",
+            stacklevel=2
+        )
+        return False
+    return True
+
+
+def _partitioning(table):
+    _, year_col, _ = SOURCE_TABLES[table]
+    return ds.partitioning(pa.schema([TABLE_SCHEMAS[table].field(year_col)]), flavor='hive')
+
+
+# ============================================
+# CSV → 列指向ファイルへの変換
+# ============================================
+
+def convert_table(table, data_path=DATA_PATH):
+    """
+    CSV を定義済みの型で読み込み、年ごとのディレクトリに分割した圧縮 Parquet として書き出す。
+    一時ディレクトリに書き出してから置き換えるため、変換中も既存のファイルは読み込めます（CSVから消えた年も残りません）。
+    整数の列は、欠損がある列を pandas が書き出した CSV（「2227688.0」のような表記）も読めるよう小数として読み込み、
+    整数の型へ変換します（欠損は null として残り、小数部がある値はエラーとなります）。
+
+    Returns:
+        int: 書き出した行数
+    """
+    filename, _, _ = SOURCE_TABLES[table]
+    schema = TABLE_SCHEMAS[table]
+    read_schema = pa.schema([
+        pa.field(field.name, pa.float64()) if pa.types.is_integer(field.type) else field for field in schema
+    ])
+    table_data = pa_csv.read_csv(
+        os.path.join(data_path, filename),
+        convert_options=pa_csv.ConvertOptions(column_types=read_schema, include_columns=schema.names)
+    )
+    table_data = table_data.select(schema.names).cast(schema)
+
+    partition_dir = get_partition_dir(table)
+    temp_dir = partition_dir + ".tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    ds.write_dataset(
+        table_data,
+        temp_dir,
+        format='parquet',
+        partitioning=_partitioning(table),
+        basename_template='part-{i}.parquet',
+        file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESSION),
+    )
+
+    shutil.rmtree(partition_dir, ignore_errors=True)
+    os.replace(temp_dir, partition_dir)
+    return table_data.num_rows
+
+
+def convert_all(data_path=DATA_PATH):
+    """
+    CSV が存在する全てのテーブルを変換する。
+
+    Returns:
+        dict: {テーブル名: 書き出した行数}
+    """
+    results = {}
+    for table, (filename, _, _) in SOURCE_TABLES.items():
+        if os.path.exists(os.path.join(data_path, filename)):
+            results[table] = convert_table(table, data_path)
+    return results
+
+
+# ============================================
+# 読込（列指向ファイル優先、なければ CSV）
+# ============================================
+
+def read_table(table, columns=None, years=None, data_path=DATA_PATH):
+    """
+    テーブルを DataFrame で読み込む。年分割ファイルがあれば、years に該当する年のディレクトリと columns の列のみを読み込み、
+    なければ CSV を読み込んで同じ絞り込みを行います（どちらもない場合は FileNotFoundError）。
+    年分割ファイルより CSV の方が新しい場合は、CSV の更新を反映するため CSV を読み込みます。
+    """
+    filename, year_col, _ = SOURCE_TABLES[table]
+
+    if has_current_partitions(table, data_path):
+        dataset = ds.dataset(get_partition_dir(table), format='parquet', partitioning=_partitioning(table))
+        row_filter = ds.field(year_col).isin([int(y) for y in years]) if years is not None else None
+        df = dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+        # 分割の列はディレクトリ名から復元されるため、列の順序を CSV と揃える
+        ordered = [col for col in TABLE_SCHEMAS[table].names if col in df.columns]
+        return df[ordered]
+
+    usecols = columns
+    if columns is not None and years is not None and year_col not in columns:
+        usecols = list(columns) + [year_col]
+    df = pd.read_csv(os.path.join(data_path, filename), usecols=usecols, encoding='utf_8_sig')
+    if years is not None:
+        df = df[df[year_col].isin(years)].reset_index(drop=True)
+    if usecols is not columns:
+        df = df.drop(columns=[year_col])
+    return df
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python -m app.columnar convert            ... CSV が存在する全てのテーブルを変換する
+    #   python -m app.columnar convert visitors   ... 指定したテーブルのみを変換する
+    command = sys.argv[1] if len(sys.argv) > 1 else "convert"
+    if command != "convert":
+        sys.exit(f"不明なコマンドです: {command}（convert を指定してください）")
+
+    tables = sys.argv[2:]
+    unknown = [table for table in tables if table not in SOURCE_TABLES]
+    if unknown:
+        sys.exit(f"不明なテーブルです: {unknown}（{', '.join(SOURCE_TABLES)} から指定してください）")
+
+    results = {table: convert_table(table) for table in tables} if tables else convert_all()
+    for table, n_rows in results.items():
+        print(f"{table}: {n_rows} 行を '{get_partition_dir(table)}' に保存しました。")
@@ -0,0 +1,143 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+from app.countries import AGGREGATE_COUNTRY
+from app.facts import pivot_visitors
+
+# ============================================
+# 定数
+# ============================================
+TOP_N_LIST = (5, 10)
+
+
+# ============================================
+# 集中度指標（全期間を一括計算）
+# ============================================
+
+def _sorted_rows(df_wide):
+    """
+    行（期間）ごとに値を昇順ソートした配列と、有効値（NaN 以外）の件数を返す。
+    NaN は各行の末尾に並ぶため、先頭 n 件が有効値となります。
+    """
+    X = df_wide.to_numpy(dtype=float)
+    X_sorted = np.sort(X, axis=1)
+    n = (~np.isnan(X)).sum(axis=1)
+    return X_sorted, n
+
+
+@st.cache_data(show_spinner=False)
+def compute_concentration(df_wide, top_n_list=TOP_N_LIST):
+    """
+    行: 期間, 列: 対象（都道府県・国など）のワイド表から、全期間の集中度指標を一括で計算する。
+    期間ごとのループやソートの繰り返しは行わず、1回の行方向ソートと配列演算で求めます。
+    欠測（NaN）の対象はその期間の計算から除外します。
+
+    Returns:
+        DataFrame (index: 期間):
+            n_units, total, gini, hhi, hhi_normalized, top{N}_sum, top{N}_share
+    """
+    X_sorted, n = _sorted_rows(df_wide)
+    valid = ~np.isnan(X_sorted)
+    X_filled = np.where(valid, X_sorted, 0.0)
+    total = X_filled.sum(axis=1)
+
+    # 昇順の順位 i (1..n) を用いたジニ係数: G = Σ(2i - n - 1)·x_i / (n·Σx)
+    rank = np.arange(1, X_sorted.shape[1] + 1)
+    weights = np.where(valid, 2 * rank[None, :] - n[:, None] - 1, 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gini = (weights * X_filled).sum(axis=1) / (n * total)
+        shares = X_filled / total[:, None]
+        hhi = (shares ** 2).sum(axis=1)
+        hhi_normalized = (hhi - 1 / n) / (1 - 1 / n)
+
+    # 合計がゼロの期間は notebook と同様に 0 とする
+    zero_total = total == 0
+    gini = np.where(zero_total, 0.0, gini)
+    hhi = np.where(zero_total, 0.0, hhi)
+    hhi_normalized = np.where(zero_total | (n <= 1), 0.0, hhi_normalized)
+
+    result = pd.DataFrame({
+        'n_units': n,
+        'total': total,
+        'gini': gini,
+        'hhi': hhi,
+        'hhi_normalized': hhi_normalized,
+    }, index=df_wide.index)
+
+    # 上位N件: 有効値の末尾（降順の先頭）から N 件の合計
+    cumsum_desc = np.cumsum(X_filled[:, ::-1], axis=1)
+    n_invalid = X_sorted.shape[1] - n
+    for top_n in top_n_list:
+        end_pos = np.minimum(n_invalid + np.minimum(top_n, n), X_sorted.shape[1]) - 1
+        top_sum = np.where(n > 0, cumsum_desc[np.arange(len(n)), np.maximum(end_pos, 0)], 0.0)
+        result[f'top{top_n}_sum'] = top_sum
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result[f'top{top_n}_share'] = np.where(zero_total, 0.0, top_sum / total)
+
+    return result
+
+
+@st.cache_data(show_spinner=False)
+def compute_lorenz_curves(df_wide):
+    """
+    全期間のローレンツ曲線（対象の累積比率 × 値の累積比率）をロング形式で返す。
+
+    Returns:
+        DataFrame: period, cum_population_share, cum_value_share（各期間とも原点 (0, 0) を含む）
+    """
+    X_sorted, n = _sorted_rows(df_wide)
+    valid = ~np.isnan(X_sorted)
+    X_filled = np.where(valid, X_sorted, 0.0)
+    total = X_filled.sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cum_value_share = np.cumsum(X_filled, axis=1) / total[:, None]
+        cum_population_share = np.arange(1, X_sorted.shape[1] + 1)[None, :] / n[:, None]
+
+    # 原点を先頭に追加し、有効値の範囲のみ残す
+    n_periods = len(df_wide.index)
+    cum_value_share = np.hstack([np.zeros((n_periods, 1)), cum_value_share])
+    cum_population_share = np.hstack([np.zeros((n_periods, 1)), cum_population_share])
+    keep = np.hstack([np.ones((n_periods, 1), dtype=bool), valid]) & (total > 0)[:, None]
+
+    periods = np.repeat(df_wide.index.to_numpy(), keep.shape[1]).reshape(keep.shape)
+    return pd.DataFrame({
+        'period': periods[keep],
+        'cum_population_share': cum_population_share[keep],
+        'cum_value_share': cum_value_share[keep],
+    })
+
+
+# ============================================
+# 国籍・地域（送客市場）別の集中度
+# ============================================
+
+# 集中度の計算から除外する集計列
+AGGREGATE_COLUMNS = [AGGREGATE_COUNTRY]
+
+
+def compute_share_matrix(df_wide):
+    """
+    各期間の合計に対する各対象の構成比（0〜1）を一括で計算する。
+    """
+    total = df_wide.sum(axis=1, min_count=1)
+    return df_wide.div(total, axis=0)
+
+
+@st.cache_data(show_spinner=False)
+def compute_source_market_concentration(data_version, window=1, top_n_list=(3, 5), exclude_columns=tuple(AGGREGATE_COLUMNS), _fact_store=None):
+    """
+    月次の国籍・地域別訪日客数（ファクトストアからピボット）から、全ての月の市場構成比と集中度（HHI・ジニ係数・上位k市場シェア）を計算する。
+    window > 1 の場合は、直近 window か月の合計（ローリング合計）に対して計算します。
+    結果は data_version（_fact_store を取得したデータのバージョン。st.session_state.data_version）単位でキャッシュします。
+
+    Returns:
+        (DataFrame, DataFrame): 集中度指標（index: 月）, 構成比行列（index: 月, columns: 国・地域）
+    """
+    df_markets = pivot_visitors(_fact_store).drop(columns=list(exclude_columns), errors='ignore')
+
+    if window > 1:
+        df_markets = df_markets.rolling(window, min_periods=window).sum().dropna(how='all')
+
+    return compute_concentration(df_markets, top_n_list), compute_share_matrix(df_markets)
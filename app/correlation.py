@@ -0,0 +1,139 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+from scipy import stats
+from app.countries import AGGREGATE_COUNTRY
+
+# ============================================
+# 定数
+# ============================================
+PC_COLUMNS = ['PC1', 'PC2', 'PC3']
+EXCLUDED_COUNTRIES = [AGGREGATE_COUNTRY]
+MIN_OBSERVATIONS = 5 # 相関係数を計算する最小の観測数（国 × 年）
+SIGNIFICANCE_LEVELS = [(0.01, '**'), (0.05, '*')]
+
+METRIC_UNIT = '消費単価 (円)'
+METRIC_RATIO = '費目構成比 (%)'
+
+CORRELATION_METHODS = {
+    'ピアソン': 'pearson',
+    'スピアマン（順位）': 'spearman',
+}
+
+
+# ============================================
+# 国 × 年 の結合表
+# ============================================
+
+@st.cache_data(show_spinner=False)
+def build_behavior_spend_table(df_pca_scores, df_avg_spend, df_market_potential_yearly):
+    """
+    行動PCスコア（国 × 年）に、同じ国・年の費目・細目別の消費単価と費目構成比（四半期の年平均）を結合した表を作成する。
+    行動PCスコアと消費データの両方がある国・年のみを残します。
+    PCスコアのファイルがない場合など、PCスコアに国・年・PC列がない場合は空の結合表と空の指標を返します。
+
+    Returns:
+        (DataFrame, dict): 結合表（country, year, PC列, 消費単価列, 構成比列）, {指標名: [列名]}
+    """
+    pc_columns = [col for col in PC_COLUMNS if col in df_pca_scores.columns]
+    if not pc_columns or 'country' not in df_pca_scores.columns or 'Year' not in df_pca_scores.columns:
+        return pd.DataFrame(columns=['country', 'year']), {}
+    df_pcs = df_pca_scores.rename(columns={'Year': 'year'})[['country', 'year'] + pc_columns]
+
+    # 消費単価: 市場ポテンシャル表の費目 [全体]・細目の列（1人あたり円）
+    unit_columns = [col for col in df_market_potential_yearly.columns if col.endswith(']')]
+    df_unit = df_market_potential_yearly[['country', 'year'] + unit_columns]
+
+    ratio_columns = [col for col in df_avg_spend.columns if col.endswith('_ratio')]
+    df_ratio = df_avg_spend.groupby(level=['year', 'country'])[ratio_columns].mean().reset_index()
+
+    df_joined = (
+        df_pcs
+        .merge(df_unit, on=['country', 'year'], how='inner')
+        .merge(df_ratio, on=['country', 'year'], how='inner')
+    )
+    df_joined = df_joined[~df_joined['country'].isin(EXCLUDED_COUNTRIES)]
+
+    metric_columns = {
+        METRIC_UNIT: unit_columns,
+        METRIC_RATIO: ratio_columns,
+    }
+    return df_joined.sort_values(['country', 'year']).reset_index(drop=True), metric_columns
+
+
+# ============================================
+# 相関行列（PC × 消費項目）の一括計算
+# ============================================
+
+@st.cache_data(show_spinner=False)
+def compute_correlation_matrix(df_joined, x_columns, y_columns, method='pearson'):
+    """
+    x_columns（PC）× y_columns（消費項目）の全ての組み合わせについて、相関係数・p値（両側 t 検定）・観測数を一括で計算する。
+    欠損はペアごとに除外し、観測数・和・二乗和・積和をマスク付きの行列積で同時に求めるため、組み合わせごとのループは行いません。
+    スピアマンの場合は各列を順位に変換してから同じ計算を行います（欠損のある列は、その列の観測値の中での順位）。
+
+    Returns:
+        dict: r, p, n（いずれも DataFrame, index: x_columns, columns: y_columns。観測数が MIN_OBSERVATIONS 未満は NaN）
+    """
+    df_x = df_joined[x_columns].astype(float)
+    df_y = df_joined[y_columns].astype(float)
+    if method == 'spearman':
+        df_x = df_x.rank()
+        df_y = df_y.rank()
+
+    X = df_x.to_numpy()
+    Y = df_y.to_numpy()
+    mask_x = (~np.isnan(X)).astype(float)
+    mask_y = (~np.isnan(Y)).astype(float)
+    X = np.nan_to_num(X)
+    Y = np.nan_to_num(Y)
+
+    # [PC, 項目] ごとの、両方が観測されている行のみの集計量
+    n = mask_x.T @ mask_y
+    sum_x = X.T @ mask_y
+    sum_y = mask_x.T @ Y
+    sum_xx = (X * X).T @ mask_y
+    sum_yy = mask_x.T @ (Y * Y)
+    sum_xy = X.T @ Y
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s_xy = sum_xy - sum_x * sum_y / n
+        s_xx = sum_xx - sum_x * sum_x / n
+        s_yy = sum_yy - sum_y * sum_y / n
+        r = np.clip(s_xy / np.sqrt(s_xx * s_yy), -1.0, 1.0)
+
+        dof = n - 2
+        t = r * np.sqrt(dof / np.maximum(1 - r * r, np.finfo(float).tiny))
+        p = 2 * stats.t.sf(np.abs(t), dof)
+
+    valid = (n >= MIN_OBSERVATIONS) & (s_xx > 0) & (s_yy > 0)
+    r = np.where(valid, r, np.nan)
+    p = np.where(valid, p, np.nan)
+
+    return {
+        'r': pd.DataFrame(r, index=x_columns, columns=y_columns),
+        'p': pd.DataFrame(p, index=x_columns, columns=y_columns),
+        'n': pd.DataFrame(n.astype(int), index=x_columns, columns=y_columns),
+    }
+
+
+def get_significance_mark(p_value):
+    """
+    p値に応じた有意水準の記号（** / * / 空文字）を返す。
+    """
+    if pd.isna(p_value):
+        return ''
+    for level, mark in SIGNIFICANCE_LEVELS:
+        if p_value < level:
+            return mark
+    return ''
+
+
+def find_strongest_pair(correlation):
+    """
+    相関係数の絶対値が最大の (PC, 項目) の組み合わせを返す（全て NaN の場合は None）。
+    """
+    df_abs = correlation['r'].abs()
+    if df_abs.isna().all().all():
+        return None
+    return df_abs.stack().idxmax()
@@ -0,0 +1,156 @@
+import pandas as pd
+import numpy as np
+import re
+import unicodedata
+
+# ============================================
+# 定数
+# ============================================
+AGGREGATE_COUNTRY = '全国籍･地域' # ダッシュボードで使用する全体の表記（半角中点）
+OTHER_COUNTRY = 'その他'
+UNKNOWN_ID_START = 1000 # 国マスタにない国・地域に割り当てるIDの開始番号
+
+# 国マスタ: (ID, ダッシュボードでの表記, 英語表記, 別表記)
+# 別表記は正規化（NFKC・空白と区切り記号の除去・小文字化）したうえで照合するため、中点やスラッシュの違いは列挙不要です。
+COUNTRY_MASTER = [
+    (0, AGGREGATE_COUNTRY, 'All Countries', ['全国籍/地域', '全体', '総数', '合計', 'Total', 'All']),
+    (1, '韓国', 'Korea', ['大韓民国', 'South Korea', 'Republic of Korea']),
+    (2, '中国', 'China', ['中国本土', '中華人民共和国', 'Mainland China']),
+    (3, '台湾', 'Taiwan', []),
+    (4, '香港', 'Hong Kong', ['HongKong']),
+    (5, 'タイ', 'Thailand', []),
+    (6, 'シンガポール', 'Singapore', []),
+    (7, 'マレーシア', 'Malaysia', []),
+    (8, 'インドネシア', 'Indonesia', []),
+    (9, 'フィリピン', 'Philippines', []),
+    (10, 'ベトナム', 'Vietnam', ['Viet Nam']),
+    (11, 'インド', 'India', []),
+    (12, 'オーストラリア', 'Australia', ['豪州']),
+    (13, '米国', 'USA', ['アメリカ', 'アメリカ合衆国', 'United States', 'US', 'U.S.A.']),
+    (14, 'カナダ', 'Canada', []),
+    (15, 'メキシコ', 'Mexico', []),
+    (16, '英国', 'UK', ['イギリス', 'United Kingdom', 'U.K.']),
+    (17, 'フランス', 'France', []),
+    (18, 'ドイツ', 'Germany', []),
+    (19, 'イタリア', 'Italy', []),
+    (20, 'スペイン', 'Spain', []),
+    (21, 'ロシア', 'Russia', []),
+    (22, '北欧地域', 'Nordic Countries', ['北欧']),
+    (23, '中東地域', 'Middle East', ['中東']),
+    (99, OTHER_COUNTRY, 'Others', ['その他の国・地域', 'Other', 'Other Countries']),
+]
+
+
+# ============================================
+# 表記の正規化と国マスタ
+# ============================================
+
+def normalize_country_name(name):
+    """
+    表記ゆれを吸収した照合用のキーを返す（NFKC 正規化後、空白・中点・スラッシュ・ピリオドを除去して小文字化）。
+    NFKC により半角中点「･」は全角中点「・」に揃うため、'全国籍･地域' と '全国籍・地域' は同じキーになります。
+    """
+    if pd.isna(name):
+        return ''
+    key = unicodedata.normalize('NFKC', str(name))
+    key = re.sub(r'[\s・/.\-_]', '', key)
+    return key.casefold()
+
+
+def _build_alias_map():
+    """
+    照合用のキー → 国ID の対応表を作成する（ダッシュボードの表記・英語表記・別表記の全てを登録）。
+    """
+    alias_map = {}
+    for country_id, name, name_en, aliases in COUNTRY_MASTER:
+        for alias in [name, name_en] + aliases:
+            alias_map[normalize_country_name(alias)] = country_id
+    return alias_map
+
+
+ALIAS_MAP = _build_alias_map()
+
+
+def is_aggregate_country(names):
+    """
+    全体（全国籍・地域）を表す表記かどうかを判定する（表記ゆれを含む）。Series を渡した場合は真偽値の Series を返します。
+    """
+    if isinstance(names, pd.Series):
+        return names.map(normalize_country_name).map(ALIAS_MAP).eq(0)
+    return ALIAS_MAP.get(normalize_country_name(names)) == 0
+
+
+def build_country_dimension(*country_series):
+    """
+    国マスタと、各データソースに現れた国・地域名から国ディメンション表を作成する。
+    マスタにない国・地域は、正規化後のキーごとに UNKNOWN_ID_START 以降のIDを（表記の昇順で）割り当て、元の表記をそのまま使用します。
+
+    Returns:
+        DataFrame: country_id, country（ダッシュボードでの表記）, name_en, is_aggregate, in_master
+    """
+    df_dimension = pd.DataFrame(
+        [(country_id, name, name_en) for country_id, name, name_en, _ in COUNTRY_MASTER],
+        columns=['country_id', 'country', 'name_en']
+    )
+    df_dimension['in_master'] = True
+
+    observed = pd.unique(pd.concat([pd.Series(s, dtype=object) for s in country_series], ignore_index=True).dropna())
+    unknown = {}
+    for name in sorted(observed, key=str):
+        key = normalize_country_name(name)
+        if key and key not in ALIAS_MAP and key not in unknown:
+            unknown[key] = str(name).strip()
+
+    if unknown:
+        df_unknown = pd.DataFrame({
+            'country_id': np.arange(UNKNOWN_ID_START, UNKNOWN_ID_START + len(unknown)),
+            'country': list(unknown.values()),
+            'name_en': None,
+            'in_master': False,
+        })
+        df_dimension = pd.concat([df_dimension, df_unknown], ignore_index=True)
+
+    df_dimension['is_aggregate'] = df_dimension['country_id'] == 0
+    df_dimension['country_id'] = df_dimension['country_id'].astype('int16')
+    return df_dimension[['country_id', 'country', 'name_en', 'is_aggregate', 'in_master']]
+
+
+def resolve_country_ids(names, df_dimension, allow_unknown=False):
+    """
+    国・地域名の Series を国ディメンション表のIDに変換する（表記ゆれは正規化キーで照合）。
+    build_country_dimension に渡していない表記が含まれる場合は ValueError を送出します（結合漏れを黙って見逃さないため）。
+    allow_unknown=True の場合は、送出せずにその表記のIDを -1 とします。
+    """
+    key_to_id = dict(ALIAS_MAP)
+    df_unknown = df_dimension[~df_dimension['in_master']]
+    key_to_id.update(zip(df_unknown['country'].map(normalize_country_name), df_unknown['country_id']))
+
+    # 一意な表記ごとに照合してから展開する
+    codes, uniques = pd.factorize(names)
+    unique_ids = np.array([key_to_id.get(normalize_country_name(name), -1) for name in uniques], dtype='int16')
+    if (unique_ids < 0).any() and not allow_unknown:
+        missing = [name for name, country_id in zip(uniques, unique_ids) if country_id < 0]
+        raise ValueError(f"国ディメンションに存在しない国・地域名があります: {missing}")
+
+    ids = np.full(len(codes), -1, dtype='int16')
+    ids[codes >= 0] = unique_ids[codes[codes >= 0]]
+    return pd.Series(ids, index=names.index, dtype='int16')
+
+
+def apply_country_dimension(df, df_dimension, country_col='country', drop_unknown=False):
+    """
+    データフレームの国・地域列を国IDに変換し、country_id 列とダッシュボードでの表記の country 列を設定する。
+    元の列名が country 以外（'Country/Area' など）の場合は、その列を country に置き換えます。
+    drop_unknown=True の場合は、国ディメンションにない表記の行を（ValueError を送出せずに）除きます。
+    国ディメンションを作成したデータのいずれにも現れない国の行で、country_id で結合する相手がないものです。
+    """
+    df = df.copy()
+    country_ids = resolve_country_ids(df[country_col], df_dimension, allow_unknown=drop_unknown)
+    if drop_unknown:
+        df = df[(country_ids >= 0).to_numpy()]
+        country_ids = country_ids[country_ids >= 0]
+    if country_col != 'country':
+        df = df.drop(columns=[country_col])
+    df['country_id'] = country_ids
+    df['country'] = country_ids.map(df_dimension.set_index('country_id')['country'])
+    return df
@@ -0,0 +1,457 @@
+import pandas as pd
+import numpy as np
+import os
+import re
+import sys
+import glob
+import json
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import load_workbook
+from app.columnar import DATA_PATH, SOURCE_TABLES, TABLE_SCHEMAS, convert_table, list_partition_files
+from app.countries import ALIAS_MAP, COUNTRY_MASTER, normalize_country_name
+from app.facts import TOTAL_ITEM_PATTERN, ALL_DETAILS
+from app.versioning import get_file_fingerprint
+from app.vintage import VINTAGE_TABLES, record_vintage
+
+# ============================================
+# 定数
+# ============================================
+# 公式サイトから取得した Excel（集計表）の配置先: {RAW_DIR}/{テーブル名}/*.xlsx
+RAW_DIR = os.environ.get("INBOUND_RAW_DIR", os.path.join(DATA_PATH, "raw"))
+MANIFEST_FILENAME = "manifest.json"
+STAGING_DIRNAME = ".staging" # ファイルごとの変換結果（内容のハッシュ単位で再利用する）
+
+WORKBOOK_PATTERNS = ('*.xlsx', '*.xlsm')
+
+# 同じキーの行が複数のファイルにある場合は、ファイル名の昇順で後のもの（改訂後の値）を採用する
+OUTPUT_KEYS = {
+    'visitors': ['Year', 'Month_Numeric', 'Country/Area'],
+    'spending': ['year', 'country', 'Quarter', 'expense_items', 'details'],
+    'destination': ['Year', 'Prefecture'],
+    'action': ['Country/Area', 'Year', 'Action'],
+}
+
+# 出力する CSV の文字コード（既存ファイルに合わせ、行動データのみ BOM 付き）
+OUTPUT_ENCODINGS = {
+    'action': 'utf_8_sig',
+}
+
+MIN_HEADER_MATCHES = 3 # 見出し行と判定するのに必要な、月・国名として認識できるセルの数
+MISSING_VALUE_MARKS = {'', '-', '－', '―', '—', '…', '*', '＊', 'x', 'X', '***'}
+# 費目の合計行の表記を、load_data が合計として扱う表記に揃える
+EXPENSE_ITEM_ALIASES = {'総額': '全体', '合計': '全体', '計': '全体'}
+RATIO_SHEET_PATTERN = '構成比' # 消費データで、値が構成比（%）のシート
+
+QUARTER_PATTERNS = [
+    (re.compile(r'Q\s*([1-4])', re.IGNORECASE), lambda m: int(m.group(1))),
+    (re.compile(r'(?<!\d)([1-4])\s*Q', re.IGNORECASE), lambda m: int(m.group(1))),
+    (re.compile(r'第?([1-4])四半期'), lambda m: int(m.group(1))),
+    (re.compile(r'(1|4|7|10)\s*[-~〜～]\s*(3|6|9|12)\s*月'), lambda m: (int(m.group(1)) - 1) // 3 + 1),
+]
+YEAR_PATTERN = re.compile(r'(19|20)\d{2}')
+MONTH_HEADER_PATTERN = re.compile(r'^(\d{1,2})月$')
+
+_MASTER_NAMES = {country_id: name for country_id, name, _, _ in COUNTRY_MASTER}
+
+
+# ============================================
+# セルの値と見出しの解釈
+# ============================================
+
+def _normalize_text(value):
+    if value is None:
+        return ''
+    return unicodedata.normalize('NFKC', str(value)).strip()
+
+
+def _to_number(value):
+    """
+    セルの値を数値に変換する（桁区切り・注記記号を除去。欠測を表す記号や空欄は NaN）。
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    text = _normalize_text(value).replace(',', '').replace('%', '')
+    if text in MISSING_VALUE_MARKS:
+        return np.nan
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def _is_country_label(value):
+    return normalize_country_name(_normalize_text(value)) in ALIAS_MAP
+
+
+def _canonical_country(value):
+    """
+    国・地域名をダッシュボードでの表記に揃える（国マスタにない場合は元の表記）。
+    """
+    text = _normalize_text(value)
+    country_id = ALIAS_MAP.get(normalize_country_name(text))
+    return _MASTER_NAMES[country_id] if country_id is not None else text
+
+
+def _find_year(*labels):
+    """
+    シート名・ファイル名から西暦年を取り出す（見つからない場合は None）。
+    """
+    for label in labels:
+        match = YEAR_PATTERN.search(_normalize_text(label))
+        if match:
+            return int(match.group(0))
+    return None
+
+
+def _find_quarter(*labels):
+    """
+    シート名・ファイル名から四半期（'1Q'〜'4Q'）を取り出す（見つからない場合は None）。
+    """
+    for label in labels:
+        text = _normalize_text(label)
+        for pattern, to_quarter in QUARTER_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                return f"{to_quarter(match)}Q"
+    return None
+
+
+# ============================================
+# クロス集計表 → ロング形式
+# ============================================
+
+def _melt_cross_tab(rows, is_header_cell, n_label_columns=None, fill_labels=False):
+    """
+    シートの行（値のタプル）から見出し行を探し、クロス集計表をロング形式に変換する。
+    見出し行は is_header_cell を満たすセルが MIN_HEADER_MATCHES 個以上ある最初の行とし、
+    最初に満たすセルより左の列を行ラベル、それ以降の見出しがある列を値の列とします。
+
+    Args:
+        n_label_columns: 行ラベルとして使う列数（None の場合は見出しの位置まで全て）
+        fill_labels: 行ラベルの空欄を上の行の値で埋める（結合セルで費目が先頭行にのみある表）
+
+    Returns:
+        DataFrame: label_0, label_1, ..., column, value（値が欠測のセルは含まない）
+    """
+    header = None
+    records = []
+    last_labels = None
+
+    for row in rows:
+        if header is None:
+            matches = [i for i, cell in enumerate(row) if is_header_cell(cell)]
+            if len(matches) >= MIN_HEADER_MATCHES:
+                first_value_col = matches[0]
+                label_cols = list(range(first_value_col if n_label_columns is None else n_label_columns))
+                value_cols = [(i, _normalize_text(row[i])) for i in range(first_value_col, len(row)) if _normalize_text(row[i])]
+                header = (label_cols, value_cols)
+            continue
+
+        label_cols, value_cols = header
+        labels = [_normalize_text(row[i]) if i < len(row) else '' for i in label_cols]
+        if fill_labels and last_labels is not None:
+            # 先頭の列のみ上の行から補う（細目の空欄は費目全体の行を表すため埋めない）
+            labels[0] = labels[0] or last_labels[0]
+        if not any(labels):
+            continue
+        last_labels = labels
+
+        for i, column in value_cols:
+            value = _to_number(row[i]) if i < len(row) else np.nan
+            if not np.isnan(value):
+                records.append(labels + [column, value])
+
+    columns = [f'label_{i}' for i in range(len(header[0]))] if header else []
+    return pd.DataFrame(records, columns=columns + ['column', 'value'])
+
+
+def _iter_sheets(path):
+    """
+    ブックを読み取り専用（行を逐次読み込むストリーミングモード）で開き、(シート名, 行のイテレータ) を返す。
+    """
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            yield worksheet.title, worksheet.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+# ============================================
+# データセットごとの変換（ワーカープロセスで実行）
+# ============================================
+
+def _parse_visitors(path):
+    """
+    訪日外客数: 1シート1年、行が国・地域、列が 1月〜12月 の表（年はシート名またはファイル名から取得）。
+    """
+    frames = []
+    for title, rows in _iter_sheets(path):
+        year = _find_year(title, os.path.basename(path))
+        if year is None:
+            continue
+        df = _melt_cross_tab(rows, lambda cell: bool(MONTH_HEADER_PATTERN.match(_normalize_text(cell))), n_label_columns=1)
+        if df.empty:
+            continue
+        df = df[df['column'].str.match(MONTH_HEADER_PATTERN)]
+        frames.append(pd.DataFrame({
+            'Year': year,
+            'Month_Numeric': df['column'].str.extract(MONTH_HEADER_PATTERN, expand=False).astype(int),
+            'Country/Area': df['label_0'].map(_canonical_country),
+            'Visitor_Numeric': df['value'].round().astype('int64'),
+        }))
+    return frames
+
+
+def _parse_spending(path):
+    """
+    消費動向調査: 1シート1四半期、行が 費目・細目（細目が空欄の行は費目全体）、列が国・地域の表。
+    シート名に「構成比」を含むシートは構成比（%）として読み込み、ない場合は費目の合計行に対する比率から計算します。
+    """
+    units = []
+    ratios = []
+    for title, rows in _iter_sheets(path):
+        year = _find_year(title, os.path.basename(path))
+        quarter = _find_quarter(title, os.path.basename(path))
+        if year is None or quarter is None:
+            continue
+        df = _melt_cross_tab(rows, _is_country_label, n_label_columns=2, fill_labels=True)
+        if df.empty:
+            continue
+        df = pd.DataFrame({
+            'year': year,
+            'country': df['column'].map(_canonical_country),
+            'Quarter': quarter,
+            'expense_items': df['label_0'].replace(EXPENSE_ITEM_ALIASES),
+            'details': df['label_1'].replace('', ALL_DETAILS),
+            'value': df['value'],
+        })
+        (ratios if RATIO_SHEET_PATTERN in _normalize_text(title) else units).append(df)
+
+    if not units:
+        return []
+
+    keys = OUTPUT_KEYS['spending']
+    df_spend = pd.concat(units, ignore_index=True).rename(columns={'value': 'consumption_unit'})
+    if ratios:
+        df_ratio = pd.concat(ratios, ignore_index=True).rename(columns={'value': 'composition_ratio'})
+        df_spend = df_spend.merge(df_ratio, on=keys, how='left')
+    else:
+        period_keys = ['year', 'country', 'Quarter']
+        is_total = df_spend['expense_items'].str.contains(TOTAL_ITEM_PATTERN, case=False, regex=True) & (df_spend['details'] == ALL_DETAILS)
+        totals = df_spend[is_total].groupby(period_keys)['consumption_unit'].first().rename('total')
+        df_spend['composition_ratio'] = df_spend['consumption_unit'] / df_spend.join(totals, on=period_keys)['total'] * 100
+    return [df_spend]
+
+
+def _parse_destination(path):
+    """
+    訪問率: 1シート1年、行が都道府県、列が国・地域の表のうち、全体（全国籍・地域）の列を使用します。
+    """
+    frames = []
+    for title, rows in _iter_sheets(path):
+        year = _find_year(title, os.path.basename(path))
+        if year is None:
+            continue
+        df = _melt_cross_tab(rows, _is_country_label, n_label_columns=1)
+        if df.empty:
+            continue
+        df = df[df['column'].map(_canonical_country) == _MASTER_NAMES[0]]
+        frames.append(pd.DataFrame({
+            'Year': year,
+            'Prefecture': df['label_0'],
+            'Visit Rate(%)': df['value'],
+        }))
+    return frames
+
+
+def _parse_action(path):
+    """
+    観光旅行期間中の行動内容: 1シート1年、行が行動内容、列が国・地域の表（値は実施率・構成比の %）。
+    """
+    frames = []
+    for title, rows in _iter_sheets(path):
+        year = _find_year(title, os.path.basename(path))
+        if year is None:
+            continue
+        df = _melt_cross_tab(rows, _is_country_label, n_label_columns=1)
+        if df.empty:
+            continue
+        frames.append(pd.DataFrame({
+            'Country/Area': df['column'].map(_canonical_country),
+            'Year': year,
+            'Action': df['label_0'],
+            'Composition ratio': df['value'],
+        }))
+    return frames
+
+
+WORKBOOK_PARSERS = {
+    'visitors': _parse_visitors,
+    'spending': _parse_spending,
+    'destination': _parse_destination,
+    'action': _parse_action,
+}
+
+
+def parse_workbook(table, path):
+    """
+    1つのブックを変換し、出力する CSV と同じ列構成の DataFrame を返す（該当するシートがない場合は空）。
+    """
+    frames = WORKBOOK_PARSERS[table](path)
+    columns = TABLE_SCHEMAS[table].names
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
+# ============================================
+# 指紋（ハッシュ）による差分の判定
+# ============================================
+
+def load_manifest(raw_dir=RAW_DIR):
+    try:
+        with open(os.path.join(raw_dir, MANIFEST_FILENAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _save_manifest(manifest, raw_dir):
+    path = os.path.join(raw_dir, MANIFEST_FILENAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def _staging_path(raw_dir, table, fingerprint):
+    return os.path.join(raw_dir, STAGING_DIRNAME, table, f"{fingerprint}.parquet")
+
+
+def _list_workbooks(raw_dir, table):
+    paths = []
+    for pattern in WORKBOOK_PATTERNS:
+        paths.extend(glob.glob(os.path.join(raw_dir, table, pattern)))
+    # Excel の一時ファイル（~$ で始まる）は除外する
+    return sorted(path for path in paths if not os.path.basename(path).startswith('~$'))
+
+
+def _plan(raw_dir, manifest, force):
+    """
+    全てのブックについて指紋を確認し、(テーブル名, パス, 指紋) のうち変換が必要なものと、新しいマニフェストを返す。
+    更新時刻とサイズが前回と同じファイルはハッシュの計算も省略します。
+    """
+    new_manifest = {}
+    to_parse = []
+    for table in WORKBOOK_PARSERS:
+        for path in _list_workbooks(raw_dir, table):
+            key = os.path.relpath(path, raw_dir).replace(os.sep, '/')
+            stat = os.stat(path)
+            previous = manifest.get(key, {})
+            if previous.get('mtime_ns') == stat.st_mtime_ns and previous.get('size') == stat.st_size:
+                fingerprint = previous['sha256']
+            else:
+                fingerprint = get_file_fingerprint(path)
+
+            new_manifest[key] = {'table': table, 'sha256': fingerprint, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            if force or not os.path.exists(_staging_path(raw_dir, table, fingerprint)):
+                to_parse.append((table, path, fingerprint))
+    return to_parse, new_manifest
+
+
+def _remove_unused_staging(raw_dir, manifest):
+    """
+    削除・更新されたブックの変換結果（マニフェストにない指紋のファイル）を削除する。
+    """
+    used = {(entry['table'], entry['sha256']) for entry in manifest.values()}
+    for path in glob.glob(os.path.join(raw_dir, STAGING_DIRNAME, '*', '*.parquet')):
+        table = os.path.basename(os.path.dirname(path))
+        fingerprint = os.path.splitext(os.path.basename(path))[0]
+        if (table, fingerprint) not in used:
+            os.remove(path)
+
+
+# ============================================
+# ETL の実行
+# ============================================
+
+def _write_output(table, df, data_path):
+    """
+    CSV を一時ファイルに書き出してから置き換える（書き出し中に load_data が途中のファイルを読まないように）。
+    年分割の列指向ファイルがある場合は、CSV との食い違いがないよう再変換します。
+    版管理の対象テーブルは、上書きで暫定値が失われないよう、変わった値を版の記録（app/vintage.py）にも追記します。
+    """
+    filename, _, _ = SOURCE_TABLES[table]
+    path = os.path.join(data_path, filename)
+    df.to_csv(path + '.tmp', index=False, encoding=OUTPUT_ENCODINGS.get(table, 'utf-8'))
+    os.replace(path + '.tmp', path)
+    if list_partition_files(table):
+        convert_table(table, data_path)
+    if table in VINTAGE_TABLES:
+        record_vintage(table, df)
+
+
+def run_etl(raw_dir=RAW_DIR, data_path=DATA_PATH, force=False, max_workers=None):
+    """
+    {raw_dir}/{テーブル名}/ の Excel から、load_data が読み込む CSV（列構成は app/columnar.py の TABLE_SCHEMAS）を作成する。
+    前回から内容（SHA-256）が変わったブックのみをプロセスプールで並列に変換し、変わっていないブックは前回の変換結果を再利用します。
+    ブックが追加・更新・削除されたテーブルのみ CSV を書き直します（ブックが1つもないテーブルの CSV はそのまま残します）。
+
+    Returns:
+        dict: {テーブル名: {'workbooks': ブック数, 'parsed': 変換したブック数, 'rows': 出力行数}}（書き直したテーブルのみ）
+    """
+    manifest = load_manifest(raw_dir)
+    to_parse, new_manifest = _plan(raw_dir, manifest, force)
+
+    n_workers = max(1, min(max_workers or os.cpu_count() or 1, len(to_parse)))
+    if n_workers == 1:
+        parsed = [parse_workbook(table, path) for table, path, _ in to_parse]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(parse_workbook, table, path) for table, path, _ in to_parse]
+            parsed = [future.result() for future in futures]
+
+    for (table, _, fingerprint), df in zip(to_parse, parsed):
+        staging_path = _staging_path(raw_dir, table, fingerprint)
+        os.makedirs(os.path.dirname(staging_path), exist_ok=True)
+        df.to_parquet(staging_path, index=False)
+
+    summary = {}
+    parsed_tables = {table for table, _, _ in to_parse}
+    for table in WORKBOOK_PARSERS:
+        entries = sorted((key, entry) for key, entry in new_manifest.items() if entry['table'] == table)
+        previous = sorted((key, entry['sha256']) for key, entry in manifest.items() if entry.get('table') == table)
+        changed = table in parsed_tables or previous != [(key, entry['sha256']) for key, entry in entries]
+        if not entries or not changed:
+            continue
+
+        frames = [pd.read_parquet(_staging_path(raw_dir, table, entry['sha256'])) for _, entry in entries]
+        df_output = pd.concat(frames, ignore_index=True)
+        df_output = df_output.drop_duplicates(subset=OUTPUT_KEYS[table], keep='last').reset_index(drop=True)
+        _write_output(table, df_output, data_path)
+        summary[table] = {
+            'workbooks': len(entries),
+            'parsed': sum(1 for t, _, _ in to_parse if t == table),
+            'rows': len(df_output),
+        }
+
+    _save_manifest(new_manifest, raw_dir)
+    _remove_unused_staging(raw_dir, new_manifest)
+    return summary
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python -m app.etl run      ... 追加・更新されたブックのみを変換し、CSV を更新する
+    #   python -m app.etl rebuild  ... 全てのブックを変換し直す
+    command = sys.argv[1] if len(sys.argv) > 1 else "run"
+    if command not in ("run", "rebuild"):
+        sys.exit(f"不明なコマンドです: {command}（run または rebuild を指定してください）")
+
+    results = run_etl(force=(command == "rebuild"))
+    if not results:
+        print("更新されたブックはありません。")
+    for table, result in results.items():
+        filename, _, _ = SOURCE_TABLES[table]
+        print(f"{table}: {result['parsed']}/{result['workbooks']} ブックを変換し、{result['rows']} 行を '{os.path.join(DATA_PATH, filename)}' に保存しました。")
@@ -0,0 +1,185 @@
+import pandas as pd
+import numpy as np
+
+# ============================================
+# 定数
+# ============================================
+TOTAL_ITEM_PATTERN = '全体|TOTAL|ALL' # 合計を表す費目名
+ALL_DETAILS = 'all' # 細目のない（費目全体の）行
+
+# ファクト表ごとの 次元名 → 結合キー
+FACT_DIMENSIONS = {
+    'visitors': {'period': 'period_id', 'country': 'country_id'},
+    'spend': {'country': 'country_id', 'item': 'item_id'},
+}
+
+
+# ============================================
+# ファクトストアの構築
+# ============================================
+
+def _build_period_dimension(df_jnto):
+    """
+    訪日客数データの (年, 月) から月単位の期間ディメンションを作成する。
+    """
+    df_period = (
+        df_jnto[['Year', 'Month_Numeric']]
+        .drop_duplicates()
+        .sort_values(['Year', 'Month_Numeric'])
+        .rename(columns={'Year': 'year', 'Month_Numeric': 'month'})
+        .reset_index(drop=True)
+    )
+    df_period.insert(0, 'period_id', np.arange(len(df_period), dtype='int32'))
+    df_period['Quarter'] = ((df_period['month'] - 1) // 3 + 1).astype(str) + 'Q'
+    df_period['date'] = pd.to_datetime(df_period['year'].astype(str) + "-" + df_period['month'].astype(str))
+    return df_period[['period_id', 'date', 'year', 'Quarter', 'month']]
+
+
+def _build_item_dimension(df_spend):
+    """
+    消費データの (費目, 細目) から費目ディメンションを作成する（IDは初出順）。
+    item_name は「費目 [細目]」（細目がない場合は「費目 [全体]」）です。
+    """
+    df_item = df_spend[['expense_items', 'details']].drop_duplicates().reset_index(drop=True)
+    df_item.insert(0, 'item_id', np.arange(len(df_item), dtype='int16'))
+    df_item['item_name'] = df_item['expense_items'] + np.where(
+        df_item['details'] != ALL_DETAILS, ' [' + df_item['details'].astype(str) + ']', ' [全体]'
+    )
+    df_item['is_total'] = df_item['expense_items'].str.contains(TOTAL_ITEM_PATTERN, case=False, na=False, regex=True)
+    df_item['is_major'] = ~df_item['is_total'] & (df_item['details'] == ALL_DETAILS)
+    return df_item
+
+
+def build_fact_store(df_jnto, df_spend, df_countries):
+    """
+    国IDを付与済みの訪日客数データ（月次）と消費データ（四半期）から、ロング形式のファクト表と
+    国・期間・費目のディメンション表をまとめたファクトストアを作成する。
+    ファクト表は結合キー（整数）と値のみを持ち、名称などの属性は問い合わせ時にディメンション表から結合します。
+    load_data が返す消費単価・市場ポテンシャルのデータフレームはこのストアへの問い合わせで作成します。
+    訪日客数は作成済みのデータフレームを持たず、各ページが query_facts / pivot_visitors で表示する部分だけを問い合わせます。
+
+    Returns:
+        dict:
+            facts: {'visitors': period_id, country_id, visitors,
+                    'spend': year, Quarter, country_id, item_id, consumption_unit, composition_ratio}
+            dimensions: {'country': df_countries, 'period': 月単位の期間, 'item': 費目・細目}
+    """
+    df_period = _build_period_dimension(df_jnto)
+    df_item = _build_item_dimension(df_spend)
+
+    period_keys = pd.MultiIndex.from_frame(df_period[['year', 'month']])
+    df_visitors = pd.DataFrame({
+        'period_id': df_period['period_id'].to_numpy()[period_keys.get_indexer(pd.MultiIndex.from_arrays([df_jnto['Year'], df_jnto['Month_Numeric']]))],
+        'country_id': df_jnto['country_id'].to_numpy(),
+        'visitors': df_jnto['Visitor_Numeric'].to_numpy(),
+    })
+
+    item_keys = pd.MultiIndex.from_frame(df_item[['expense_items', 'details']])
+    df_spend_fact = pd.DataFrame({
+        'year': df_spend['year'].to_numpy(),
+        'Quarter': df_spend['Quarter'].to_numpy(),
+        'country_id': df_spend['country_id'].to_numpy(),
+        'item_id': df_item['item_id'].to_numpy()[item_keys.get_indexer(pd.MultiIndex.from_frame(df_spend[['expense_items', 'details']]))],
+        'consumption_unit': df_spend['consumption_unit'].to_numpy(dtype=float),
+        'composition_ratio': df_spend['composition_ratio'].to_numpy(dtype=float),
+    })
+
+    return {
+        'facts': {
+            'visitors': df_visitors,
+            'spend': df_spend_fact,
+        },
+        'dimensions': {
+            'country': df_countries,
+            'period': df_period,
+            'item': df_item,
+        },
+    }
+
+
+# ============================================
+# 問い合わせ（絞り込み・集計・ピボット）
+# ============================================
+
+def _join_dimensions(store, fact, columns):
+    """
+    ファクト表に、columns のうちファクト表にない列を持つディメンション表だけを結合して返す。
+    """
+    df = store['facts'][fact]
+    for dimension, key in FACT_DIMENSIONS[fact].items():
+        df_dimension = store['dimensions'][dimension]
+        attributes = [col for col in columns if col not in df.columns and col in df_dimension.columns]
+        if attributes:
+            df_attributes = df_dimension.set_index(key)[attributes]
+            df = df.join(df_attributes, on=key)
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise KeyError(f"ファクト '{fact}' とその次元に存在しない列です: {missing}")
+    return df
+
+
+def query_facts(store, fact, measures, filters=None, by=None, agg='sum'):
+    """
+    ファクト表を絞り込み、指定した列で集計したロング形式の DataFrame を返す。
+    filters と by には、ファクト表の列に加えてディメンション表の属性（country, year, item_name など）を指定できます。
+
+    Args:
+        fact: 'visitors' または 'spend'
+        measures: 集計する値の列名（文字列またはリスト）
+        filters: {列名: 値 または 値のリスト}
+        by: 集計の単位とする列名のリスト（None の場合は絞り込んだ行をそのまま返す）
+        agg: 集計方法（'sum', 'mean' など groupby の集計関数名）
+    """
+    measures = [measures] if isinstance(measures, str) else list(measures)
+    filters = filters or {}
+    by = list(by) if by is not None else []
+
+    df = _join_dimensions(store, fact, list(dict.fromkeys(list(filters.keys()) + by)))
+
+    if filters:
+        mask = np.ones(len(df), dtype=bool)
+        for col, value in filters.items():
+            if isinstance(value, (list, tuple, set, np.ndarray, pd.Index)):
+                mask &= df[col].isin(value).to_numpy()
+            else:
+                mask &= (df[col] == value).to_numpy()
+        df = df[mask]
+
+    if not by:
+        return df.reset_index(drop=True)
+    return df.groupby(by, sort=True)[measures].agg(agg).reset_index()
+
+
+def pivot_facts(store, fact, measure, index, columns, filters=None, agg='sum'):
+    """
+    絞り込んだファクトを index × columns のワイド形式で返す（表示する部分だけをピボットするためのもの）。
+    組み合わせにデータがない場合は NaN です。
+    """
+    index = [index] if isinstance(index, str) else list(index)
+    columns = [columns] if isinstance(columns, str) else list(columns)
+    df_long = query_facts(store, fact, measure, filters=filters, by=index + columns, agg=agg)
+    df_wide = df_long.set_index(index + columns)[measure].unstack(columns)
+    if len(columns) == 1:
+        df_wide.columns.name = columns[0]
+    return df_wide
+
+
+def pivot_visitors(store, countries=None):
+    """
+    月次の訪日客数を 年月 × 国・地域 のワイド形式で返す（countries を指定した場合はその国のみ、指定した順）。
+    行は期間ディメンションの全ての月で、欠測は 0 ではなく NaN のまま残します（sum は欠測のみの組み合わせを 0 にするため mean で集計）。
+    """
+    filters = {'country': list(countries)} if countries is not None else None
+    df_wide = pivot_facts(store, 'visitors', 'visitors', index='date', columns='country', filters=filters, agg='mean')
+    df_wide = df_wide.reindex(pd.Index(store['dimensions']['period']['date'], name='date'))
+    if countries is not None:
+        df_wide = df_wide.reindex(columns=list(countries))
+    return df_wide.astype(float).rename_axis(columns="Country/Area")
+
+
+def list_fact_countries(store, fact):
+    """
+    ファクト表に行がある国・地域名の一覧を返す（国ディメンションには他のデータにのみ現れる国も含まれるため）。
+    """
+    country_names = store['dimensions']['country'].set_index('country_id')['country']
+    return country_names.loc[np.unique(store['facts'][fact]['country_id'])].tolist()
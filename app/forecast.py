@@ -0,0 +1,106 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+from statistics import NormalDist
+from app.facts import pivot_visitors
+
+# ============================================
+# 定数
+# ============================================
+FIT_MONTHS = 60 # 学習に使用する直近の月数
+EXCLUDE_PERIOD = ("2020-02-01", "2022-12-01") # 学習から除外する期間（入国制限期間）
+TREND_DAMPING = 0.98 # 将来のトレンドを月ごとに減衰させる係数（1.0 で減衰なし）
+PREDICTION_LEVEL = 0.80 # 予測区間の水準
+MIN_OBSERVATIONS = 24 # 国ごとに必要な最小観測月数
+
+
+# ============================================
+# 季節モデル（全ての国を一括で学習）
+# ============================================
+
+def _design_matrix(time_index, months, trend_values=None):
+    """
+    [切片, トレンド, 月ダミー(2〜12月)] の説明変数行列を作成する。
+    """
+    trend = time_index.astype(float) if trend_values is None else trend_values
+    month_dummies = (months[:, None] == np.arange(2, 13)[None, :]).astype(float)
+    return np.column_stack([np.ones(len(time_index)), trend, month_dummies])
+
+
+@st.cache_data(show_spinner=False)
+def forecast_visitors(data_version, horizon=24, prediction_level=PREDICTION_LEVEL, _fact_store=None):
+    """
+    全ての国・地域の月次訪日客数について、対数変換した値に「トレンド + 月別の季節性」を当てはめ、
+    horizon か月先までの予測値と予測区間を返す。
+
+    全ての国で説明変数行列は共通のため、欠測・除外期間を重み 0 とした重み付き最小二乗の正規方程式を
+    [国, 係数, 係数] の配列として組み立て、一括で解きます（国ごとのループは行いません）。
+    将来のトレンドは TREND_DAMPING で減衰させ、外挿による過大な伸びを抑えます。
+    月次の訪日客数はキャッシュがない場合にのみファクトストア（_fact_store）からピボットします。
+    結果は全セッションで共有するため、data_version には _fact_store を取得したデータのバージョン
+    （st.session_state.data_version）を渡してください（ファイルの更新時刻では、古いデータを表示中のセッションの結果が混ざります）。
+
+    Returns:
+        DataFrame: date, country, forecast, lower, upper
+    """
+    df = pivot_visitors(_fact_store).sort_index()
+    df = df.iloc[-FIT_MONTHS:]
+    dates = df.index
+    countries = df.columns.tolist()
+
+    # 目的変数 [月, 国]。欠測と除外期間は重み 0
+    Y = np.log1p(df.to_numpy(dtype=float))
+    weights = (~np.isnan(Y)).astype(float)
+    excluded = (dates >= pd.Timestamp(EXCLUDE_PERIOD[0])) & (dates <= pd.Timestamp(EXCLUDE_PERIOD[1]))
+    weights[excluded, :] = 0.0
+    Y = np.where(weights > 0, Y, 0.0)
+
+    t = np.arange(len(dates))
+    X = _design_matrix(t, dates.month.to_numpy())
+    n_params = X.shape[1]
+
+    # 重み付き正規方程式: (Xᵀ W_c X) β_c = Xᵀ W_c y_c を全ての国で一括して解く
+    XtWX = np.einsum('tc,ti,tj->cij', weights, X, X)
+    XtWy = np.einsum('tc,ti,tc->ci', weights, X, Y)
+    n_obs = weights.sum(axis=0)
+    solvable = n_obs >= max(MIN_OBSERVATIONS, n_params + 1)
+    # 一度も観測がない月がある国（特定の月を公表しない国など）は、その月の季節性を推定できないため除外する
+    month_observed = np.stack([weights[dates.month == month].sum(axis=0) > 0 for month in range(1, 13)])
+    solvable &= month_observed.all(axis=0)
+    # 上記を満たしても行列が特異な場合（観測がトレンドと月の組み合わせに偏る場合など）も除外する
+    solvable &= np.linalg.matrix_rank(XtWX) == n_params
+
+    # 学習できない国の行列は単位行列に置き換えて計算し、結果は後で除外する
+    XtWX[~solvable] = np.eye(n_params)
+    XtWy[~solvable] = 0.0
+    XtWX_inv = np.linalg.inv(XtWX)
+    beta = np.einsum('cij,cj->ci', XtWX_inv, XtWy)
+
+    residuals = (Y - X @ beta.T) * weights
+    dof = np.maximum(n_obs - n_params, 1)
+    sigma = np.where(solvable, np.sqrt((residuals ** 2).sum(axis=0) / dof), 0.0)
+
+    # 予測期間の説明変数（トレンドは減衰させる）
+    future_dates = pd.date_range(dates[-1] + pd.DateOffset(months=1), periods=horizon, freq='MS')
+    steps = np.arange(1, horizon + 1)
+    damped_trend = t[-1] + np.cumsum(TREND_DAMPING ** steps)
+    X_future = _design_matrix(steps, future_dates.month.to_numpy(), trend_values=damped_trend)
+
+    mean_log = X_future @ beta.T
+    # 予測区間: σ²·(1 + x_hᵀ (XᵀWX)⁻¹ x_h)
+    leverage = np.einsum('hi,cij,hj->hc', X_future, XtWX_inv, X_future)
+    se_log = sigma[None, :] * np.sqrt(1 + leverage)
+    z = NormalDist().inv_cdf(0.5 + prediction_level / 2)
+
+    forecast = np.clip(np.expm1(mean_log), 0, None)
+    lower = np.clip(np.expm1(mean_log - z * se_log), 0, None)
+    upper = np.clip(np.expm1(mean_log + z * se_log), 0, None)
+
+    df_forecast = pd.DataFrame({
+        'date': np.repeat(future_dates, len(countries)),
+        'country': np.tile(countries, horizon),
+        'forecast': forecast.ravel(),
+        'lower': lower.ravel(),
+        'upper': upper.ravel(),
+    })
+    return df_forecast[np.tile(solvable, horizon)].reset_index(drop=True)
\ No newline at end of file
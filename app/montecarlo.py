@@ -0,0 +1,117 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+from app.projection import compute_quadrant_codes, QUADRANTS, QUADRANT_ORDER, AGGREGATE_COUNTRY, ID_COLUMNS
+
+# ============================================
+# 定数
+# ============================================
+N_DRAWS = 5000 # シミュレーション回数
+VISITORS_ERROR = 0.02 # 訪日客数の相対誤差（標準偏差）
+SPEND_ERROR = 0.10 # 消費単価の相対誤差（標準偏差）
+INTERVAL_LEVEL = 0.90 # 市場ポテンシャルの区間の水準
+MONTE_CARLO_SEED = 0
+
+# 1ワーカーあたりの最小試行回数（プロセス起動コストに見合う単位で分割する）
+MIN_DRAWS_PER_TASK = 1000
+# ワーカー内で一度に計算する試行回数（ピーク時のメモリはこの回数に比例し、n_draws には依存しない）
+CHUNK_DRAWS = 1000
+# 市場ポテンシャルの区間の計算に残す試行数の上限（全ワーカーの合計。float32 で保持する）
+MAX_INTERVAL_SAMPLES = 2000
+
+
+# ============================================
+# シミュレーション（ワーカープロセスで実行）
+# ============================================
+
+def _simulate_task(V, S, visitors_error, spend_error, seed_sequence, n_draws, n_samples):
+    """
+    訪日客数 [国] と消費単価 [国, 項目] に対数正規の相対誤差を与えた試行を、CHUNK_DRAWS 回ずつ n_draws 回計算する。
+    訪日客数の誤差は国ごとに全項目で共通、消費単価の誤差は国 × 項目ごとに独立とします。
+    象限の件数は全ての試行で集計し、市場ポテンシャルは区間の計算用に n_samples 回分のみを残します
+    （試行は互いに独立で同じ分布に従うため、各チャンクから試行数に比例した数を残せば全試行からの無作為抽出と同じです）。
+
+    Returns:
+        quadrant_counts [国, 項目, 象限], potential [n_samples, 国, 項目]（float32）
+    """
+    rng = np.random.default_rng(seed_sequence)
+    quadrant_counts = np.zeros(S.shape + (len(QUADRANTS),), dtype=np.int64)
+    potential_samples = []
+
+    for start in range(0, n_draws, CHUNK_DRAWS):
+        n_chunk = min(CHUNK_DRAWS, n_draws - start)
+
+        # 平均が元の値と一致するよう、対数空間で -σ²/2 だけずらす
+        V_draws = V[None, :] * np.exp(visitors_error * rng.standard_normal((n_chunk,) + V.shape) - visitors_error ** 2 / 2)
+        S_draws = S[None, :, :] * np.exp(spend_error * rng.standard_normal((n_chunk,) + S.shape) - spend_error ** 2 / 2)
+
+        codes = compute_quadrant_codes(V_draws, S_draws)
+        quadrant_counts += (codes[..., None] == np.arange(len(QUADRANTS))).sum(axis=0)
+
+        n_keep = (start + n_chunk) * n_samples // n_draws - start * n_samples // n_draws
+        potential_samples.append((V_draws[:n_keep, :, None] * S_draws[:n_keep]).astype(np.float32))
+
+    return quadrant_counts, np.concatenate(potential_samples, axis=0)
+
+
+# ============================================
+# 象限の所属確率と市場ポテンシャルの区間
+# ============================================
+
+@st.cache_data(show_spinner=False)
+def simulate_market_potential(df_period, visitors_col, visitors_error=VISITORS_ERROR, spend_error=SPEND_ERROR, n_draws=N_DRAWS, interval_level=INTERVAL_LEVEL, seed=MONTE_CARLO_SEED):
+    """
+    1期間分のポテンシャル分析データについて、訪日客数と全ての消費単価項目を誤差の範囲で揺らし、
+    市場ポテンシャルと象限（対数中央値の基準線も試行ごとに再計算）を n_draws 回再計算する。
+    試行はプロセスプールで並列に実行し（各ワーカー内は CHUNK_DRAWS 回ずつ）、結果は入力データと誤差の設定単位でキャッシュします。
+    区間は、全試行から MAX_INTERVAL_SAMPLES 回分を残した市場ポテンシャルのパーセンタイルです。
+
+    Returns:
+        DataFrame: country, item, P_HH, P_LH, P_HL, P_LL, potential, potential_lower, potential_upper
+                   （potential は誤差なしの値、区間は試行のパーセンタイル）
+    """
+    df = df_period[df_period['country'] != AGGREGATE_COUNTRY].sort_values('country')
+    spend_columns = [col for col in df.columns if col not in ID_COLUMNS]
+    countries = df['country'].tolist()
+
+    V = df[visitors_col].to_numpy(dtype=float)
+    S = df[spend_columns].to_numpy(dtype=float)
+
+    # ワーカーごとに独立した乱数系列を割り当てる
+    n_workers = max(1, min(os.cpu_count() or 1, n_draws // MIN_DRAWS_PER_TASK))
+    draws_per_worker = np.diff(np.linspace(0, n_draws, n_workers + 1).astype(int))
+    samples_per_worker = np.diff(np.linspace(0, min(n_draws, MAX_INTERVAL_SAMPLES), n_workers + 1).astype(int))
+    seed_sequences = np.random.SeedSequence(seed).spawn(n_workers)
+
+    if n_workers == 1:
+        results = [_simulate_task(V, S, visitors_error, spend_error, seed_sequences[0], n_draws, min(n_draws, MAX_INTERVAL_SAMPLES))]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [
+                executor.submit(_simulate_task, V, S, visitors_error, spend_error, seed_sequence, int(n), int(n_samples))
+                for seed_sequence, n, n_samples in zip(seed_sequences, draws_per_worker, samples_per_worker)
+            ]
+            results = [future.result() for future in futures]
+
+    quadrant_counts = sum(r[0] for r in results)
+    potential_draws = np.concatenate([r[1] for r in results], axis=0)
+
+    n_valid = quadrant_counts.sum(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        probabilities = np.where(n_valid > 0, quadrant_counts / n_valid, np.nan)
+
+    alpha = (1 - interval_level) / 2
+    potential_lower, potential_upper = np.quantile(potential_draws, [alpha, 1 - alpha], axis=0)
+
+    df_result = pd.DataFrame({
+        'country': np.repeat(countries, len(spend_columns)),
+        'item': np.tile(spend_columns, len(countries)),
+    })
+    for quadrant in QUADRANT_ORDER:
+        df_result[f'P_{quadrant}'] = probabilities[..., list(QUADRANTS).index(quadrant)].ravel()
+    df_result['potential'] = (V[:, None] * S).ravel()
+    df_result['potential_lower'] = potential_lower.ravel()
+    df_result['potential_upper'] = potential_upper.ravel()
+    return df_result
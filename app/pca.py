@@ -0,0 +1,318 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+import sys
+import joblib
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import StandardScaler
+from sklearn.utils.extmath import randomized_svd, svd_flip
+from app.versioning import get_file_version
+from app.countries import is_aggregate_country, normalize_country_name, apply_country_dimension
+from app.columnar import read_table, list_partition_files
+
+# ============================================
+# 定数（notebooks/031_Behavior_PCA.ipynb と同一の定義）
+# ============================================
+DATA_PATH = "data/"
+ACTION_FILENAME = "inbound_action.csv"
+SCORES_FILENAME = "pca_scores_timeseries.csv"
+MODEL_FILENAME = "pca_model.joblib"
+
+COUNTRY_AREA_COL = 'Country/Area'
+ACTION_COL = 'Action'
+YEAR_COL = 'Year'
+VALUE_COL = 'Composition ratio'
+
+# 分析から除外する項目
+ACTION_TO_EXCLUDE = '上記には当てはまるものがない'
+# 全体（全国籍・地域）の行は、表記ゆれを含めて app/countries.py の is_aggregate_country で除外する
+N_COMPONENTS_TO_KEEP = 3 # PC1, PC2, PC3の3軸に絞る
+
+PC_COLUMNS = [f'PC{i+1}' for i in range(N_COMPONENTS_TO_KEEP)]
+
+
+# ============================================
+# データ準備
+# ============================================
+
+def load_action_data(data_path=DATA_PATH):
+    """
+    行動データ（inbound_action.csv、または年分割の列指向ファイル）を読み込み、除外対象の国・行動を取り除く。
+    """
+    df = read_table('action', columns=[COUNTRY_AREA_COL, YEAR_COL, ACTION_COL, VALUE_COL], data_path=data_path)
+    df = df[~is_aggregate_country(df[COUNTRY_AREA_COL])]
+    df = df[df[ACTION_COL] != ACTION_TO_EXCLUDE]
+    return df.copy()
+
+
+def build_action_matrix(df_action):
+    """
+    行: (国, 年), 列: 行動内容 のPCA入力行列を作成する。
+    """
+    return df_action.pivot_table(
+        index=[COUNTRY_AREA_COL, YEAR_COL],
+        columns=ACTION_COL,
+        values=VALUE_COL,
+        fill_value=0
+    )
+
+
+# ============================================
+# モデルの学習・保存・読込
+# ============================================
+
+def fit_pca_model(df_action, n_components=N_COMPONENTS_TO_KEEP):
+    """
+    全年度データで標準化とPCAを学習し、軸の定義を固定したモデルを返す。
+    モデルは scaler / pca に加え、学習時の行動項目の並び (features) と学習対象年を保持します。
+    """
+    data_pivot_all = build_action_matrix(df_action)
+
+    scaler = StandardScaler()
+    X_scaled_all = scaler.fit_transform(data_pivot_all.values)
+    pca = PCA(n_components=n_components)
+    pca.fit(X_scaled_all)
+
+    return {
+        'scaler': scaler,
+        'pca': pca,
+        'features': data_pivot_all.columns.tolist(),
+        'fitted_years': sorted(data_pivot_all.index.get_level_values(YEAR_COL).unique().tolist()),
+    }
+
+
+def save_pca_model(model, data_path=DATA_PATH):
+    joblib.dump(model, os.path.join(data_path, MODEL_FILENAME))
+
+
+def load_pca_model(data_path=DATA_PATH):
+    """
+    保存済みのPCAモデルを読み込む。存在しない場合は None を返す。
+    """
+    try:
+        return joblib.load(os.path.join(data_path, MODEL_FILENAME))
+    except FileNotFoundError:
+        return None
+
+
+# ============================================
+# スコア計算（transform のみ）
+# ============================================
+
+def transform_scores(model, df_action):
+    """
+    学習済みの軸に行動データを射影し、(国, 年) ごとのPCスコアを返す（再学習は行わない）。
+    学習時に存在しなかった行動項目は無視し、欠けている項目は 0 で補完します。
+    """
+    data_pivot = build_action_matrix(df_action).reindex(columns=model['features'], fill_value=0)
+    if data_pivot.empty:
+        return pd.DataFrame(columns=[COUNTRY_AREA_COL, YEAR_COL] + PC_COLUMNS)
+
+    scores = model['pca'].transform(model['scaler'].transform(data_pivot.values))
+    scores_df = pd.DataFrame(
+        scores,
+        index=data_pivot.index,
+        columns=[f'PC{i+1}' for i in range(scores.shape[1])]
+    )
+    return scores_df.reset_index()
+
+
+def refresh_pca_scores(model, df_scores, df_action):
+    """
+    既存のスコアに含まれていない (国, 年) のみを固定軸へ射影し、スコア表に追加する。
+    新しい年の行動データが追加された場合でも、全件の再学習は行わずに差分だけを計算します。
+    国・地域名は表記ゆれを正規化したキーで照合します。
+    """
+    if df_scores.empty:
+        return transform_scores(model, df_action)
+
+    existing_keys = pd.MultiIndex.from_arrays([df_scores[COUNTRY_AREA_COL].map(normalize_country_name), df_scores[YEAR_COL]])
+    action_keys = pd.MultiIndex.from_arrays([df_action[COUNTRY_AREA_COL].map(normalize_country_name), df_action[YEAR_COL]])
+    df_new_action = df_action[~action_keys.isin(existing_keys)]
+
+    if df_new_action.empty:
+        return df_scores
+
+    df_new_scores = transform_scores(model, df_new_action)
+    return (
+        pd.concat([df_scores, df_new_scores], ignore_index=True)
+        .sort_values([COUNTRY_AREA_COL, YEAR_COL])
+        .reset_index(drop=True)
+    )
+
+
+# ============================================
+# 部分集合でのPCA再計算（ダッシュボード用）
+# ============================================
+
+def get_action_data_version(data_path=DATA_PATH):
+    """
+    行動データのバージョン（CSV と年分割の列指向ファイルの更新時刻・サイズ）を返す。
+    read_table はどちらからも読み込むため、両方を含めます（reload.list_watched_files と同じ考え方）。
+    どちらも存在しない場合は None を返します。
+    """
+    paths = [os.path.join(data_path, ACTION_FILENAME)] + list_partition_files('action')
+    versions = [(path, get_file_version(path)) for path in paths]
+    if all(version is None for _, version in versions):
+        return None
+    return str(versions)
+
+
+def get_model_version(data_path=DATA_PATH):
+    return get_file_version(os.path.join(data_path, MODEL_FILENAME))
+
+
+@st.cache_data(show_spinner=False)
+def load_action_data_cached(data_version, data_path=DATA_PATH):
+    """
+    load_action_data のキャッシュ版。data_version が変わった場合のみ再読込します。
+    """
+    return load_action_data(data_path)
+
+
+@st.cache_resource(show_spinner=False)
+def load_pca_model_cached(model_version, data_path=DATA_PATH):
+    """
+    load_pca_model のキャッシュ版。model_version（モデルファイルのバージョン）が変わった場合のみ再読込します。
+    """
+    return load_pca_model(data_path)
+
+
+def resolve_action_countries(df, df_countries):
+    """
+    行動データから計算した結果（Country/Area 列は inbound_action.csv の表記）の国・地域を国ディメンションで解決し、
+    Country/Area 列を country_id とダッシュボードでの表記の country 列に置き換える。
+    PCスコアなど他のデータとは country_id で結合してください（表記ゆれがあっても結合漏れになりません）。
+    """
+    return apply_country_dimension(df, df_countries, country_col=COUNTRY_AREA_COL, drop_unknown=True)
+
+
+def subset_signature(countries, years, actions):
+    """
+    選択順に依存しない部分集合のシグネチャ（キャッシュキー）を作成する。
+    """
+    return (
+        tuple(sorted(countries)),
+        tuple(sorted(int(y) for y in years)),
+        tuple(sorted(actions)),
+    )
+
+
+def _align_signs(components, features, reference_model):
+    """
+    各主成分の符号を、保存済みモデル（全期間の固定軸）の対応する主成分と同じ向きに揃える。
+    共通する行動項目上での内積が負の主成分を反転します。
+    """
+    if reference_model is None:
+        return np.ones(components.shape[0])
+
+    ref_components = pd.DataFrame(reference_model['pca'].components_, columns=reference_model['features'])
+    shared = [f for f in features if f in ref_components.columns]
+    if not shared:
+        return np.ones(components.shape[0])
+
+    feature_pos = [features.index(f) for f in shared]
+    n_shared = min(components.shape[0], ref_components.shape[0])
+    signs = np.ones(components.shape[0])
+    dots = np.einsum('kf,kf->k', components[:n_shared][:, feature_pos], ref_components[shared].values[:n_shared])
+    signs[:n_shared] = np.where(dots < 0, -1.0, 1.0)
+    return signs
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def fit_subset_pca(data_version, signature, model_version=None, n_components=N_COMPONENTS_TO_KEEP, _df_action=None, _reference_model=None):
+    """
+    選択された国・年・行動の部分集合でPCAを再計算し、スコアと負荷量を返す。
+    標準化した行動行列に乱択SVD（randomized_svd）を適用し、上位 n_components 成分のみを計算します。
+    結果は (data_version, signature, model_version) 単位でメモ化されるため、同じ選択の再描画は即時に返ります。
+    主成分の符号は _reference_model に揃えるため、model_version には _reference_model のバージョン（get_model_version）を渡してください。
+
+    Returns:
+        dict: scores (国・年 × PC), loadings (行動 × PC), explained_variance_ratio (PC)
+              部分集合の行・列が不足している場合は None
+    """
+    countries, years, actions = signature
+    df = _df_action
+    df = df[df[COUNTRY_AREA_COL].isin(countries) & df[YEAR_COL].isin(years) & df[ACTION_COL].isin(actions)]
+
+    data_pivot = build_action_matrix(df)
+    n_components = min(n_components, data_pivot.shape[0] - 1, data_pivot.shape[1])
+    if n_components < 1:
+        return None
+
+    # StandardScaler と同じ標準化（母分散、分散 0 の列はスケーリングしない）
+    X = data_pivot.values.astype(float)
+    std = X.std(axis=0)
+    std[std == 0] = 1.0
+    X_scaled = (X - X.mean(axis=0)) / std
+
+    U, S, Vt = randomized_svd(X_scaled, n_components=n_components, n_oversamples=10, n_iter=7, random_state=0)
+    U, Vt = svd_flip(U, Vt, u_based_decision=False)
+
+    features = data_pivot.columns.tolist()
+    signs = _align_signs(Vt, features, _reference_model)
+    U = U * signs
+    Vt = Vt * signs[:, None]
+
+    pc_names = [f'PC{i+1}' for i in range(n_components)]
+    total_variance = (X_scaled ** 2).sum()
+
+    scores = pd.DataFrame(U * S, index=data_pivot.index, columns=pc_names).reset_index()
+    loadings = pd.DataFrame(Vt.T, index=features, columns=pc_names)
+    explained_variance_ratio = pd.Series(S ** 2 / total_variance if total_variance > 0 else np.zeros(n_components), index=pc_names)
+
+    return {
+        'scores': scores,
+        'loadings': loadings,
+        'explained_variance_ratio': explained_variance_ratio,
+    }
+
+
+# ============================================
+# スコアファイルの再生成・差分更新
+# ============================================
+
+def fit_and_export(data_path=DATA_PATH):
+    """
+    全年度で軸を学習し、モデルと pca_scores_timeseries.csv を書き出す（notebook 031 の出力処理に相当）。
+    """
+    df_action = load_action_data(data_path)
+    model = fit_pca_model(df_action)
+    save_pca_model(model, data_path)
+
+    scores_df = transform_scores(model, df_action)
+    scores_df.to_csv(os.path.join(data_path, SCORES_FILENAME), index=False, encoding='utf_8_sig')
+    return scores_df
+
+
+def update_scores_file(data_path=DATA_PATH):
+    """
+    保存済みのモデルを使い、新しい年の行動データのみを pca_scores_timeseries.csv に追記する。
+    """
+    model = load_pca_model(data_path)
+    if model is None:
+        raise FileNotFoundError(os.path.join(data_path, MODEL_FILENAME))
+
+    try:
+        df_scores = pd.read_csv(os.path.join(data_path, SCORES_FILENAME))
+    except FileNotFoundError:
+        df_scores = pd.DataFrame(columns=[COUNTRY_AREA_COL, YEAR_COL] + PC_COLUMNS)
+
+    df_updated = refresh_pca_scores(model, df_scores, load_action_data(data_path))
+    df_updated.to_csv(os.path.join(data_path, SCORES_FILENAME), index=False, encoding='utf_8_sig')
+    return df_updated
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python -m app.pca fit     ... 全年度で軸を再学習し、モデルとスコアを書き出す
+    #   python -m app.pca update  ... 保存済みの軸で新しい年のみスコアを追記する
+    command = sys.argv[1] if len(sys.argv) > 1 else "update"
+    if command == "fit":
+        df_result = fit_and_export()
+    elif command == "update":
+        df_result = update_scores_file()
+    else:
+        sys.exit(f"不明なコマンドです: {command}（fit または update を指定してください）")
+    print(f"{len(df_result)} 行のPCスコアを '{os.path.join(DATA_PATH, SCORES_FILENAME)}' に保存しました。")
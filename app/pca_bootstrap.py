@@ -0,0 +1,166 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+from app.pca import (
+    build_action_matrix, fit_pca_model, get_action_data_version, get_model_version,
+    load_action_data_cached, load_pca_model_cached, COUNTRY_AREA_COL, YEAR_COL
+)
+
+# ============================================
+# 定数
+# ============================================
+N_BOOTSTRAP = 200 # ブートストラップ反復回数
+CONFIDENCE_LEVEL = 0.95
+BOOTSTRAP_SEED = 0
+
+# 1ワーカーあたりの最小反復回数（プロセス起動コストに見合う単位で分割する）
+MIN_REPLICATES_PER_TASK = 10
+
+
+# ============================================
+# ブートストラップ反復（ワーカープロセスで実行）
+# ============================================
+
+def _run_replicates(X, country_codes, year_codes, ref_components, seed_sequences):
+    """
+    国と年をそれぞれ復元抽出して (国, 年) 行を再構成し、標準化+PCAを再学習する。
+    各反復の主成分は基準モデルの主成分と内積が正になるよう符号を揃え、
+    全ての (国, 年) 行をその軸に射影したスコアとともに返します。
+
+    Returns:
+        loadings: [反復, PC, 行動項目], scores: [反復, 行, PC]
+    """
+    n_components, n_features = ref_components.shape
+    n_countries = country_codes.max() + 1
+    n_years = year_codes.max() + 1
+
+    loadings = np.full((len(seed_sequences), n_components, n_features), np.nan)
+    scores = np.full((len(seed_sequences), X.shape[0], n_components), np.nan)
+
+    for b, seed_sequence in enumerate(seed_sequences):
+        rng = np.random.default_rng(seed_sequence)
+        country_counts = np.bincount(rng.integers(0, n_countries, n_countries), minlength=n_countries)
+        year_counts = np.bincount(rng.integers(0, n_years, n_years), minlength=n_years)
+
+        # 抽出された国 × 抽出された年 に該当する行を、抽出回数だけ複製する
+        row_weights = country_counts[country_codes] * year_counts[year_codes]
+        X_b = np.repeat(X, row_weights, axis=0)
+        if X_b.shape[0] <= n_components:
+            continue
+
+        mean = X_b.mean(axis=0)
+        std = X_b.std(axis=0)
+        std[std == 0] = 1.0
+
+        _, _, Vt = np.linalg.svd((X_b - mean) / std, full_matrices=False)
+        components = Vt[:n_components]
+
+        signs = np.sign(np.einsum('kf,kf->k', components, ref_components))
+        signs[signs == 0] = 1.0
+        components = components * signs[:, None]
+
+        loadings[b] = components
+        scores[b] = ((X - mean) / std) @ components.T
+
+    return loadings, scores
+
+
+# ============================================
+# 信頼区間の計算
+# ============================================
+@st.cache_data(show_spinner=False, persist="disk")
+def compute_bootstrap_intervals(action_data_version, model_version, n_bootstrap=N_BOOTSTRAP, confidence_level=CONFIDENCE_LEVEL, seed=BOOTSTRAP_SEED, _df_action=None, _model=None):
+    """
+    PCA負荷量と国・年別スコアのブートストラップ信頼区間を計算する。
+    反復はプロセスプールで並列に実行し、結果はデータ（行動データ・モデル）のバージョン単位でキャッシュします。
+
+    Returns:
+        dict:
+            loadings: Action, pc, estimate, lower, upper, std
+            scores: Country/Area, Year, pc, estimate, lower, upper, std
+    """
+    model = _model if _model is not None else fit_pca_model(_df_action)
+
+    data_pivot = build_action_matrix(_df_action).reindex(columns=model['features'], fill_value=0)
+    X = data_pivot.values.astype(float)
+    country_codes, _ = pd.factorize(data_pivot.index.get_level_values(COUNTRY_AREA_COL))
+    year_codes, _ = pd.factorize(data_pivot.index.get_level_values(YEAR_COL))
+    ref_components = model['pca'].components_
+
+    # 反復ごとに独立した乱数系列を割り当て、ワーカー数に応じてまとめて投入する
+    seed_sequences = np.random.SeedSequence(seed).spawn(n_bootstrap)
+    n_workers = max(1, min(os.cpu_count() or 1, n_bootstrap // MIN_REPLICATES_PER_TASK))
+    chunks = [chunk.tolist() for chunk in np.array_split(np.array(seed_sequences, dtype=object), n_workers)]
+
+    if n_workers == 1:
+        results = [_run_replicates(X, country_codes, year_codes, ref_components, chunks[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [
+                executor.submit(_run_replicates, X, country_codes, year_codes, ref_components, chunk)
+                for chunk in chunks
+            ]
+            results = [future.result() for future in futures]
+
+    loadings_b = np.concatenate([r[0] for r in results], axis=0)
+    scores_b = np.concatenate([r[1] for r in results], axis=0)
+
+    alpha = (1 - confidence_level) / 2
+    pc_names = [f'PC{i+1}' for i in range(ref_components.shape[0])]
+
+    # 負荷量: 推定値は基準モデルの値、区間は反復のパーセンタイル
+    loadings_lower, loadings_upper = np.nanquantile(loadings_b, [alpha, 1 - alpha], axis=0)
+    df_loadings = pd.DataFrame({
+        'Action': np.tile(model['features'], len(pc_names)),
+        'pc': np.repeat(pc_names, len(model['features'])),
+        'estimate': ref_components.ravel(),
+        'lower': loadings_lower.ravel(),
+        'upper': loadings_upper.ravel(),
+        'std': np.nanstd(loadings_b, axis=0).ravel(),
+    })
+
+    # スコア: 推定値は基準モデルで射影した値
+    estimate_scores = model['pca'].transform(model['scaler'].transform(X))
+    scores_lower, scores_upper = np.nanquantile(scores_b, [alpha, 1 - alpha], axis=0)
+    row_index = data_pivot.index.to_frame(index=False)
+    df_scores = pd.DataFrame({
+        COUNTRY_AREA_COL: np.repeat(row_index[COUNTRY_AREA_COL].values, len(pc_names)),
+        YEAR_COL: np.repeat(row_index[YEAR_COL].values, len(pc_names)),
+        'pc': np.tile(pc_names, len(row_index)),
+        'estimate': estimate_scores.ravel(),
+        'lower': scores_lower.ravel(),
+        'upper': scores_upper.ravel(),
+        'std': np.nanstd(scores_b, axis=0).ravel(),
+    })
+
+    return {'loadings': df_loadings, 'scores': df_scores}
+
+
+def get_bootstrap_intervals():
+    """
+    data/ 配下の現在の行動データ・保存済みモデルに対するブートストラップ信頼区間を返す。
+    行動データがない場合は None を返します。
+    """
+    action_data_version = get_action_data_version()
+    if action_data_version is None:
+        return None
+
+    model_version = get_model_version()
+    return compute_bootstrap_intervals(
+        action_data_version,
+        model_version,
+        _df_action=load_action_data_cached(action_data_version),
+        _model=load_pca_model_cached(model_version)
+    )
+
+
+def to_error_bars(df_intervals, value_col='estimate'):
+    """
+    区間 [lower, upper] を、Plotly の error_y / error_y_minus に渡せる上下の幅に変換する。
+    """
+    df = df_intervals.copy()
+    df['error_plus'] = (df['upper'] - df[value_col]).clip(lower=0)
+    df['error_minus'] = (df[value_col] - df['lower']).clip(lower=0)
+    return df
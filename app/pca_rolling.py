@@ -0,0 +1,224 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from scipy.linalg import orthogonal_procrustes, subspace_angles
+from app.pca import build_action_matrix, fit_pca_model, COUNTRY_AREA_COL, YEAR_COL
+
+# ============================================
+# 定数
+# ============================================
+DEFAULT_WINDOW_SIZE = 3 # 1ウィンドウあたりの年数（暦年）
+MAX_CACHED_WINDOWS = 256 # ウィンドウ単位のキャッシュに保持する結果の上限（古いものから破棄）
+
+
+# ============================================
+# ウィンドウ単位のPCA
+# ============================================
+
+@st.cache_resource(show_spinner=False)
+def _get_window_cache():
+    """
+    ウィンドウ単位の計算結果を保持するキャッシュ（全セッションで共有）と、その排他ロックを返す。
+    キーにはウィンドウ内データのハッシュを含めるため、新しい年が追加されても既存ウィンドウは再計算されません。
+    保持数は MAX_CACHED_WINDOWS までとし、最後に参照されたのが最も古い結果から破棄します。
+    """
+    return OrderedDict(), threading.Lock()
+
+
+def _get_cached_window(key):
+    window_cache, lock = _get_window_cache()
+    with lock:
+        result = window_cache.get(key)
+        if result is not None:
+            window_cache.move_to_end(key)
+        return result
+
+
+def _put_cached_window(key, result):
+    window_cache, lock = _get_window_cache()
+    with lock:
+        window_cache[key] = result
+        window_cache.move_to_end(key)
+        while len(window_cache) > MAX_CACHED_WINDOWS:
+            window_cache.popitem(last=False)
+
+
+def _window_key(data_window, model_version, ref_loadings):
+    """
+    ウィンドウの計算結果のキーを作成する。保存済みモデルがない場合は基準軸を現在のデータから学習し直すため、
+    モデルのバージョンに加えて基準軸そのもののハッシュを含めます（基準軸が変われば、行が同じウィンドウも揃え直す）。
+    """
+    row_hash = pd.util.hash_pandas_object(data_window.reset_index(), index=False).values
+    ref_hash = hashlib.sha256(np.ascontiguousarray(ref_loadings, dtype=float).tobytes()).hexdigest()
+    return (model_version, ref_hash, ref_loadings.shape, tuple(data_window.columns), row_hash.tobytes())
+
+
+def _fit_window(X_window, ref_loadings):
+    """
+    1ウィンドウ分の行列で標準化+PCAを学習し、基準軸へ直交プロクラステス回転で揃える。
+    回転は主成分空間内での回転・反転・入れ替えのみで、ウィンドウ内の説明力は変わりません。
+
+    Returns:
+        dict: aligned_loadings [行動項目, PC], aligned_scores [行, PC], explained_variance_ratio,
+              rotation [PC, PC], subspace_angle（基準の主成分空間との最大主角度, 度）
+    """
+    n_components = ref_loadings.shape[1]
+
+    mean = X_window.mean(axis=0)
+    std = X_window.std(axis=0)
+    std[std == 0] = 1.0
+    Z = (X_window - mean) / std
+
+    U, S, Vt = np.linalg.svd(Z, full_matrices=False)
+    loadings = Vt[:n_components].T
+    scores = U[:, :n_components] * S[:n_components]
+
+    rotation, _ = orthogonal_procrustes(loadings, ref_loadings)
+    aligned_scores = scores @ rotation
+    total_variance = (Z ** 2).sum()
+
+    return {
+        'aligned_loadings': loadings @ rotation,
+        'aligned_scores': aligned_scores,
+        # 回転後の各軸が説明する分散の割合（合計は回転前の上位 n_components 成分と同じ）
+        'explained_variance_ratio': (aligned_scores ** 2).sum(axis=0) / total_variance if total_variance > 0 else np.zeros(n_components),
+        'rotation': rotation,
+        'subspace_angle': float(np.degrees(subspace_angles(loadings, ref_loadings).max())),
+    }
+
+
+def make_windows(years, window_size=DEFAULT_WINDOW_SIZE):
+    """
+    暦年で連続する window_size 年のウィンドウ（1年ずつスライド）を作成する。
+    調査が行われなかった年（2020〜2021年など）があっても、ウィンドウの幅は暦年で数えます。
+
+    Returns:
+        list: (開始年, 終了年, ウィンドウ内のデータがある年のタプル, データがない年のタプル)
+    """
+    observed = set(int(year) for year in years)
+    if not observed:
+        return []
+    windows = []
+    for start in range(min(observed), max(observed) - window_size + 2):
+        calendar_years = range(start, start + window_size)
+        windows.append((
+            start,
+            start + window_size - 1,
+            tuple(year for year in calendar_years if year in observed),
+            tuple(year for year in calendar_years if year not in observed),
+        ))
+    return windows
+
+
+# ============================================
+# ローリングPCA
+# ============================================
+
+def compute_rolling_pca(df_action, model=None, model_version=None, window_size=DEFAULT_WINDOW_SIZE):
+    """
+    年のローリングウィンドウごとにPCAを学習し、各ウィンドウの軸を基準モデル（全期間の固定軸）へ揃える。
+    未計算のウィンドウのみをスレッドプールで並列に計算し、結果はウィンドウ単位でキャッシュします。
+    ウィンドウは暦年で作成し、データがない年を含むウィンドウは（実際の期間が他のウィンドウと異なるため）計算しません。
+
+    Returns:
+        dict:
+            drift: window, start_year, end_year, pc, congruence, axis_angle, explained_variance_ratio, subspace_angle
+            scores: window, end_year, Country/Area, Year, PC1..PCk（揃えた軸でのスコア）
+            skipped_windows: データがない年を含むため計算しなかったウィンドウ {ラベル: データがない年のタプル}
+    """
+    if model is None:
+        model = fit_pca_model(df_action)
+
+    data_pivot = build_action_matrix(df_action).reindex(columns=model['features'], fill_value=0)
+    ref_loadings = model['pca'].components_.T
+    n_components = ref_loadings.shape[1]
+    pc_names = [f'PC{i+1}' for i in range(n_components)]
+
+    row_years = data_pivot.index.get_level_values(YEAR_COL)
+    windows = make_windows(row_years.unique().tolist(), window_size)
+
+    window_data = {}
+    window_results = {}
+    skipped_windows = {}
+    pending = []
+    for start_year, end_year, observed_years, missing_years in windows:
+        label = f"{start_year}-{end_year}"
+        if missing_years:
+            skipped_windows[label] = missing_years
+            continue
+        data_window = data_pivot[row_years.isin(observed_years)]
+        if data_window.shape[0] <= n_components:
+            continue
+        key = _window_key(data_window, model_version, ref_loadings)
+        window_data[label] = (start_year, end_year, data_window, key)
+        # 他のセッションによる破棄に備え、参照した結果はこの呼び出しの中で保持する
+        cached = _get_cached_window(key)
+        if cached is None:
+            pending.append(label)
+        else:
+            window_results[label] = cached
+
+    if pending:
+        # SVD は GIL を解放するため、スレッドで並列に計算できる
+        with ThreadPoolExecutor(max_workers=min(len(pending), os.cpu_count() or 1)) as executor:
+            results = executor.map(
+                lambda label: _fit_window(window_data[label][2].values.astype(float), ref_loadings),
+                pending
+            )
+            for label, result in zip(pending, results):
+                window_results[label] = result
+                _put_cached_window(window_data[label][3], result)
+
+    drift_rows = []
+    score_frames = []
+    for label, (start_year, end_year, data_window, _) in window_data.items():
+        result = window_results[label]
+
+        # 合同係数（Tucker's congruence）: 揃えた軸と基準軸のコサイン類似度
+        aligned = result['aligned_loadings']
+        congruence = (aligned * ref_loadings).sum(axis=0) / (
+            np.linalg.norm(aligned, axis=0) * np.linalg.norm(ref_loadings, axis=0)
+        )
+
+        for k, pc in enumerate(pc_names):
+            drift_rows.append({
+                'window': label,
+                'start_year': start_year,
+                'end_year': end_year,
+                'pc': pc,
+                'congruence': congruence[k],
+                'axis_angle': float(np.degrees(np.arccos(np.clip(abs(congruence[k]), 0, 1)))),
+                'explained_variance_ratio': result['explained_variance_ratio'][k],
+                'subspace_angle': result['subspace_angle'],
+            })
+
+        df_window_scores = pd.DataFrame(result['aligned_scores'], columns=pc_names, index=data_window.index).reset_index()
+        df_window_scores.insert(0, 'window', label)
+        df_window_scores.insert(1, 'end_year', end_year)
+        score_frames.append(df_window_scores)
+
+    df_drift = pd.DataFrame(drift_rows)
+    df_scores = pd.concat(score_frames, ignore_index=True) if score_frames else pd.DataFrame()
+    return {'drift': df_drift, 'scores': df_scores, 'skipped_windows': skipped_windows}
+
+
+@st.cache_data(show_spinner=False)
+def compute_rolling_pca_cached(action_data_version, model_version, window_size=DEFAULT_WINDOW_SIZE, _df_action=None, _model=None):
+    """
+    compute_rolling_pca のキャッシュ版（データ・モデルのバージョンとウィンドウ幅単位）。
+    """
+    return compute_rolling_pca(_df_action, model=_model, model_version=model_version, window_size=window_size)
+
+
+def summarize_window_scores(df_scores, countries, country_col=COUNTRY_AREA_COL):
+    """
+    ウィンドウごとに、選択した国の揃えた軸でのスコアをウィンドウ内の平均に集約する。
+    """
+    df = df_scores[df_scores[country_col].isin(countries)]
+    pc_columns = [col for col in df.columns if col.startswith('PC')]
+    return df.groupby(['window', 'end_year', country_col], as_index=False)[pc_columns].mean()
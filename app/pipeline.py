@@ -0,0 +1,113 @@
+import pandas as pd
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# ============================================
+# 定数
+# ============================================
+# 同時に実行する段階の数の上限（CSV の解析や集計は GIL を解放する処理が多いため、スレッドで並列化する）
+MAX_WORKERS = int(os.environ.get("INBOUND_LOAD_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+_last_timings = {}
+_timings_lock = threading.Lock()
+
+
+# ============================================
+# 依存関係のある段階の並列実行
+# ============================================
+
+def _check_stages(stages):
+    """
+    依存先が全て定義されており、循環がないことを確認する。
+    """
+    for name, (_, dependencies) in stages.items():
+        missing = [dep for dep in dependencies if dep not in stages]
+        if missing:
+            raise ValueError(f"段階 '{name}' の依存先が定義されていません: {missing}")
+
+    visited = set()
+    visiting = set()
+
+    def visit(name):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"段階の依存関係が循環しています: {name}")
+        visiting.add(name)
+        for dep in stages[name][1]:
+            visit(dep)
+        visiting.discard(name)
+        visited.add(name)
+
+    for name in stages:
+        visit(name)
+
+
+def run_stages(stages, max_workers=MAX_WORKERS, pipeline_name=None):
+    """
+    依存関係のある段階をスレッドプールで実行する。依存先が全て完了した段階から順に開始するため、
+    互いに独立な段階（各ファイルの読込と前処理など）は並列に実行され、全体の所要時間は最も長い依存の連なりに近づきます。
+    いずれかの段階で例外が発生した場合は、未開始の段階を実行せずにその例外を送出します。
+
+    Args:
+        stages: {段階名: (関数, [依存先の段階名])}。関数には依存先の結果が、依存先の並び順で位置引数として渡されます。
+        pipeline_name: 指定した場合、段階別の所要時間を get_last_timings(pipeline_name) で参照できるように記録します。
+
+    Returns:
+        (dict, DataFrame): {段階名: 結果}, 段階別の所要時間（stage, start_sec, elapsed_sec, thread）
+    """
+    _check_stages(stages)
+
+    results = {}
+    timings = []
+    pending = dict(stages)
+    running = {}
+    origin = time.perf_counter()
+
+    def run_stage(name, func, args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            timings.append({
+                'stage': name,
+                'start_sec': start - origin,
+                'elapsed_sec': time.perf_counter() - start,
+                'thread': threading.current_thread().name,
+            })
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="inbound-load") as executor:
+        while pending or running:
+            ready = [name for name, (_, deps) in pending.items() if all(dep in results for dep in deps)]
+            for name in ready:
+                func, deps = pending.pop(name)
+                running[executor.submit(run_stage, name, func, [results[dep] for dep in deps])] = name
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    for other in running:
+                        other.cancel()
+                    raise error
+                results[name] = future.result()
+
+    df_timings = pd.DataFrame(timings, columns=['stage', 'start_sec', 'elapsed_sec', 'thread'])
+    df_timings = df_timings.sort_values('start_sec').reset_index(drop=True)
+    df_timings.attrs['total_sec'] = time.perf_counter() - origin
+
+    if pipeline_name is not None:
+        with _timings_lock:
+            _last_timings[pipeline_name] = df_timings
+    return results, df_timings
+
+
+def get_last_timings(pipeline_name):
+    """
+    最後に実行した段階別の所要時間を返す（未実行の場合は None）。attrs['total_sec'] に全体の所要時間を持ちます。
+    """
+    with _timings_lock:
+        return _last_timings.get(pipeline_name)
@@ -0,0 +1,168 @@
+import streamlit as st
+import numpy as np
+import os
+import sys
+import re
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# ============================================
+# 定数
+# ============================================
+
+# プロファイル出力先（環境変数で上書き可能）
+PROFILE_DIR = os.environ.get("INBOUND_PROFILE_DIR", "profiles")
+
+# サンプリング間隔（秒）。5ms 間隔であれば再実行時間への影響はごく小さい
+PROFILE_INTERVAL_SEC = float(os.environ.get("INBOUND_PROFILE_INTERVAL", "0.005"))
+
+# 「?profile=N」で次の N 回の再実行をプロファイルする
+PROFILE_QUERY_PARAM = "profile"
+
+# 管理者向けトグル（サイドバー）を表示するかどうか
+PROFILE_ADMIN_ENABLED = os.environ.get("INBOUND_PROFILE_ADMIN", "0") == "1"
+
+_REMAINING_KEY = "_profile_reruns_remaining"
+
+
+# ============================================
+# サンプリングプロファイラ
+# ============================================
+class StackSampler:
+    """
+    対象スレッドのコールスタックを一定間隔で採取するサンプリングプロファイラ。
+    計測対象のコードには一切手を入れず、別スレッドから sys._current_frames() を参照するため、
+    cProfile のような関数呼び出しごとのオーバーヘッドが発生しません。
+    結果は flamegraph.pl / speedscope で読み込める collapsed stack 形式で出力します。
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL_SEC):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.sample_count = 0
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="inbound-stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+
+            self.stacks[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def to_collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+# ============================================
+# ヘルパー関数
+# ============================================
+
+def _collect_widget_params():
+    """
+    セッションステートから、JSON化可能なウィジェット値（選択年・国・費目など）のみを抽出する。
+    DataFrame や関数など、再現に不要な値は除外します。
+    """
+    params = {}
+    for key, value in st.session_state.to_dict().items():
+        if not isinstance(key, str) or key.startswith("_"):
+            continue
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, (str, int, float, bool, list, tuple)) or value is None:
+            params[key] = value
+    return params
+
+
+def _arm_from_request():
+    """
+    クエリパラメータまたは管理者トグルから、プロファイル対象の再実行回数を設定する。
+    クエリパラメータは一度読み取ったら削除し、以降の再実行で回数がリセットされないようにします。
+    """
+    requested = st.query_params.get(PROFILE_QUERY_PARAM)
+    if requested is not None:
+        try:
+            st.session_state[_REMAINING_KEY] = max(int(requested), 0)
+        except ValueError:
+            pass
+        del st.query_params[PROFILE_QUERY_PARAM]
+
+    if PROFILE_ADMIN_ENABLED:
+        with st.sidebar.expander("プロファイル取得（管理者）"):
+            n_reruns = st.number_input("次の再実行をプロファイルする回数", min_value=0, max_value=100, value=5, step=1, key="_profile_admin_n")
+            if st.button("プロファイル開始", key="_profile_admin_start"):
+                st.session_state[_REMAINING_KEY] = int(n_reruns)
+            st.caption(f"残り: {st.session_state.get(_REMAINING_KEY, 0)} 回 / 出力先: {PROFILE_DIR}/")
+
+
+def _write_profile(page_name, sampler, elapsed_sec, widget_params):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    safe_page_name = re.sub(r'[\\/:*?"<>|\s]+', "_", page_name)
+    base_name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{safe_page_name}"
+
+    with open(os.path.join(PROFILE_DIR, base_name + ".collapsed"), "w", encoding="utf-8") as f:
+        f.write(sampler.to_collapsed())
+
+    meta = {
+        "page": page_name,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "elapsed_sec": round(elapsed_sec, 4),
+        "interval_sec": sampler.interval,
+        "samples": sampler.sample_count,
+        "widget_params": widget_params,
+    }
+    with open(os.path.join(PROFILE_DIR, base_name + ".json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+
+
+# ============================================
+# ページ再実行のプロファイル
+# ============================================
+@contextmanager
+def profile_rerun(page_name):
+    """
+    ページ関数の実行をプロファイル対象として囲むコンテキストマネージャ。
+    残り回数が設定されている場合のみサンプリングを行い、ページ名とウィジェット値とともに
+    PROFILE_DIR 配下へ書き出します。st.stop() による中断時も書き出しは行います。
+    """
+    _arm_from_request()
+
+    remaining = st.session_state.get(_REMAINING_KEY, 0)
+    if remaining <= 0:
+        yield
+        return
+
+    st.session_state[_REMAINING_KEY] = remaining - 1
+    sampler = StackSampler(threading.get_ident())
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        elapsed_sec = time.perf_counter() - start
+        try:
+            _write_profile(page_name, sampler, elapsed_sec, _collect_widget_params())
+        except OSError as e:
+            st.warning(f"プロファイルの書き出しに失敗しました: {e}")
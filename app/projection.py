@@ -0,0 +1,251 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import warnings
+from app.forecast import forecast_visitors
+from app.countries import AGGREGATE_COUNTRY
+
+# ============================================
+# 定数
+# ============================================
+SPEND_TREND_YEARS = 3 # 消費単価のトレンド推定に使用する直近の年数
+SPEND_GROWTH_CAP = 0.20 # 消費単価の年率変化の上限（±）
+
+# ポテンシャル分析データの消費単価以外の列
+ID_COLUMNS = ['year', 'country', 'Quarter', 'Annual_Visitors', 'Quarterly_Visitors', 'Market_Potential_Total']
+QUADRANTS = np.array(["LL", "HL", "LH", "HH"]) # (消費単価が高い) * 2 + (訪日客数が多い) の順
+QUADRANT_ORDER = ["HH", "LH", "HL", "LL"]
+QUADRANT_NAME_MAP = {
+    "HH": "戦略的中核市場（量×質）",
+    "LH": "高付加価値市場（質重視）",
+    "HL": "量主導市場（単価改善余地）",
+    "LL": "限定対応市場（探索・維持）"
+}
+
+
+# ============================================
+# 消費単価・訪日客数の翌年予測
+# ============================================
+
+def _project_spend(df_potential, group_cols, spend_columns, target_year):
+    """
+    グループ（国、または国×四半期）× 消費単価項目 の全ての組み合わせについて、
+    直近 SPEND_TREND_YEARS 年の対数消費単価に単回帰を当てはめ、target_year の消費単価を一括で求める。
+    [グループ, 項目, 年] の3次元配列上で閉形式の最小二乗解を計算し、最後の観測値を起点に傾きで延長します。
+    観測が1年のみの組み合わせは横ばい、観測がない組み合わせは 0 とします。
+
+    Returns:
+        (Index, ndarray): グループのインデックス, 消費単価 [グループ, 項目]
+    """
+    years = np.sort(df_potential['year'].unique())[-SPEND_TREND_YEARS:]
+    df = df_potential[df_potential['year'].isin(years)]
+    df_wide = (
+        df.set_index(group_cols + ['year'])[spend_columns]
+        .unstack('year')
+        .reindex(columns=pd.MultiIndex.from_product([spend_columns, years]))
+    )
+
+    S = df_wide.to_numpy(dtype=float).reshape(len(df_wide), len(spend_columns), len(years))
+    mask = S > 0
+    w = mask.astype(float)
+    log_S = np.where(mask, np.log(np.where(mask, S, 1.0)), 0.0)
+
+    x = years.astype(float) - years.mean()
+    n = w.sum(axis=-1)
+    sum_x = w @ x
+    sum_xx = w @ (x * x)
+    sum_y = log_S.sum(axis=-1)
+    sum_xy = log_S @ x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s_xx = sum_xx - sum_x * sum_x / n
+        slope = (sum_xy - sum_x * sum_y / n) / s_xx
+    slope = np.where((n >= 2) & (s_xx > 0), slope, 0.0)
+    slope = np.clip(slope, np.log(1 - SPEND_GROWTH_CAP), np.log(1 + SPEND_GROWTH_CAP))
+
+    # 最後に観測された年とその値（末尾から見て最初の観測）
+    last_pos = len(years) - 1 - np.argmax(mask[..., ::-1], axis=-1)
+    last_log = np.take_along_axis(log_S, last_pos[..., None], axis=-1)[..., 0]
+    last_year = years[last_pos]
+
+    projected = np.exp(last_log + slope * (target_year - last_year))
+    return df_wide.index, np.where(mask.any(axis=-1), projected, 0.0)
+
+
+def _project_visitors(df_forecast, target_year, by_quarter):
+    """
+    月次予測を target_year の年間（または四半期）合計に集計する。
+    """
+    df = df_forecast[df_forecast['date'].dt.year == target_year].copy()
+    group_cols = ['country']
+    if by_quarter:
+        df['Quarter'] = ((df['date'].dt.month - 1) // 3 + 1).astype(str) + 'Q'
+        group_cols = ['country', 'Quarter']
+    return df.groupby(group_cols)['forecast'].sum()
+
+
+# ============================================
+# 象限の一括判定
+# ============================================
+
+def _broadcast_positions(visitors, spend):
+    V = np.broadcast_to(np.asarray(visitors, dtype=float)[..., None], np.shape(spend))
+    S = np.asarray(spend, dtype=float)
+    return V, S, (V > 0) & (S > 0)
+
+
+def compute_quadrant_thresholds(visitors, spend):
+    """
+    訪日客数 [..., 国] と消費単価 [..., 国, 項目] から、項目ごとの象限の基準線を一括で計算する。
+    基準線は、対数表示可能な（正の値の）国を母集団とした対数中央値を元スケールへ戻した値です（0110 のバブルチャートと同じ基準）。
+
+    Returns:
+        (ndarray, ndarray): 訪日客数の基準線 [..., 1, 項目], 消費単価の基準線 [..., 1, 項目]
+    """
+    V, S, valid = _broadcast_positions(visitors, spend)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_V = np.where(valid, np.log(V), np.nan)
+        log_S = np.where(valid, np.log(S), np.nan)
+
+    # 母集団が空の項目の基準線は NaN となる
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median_V = np.nanmedian(log_V, axis=-2, keepdims=True)
+        median_S = np.nanmedian(log_S, axis=-2, keepdims=True)
+
+    return np.exp(median_V), np.exp(median_S)
+
+
+def compute_quadrant_codes(visitors, spend):
+    """
+    訪日客数 [..., 国] と消費単価 [..., 国, 項目] から、全ての項目の象限を整数コードで一括判定する。
+    コードは QUADRANTS のインデックス（0: LL, 1: HL, 2: LH, 3: HH）で、判定できない組み合わせは -1 です。
+    """
+    V, S, valid = _broadcast_positions(visitors, spend)
+    threshold_V, threshold_S = compute_quadrant_thresholds(visitors, spend)
+
+    # 0110 と同様に、元スケールへ戻した基準線と比較する
+    with np.errstate(invalid='ignore'):
+        codes = (S >= threshold_S).astype(int) * 2 + (V >= threshold_V).astype(int)
+    return np.where(valid, codes, -1)
+
+
+def classify_quadrants(visitors, spend):
+    """
+    訪日客数 [..., 国] と消費単価 [..., 国, 項目] から、全ての項目の象限（HH/LH/HL/LL）を一括で判定する。
+    判定できない組み合わせは None とします。
+    """
+    codes = compute_quadrant_codes(visitors, spend)
+    return np.where(codes >= 0, QUADRANTS[np.maximum(codes, 0)], None)
+
+
+# ============================================
+# 翌年の市場ポテンシャル
+# ============================================
+
+def _build_projection(df_actual, df_forecast, target_year, base_year, by_quarter):
+    """
+    予測訪日客数 × 予測消費単価（全項目）を1回のブロードキャスト演算で計算し、
+    実績データと同じ列構成の予測データと、基準年からの象限の移動を返す。
+    """
+    visitors_col = 'Quarterly_Visitors' if by_quarter else 'Annual_Visitors'
+    group_cols = ['country', 'Quarter'] if by_quarter else ['country']
+    spend_columns = [col for col in df_actual.columns if col not in ID_COLUMNS]
+
+    df_actual = df_actual[df_actual['country'] != AGGREGATE_COUNTRY]
+    spend_index, spend = _project_spend(df_actual, group_cols, spend_columns, target_year)
+    visitors = _project_visitors(df_forecast, target_year, by_quarter).reindex(spend_index)
+
+    # [グループ] × [グループ, 項目] → 全項目の市場ポテンシャル [グループ, 項目]
+    V = visitors.to_numpy(dtype=float)
+    potential = V[:, None] * spend
+
+    df_projected = pd.DataFrame(spend, columns=spend_columns, index=spend_index).reset_index()
+    df_projected.insert(0, 'year', target_year)
+    df_projected.insert(len(group_cols) + 1, visitors_col, V)
+    df_projected['Market_Potential_Total'] = potential[:, spend_columns.index('Avg_Total_Spend')]
+    df_projected = df_projected.dropna(subset=[visitors_col]).reindex(columns=df_actual.columns)
+
+    # 基準年の実績を同じ並びに揃え、象限を [四半期, 国, 項目] の配列で一括判定する
+    df_base = df_actual[df_actual['year'] == base_year].set_index(group_cols).reindex(spend_index)
+    countries = spend_index.get_level_values('country').unique()
+    if by_quarter:
+        quarter_order = sorted(spend_index.get_level_values('Quarter').unique())
+        full_index = pd.MultiIndex.from_product([countries, quarter_order], names=group_cols)
+    else:
+        full_index = spend_index
+
+    def to_tensor(df):
+        # [国(, 四半期), ...] → [(四半期,) 国, ...]
+        values = df.reindex(full_index).to_numpy(dtype=float)
+        if not by_quarter:
+            return values
+        return np.swapaxes(values.reshape((len(countries), len(quarter_order)) + values.shape[1:]), 0, 1)
+
+    V_base = to_tensor(df_base[visitors_col])
+    S_base = to_tensor(df_base[spend_columns])
+    V_projected = to_tensor(pd.Series(V, index=spend_index))
+    S_projected = to_tensor(pd.DataFrame(spend, index=spend_index))
+
+    df_migration = pd.DataFrame({
+        'country': np.tile(np.repeat(countries, len(spend_columns)), len(quarter_order) if by_quarter else 1),
+        'item': np.tile(spend_columns, len(full_index)),
+    })
+    if by_quarter:
+        df_migration.insert(0, 'Quarter', np.repeat(quarter_order, len(countries) * len(spend_columns)))
+
+    df_migration['base_quadrant'] = classify_quadrants(V_base, S_base).ravel()
+    df_migration['projected_quadrant'] = classify_quadrants(V_projected, S_projected).ravel()
+    df_migration['base_potential'] = (V_base[..., None] * S_base).ravel()
+    df_migration['projected_potential'] = (V_projected[..., None] * S_projected).ravel()
+
+    return df_projected, df_migration
+
+
+@st.cache_data(show_spinner=False)
+def compute_market_potential_projection(data_version, _fact_store=None, _df_market_potential_yearly=None, _df_market_potential_quarterly=None):
+    """
+    実績の最終年の翌年について、年次・四半期別の市場ポテンシャル（予測訪日客数 × 予測消費単価）を計算する。
+    訪日客数は forecast_visitors の月次予測を集計し、消費単価は全ての国 × 項目のトレンドを一括で延長します。
+    結果は data_version（入力の各データを取得したデータのバージョン。st.session_state.data_version）単位でキャッシュします。
+
+    Returns:
+        dict:
+            target_year, base_year,
+            yearly / quarterly: 実績データと同じ列構成の予測データ,
+            migration_yearly / migration_quarterly: country, (Quarter), item, base_quadrant, projected_quadrant,
+                                                    base_potential, projected_potential
+    """
+    # 翌年は、訪日客数・消費額のいずれかの実績がある最終年の翌年とする
+    last_date = _fact_store['dimensions']['period']['date'].max()
+    base_year = int(_df_market_potential_yearly['year'].max())
+    target_year = max(base_year, last_date.year) + 1
+
+    # target_year の12月までを予測する
+    horizon = (target_year - last_date.year) * 12 + (12 - last_date.month)
+    df_forecast = forecast_visitors(data_version, horizon, _fact_store=_fact_store)
+
+    df_yearly, df_migration_yearly = _build_projection(_df_market_potential_yearly, df_forecast, target_year, base_year, by_quarter=False)
+    df_quarterly, df_migration_quarterly = _build_projection(_df_market_potential_quarterly, df_forecast, target_year, base_year, by_quarter=True)
+
+    return {
+        'target_year': target_year,
+        'base_year': base_year,
+        'yearly': df_yearly,
+        'quarterly': df_quarterly,
+        'migration_yearly': df_migration_yearly,
+        'migration_quarterly': df_migration_quarterly,
+    }
+
+
+def get_market_potential_projection(data_version, fact_store, df_market_potential_yearly, df_market_potential_quarterly):
+    """
+    セッションが表示しているデータ（data_version の版）に対する翌年の市場ポテンシャル予測を返す。
+    """
+    return compute_market_potential_projection(
+        data_version,
+        _fact_store=fact_store,
+        _df_market_potential_yearly=df_market_potential_yearly,
+        _df_market_potential_quarterly=df_market_potential_quarterly
+    )
@@ -0,0 +1,152 @@
+import os
+import hashlib
+import threading
+from datetime import datetime
+from app.versioning import get_file_version, get_file_fingerprint
+from app.columnar import DATA_PATH, SOURCE_TABLES, list_partition_files
+from app.pca import SCORES_FILENAME, MODEL_FILENAME
+
+# ============================================
+# 定数
+# ============================================
+# "0" を指定した場合は data/ の変更を監視しない（起動時に読み込んだデータを使い続ける）
+RELOAD_ENABLED = os.environ.get("INBOUND_HOT_RELOAD", "1") == "1"
+
+# data/ の変更を確認する間隔（秒）
+RELOAD_INTERVAL_SEC = float(os.environ.get("INBOUND_RELOAD_INTERVAL", "30"))
+
+
+# ============================================
+# 監視対象のファイルとバージョン
+# ============================================
+
+def list_watched_files(data_path=DATA_PATH):
+    """
+    load_data の入力となるファイル（CSV・年分割の列指向ファイル・PCAのスコアとモデル）の一覧を返す。
+    """
+    paths = [os.path.join(data_path, filename) for filename, _, _ in SOURCE_TABLES.values()]
+    paths += [os.path.join(data_path, SCORES_FILENAME), os.path.join(data_path, MODEL_FILENAME)]
+    for table in SOURCE_TABLES:
+        paths += list_partition_files(table)
+    return paths
+
+
+def get_stat_signature(paths):
+    """
+    ファイルの一覧と更新時刻・サイズの組を返す（変更の有無を安価に確認するためのもの）。
+    """
+    return tuple((path, get_file_version(path)) for path in paths)
+
+
+# ============================================
+# 共有データストア（バックグラウンドでの再構築と差し替え）
+# ============================================
+class DataStore:
+    """
+    load_data の結果を全セッションで共有し、data/ の変更を検知したらバックグラウンドで再構築して差し替えるストア。
+    変更はまず更新時刻・サイズで確認し、変わったファイルのみ内容のハッシュを計算して、内容が変わった場合にのみ再構築します。
+    再構築中も利用者には直前のデータを返し、完成したデータ（バージョン・結果・読込時刻の組）を1回の代入で差し替えるため、
+    1回の snapshot() で受け取るデータが新旧混在することはありません。再構築に失敗した場合は直前のデータを使い続けます。
+    """
+
+    def __init__(self, build_func, list_files_func=list_watched_files, interval=RELOAD_INTERVAL_SEC):
+        self.build_func = build_func
+        self.list_files_func = list_files_func
+        self.interval = interval
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._file_hashes = {} # パス → (更新時刻・サイズ, SHA-256)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # 初回は同期的に構築する（必須ファイルがない場合は FileNotFoundError を送出）
+        signature = get_stat_signature(self.list_files_func())
+        self._signature = signature
+        # (データ, データを構築したときのファイルの状態) の組を1回の代入で差し替える
+        self._state = (self._build(signature), signature)
+
+    def snapshot(self):
+        """
+        (バージョン, load_data の結果, 読込時刻) を返す。
+        """
+        return self._state[0]
+
+    def is_current(self, version):
+        """
+        version が現在のデータのバージョンで、かつ data/ のファイルがそのデータの構築時から変わっていないかを返す。
+        ファイルを直接読む処理（SQL バックエンドなど）の結果を、利用者のデータと同じ版として扱えるかの確認に使用します。
+        """
+        snapshot, snapshot_signature = self._state
+        return version == snapshot[0] and get_stat_signature(self.list_files_func()) == snapshot_signature
+
+    def start_polling(self):
+        """
+        変更を一定間隔で確認するデーモンスレッドを開始する（2回目以降の呼び出しは何もしない）。
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._poll, name="inbound-data-reload", daemon=True)
+        self._thread.start()
+
+    def stop_polling(self):
+        self._stop_event.set()
+
+    def _poll(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.refresh()
+            except OSError as e: # 確認中にファイルが削除・置換された場合など。次の間隔で再確認する
+                self.last_error = e
+
+    def refresh(self):
+        """
+        変更を確認し、内容が変わっていれば再構築して差し替える。
+
+        Returns:
+            bool: 差し替えた場合 True
+        """
+        signature = get_stat_signature(self.list_files_func())
+        if signature == self._signature:
+            return False
+
+        version = self._get_content_version(signature)
+        self._signature = signature
+        if version == self._state[0][0]:
+            # 内容は同じ（更新時刻のみの変更など）のため、データはそのままでファイルの状態のみを更新する
+            self._state = (self._state[0], signature)
+            return False
+
+        try:
+            new_snapshot = self._build(signature, version)
+        except Exception as e: # 書き込み途中のファイルなど。次の変更時に再試行する
+            self.last_error = e
+            return False
+
+        self.last_error = None
+        self._state = (new_snapshot, signature)
+        return True
+
+    def _get_content_version(self, signature):
+        """
+        全ての入力ファイルの内容のハッシュから、データのバージョン（先頭12文字）を作成する。
+        更新時刻・サイズが前回と同じファイルは、前回のハッシュを再利用します。
+        """
+        digest = hashlib.sha256()
+        file_hashes = {}
+        for path, file_version in signature:
+            if file_version is None:
+                continue
+            cached = self._file_hashes.get(path)
+            file_hash = cached[1] if cached and cached[0] == file_version else get_file_fingerprint(path)
+            file_hashes[path] = (file_version, file_hash)
+            digest.update(f"{path}:{file_hash};".encode('utf-8'))
+        self._file_hashes = file_hashes
+        return digest.hexdigest()[:12]
+
+    def _build(self, signature, version=None):
+        if version is None:
+            version = self._get_content_version(signature)
+        results = self.build_func()
+        return version, results, datetime.now()
+
@@ -0,0 +1,180 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+from app.projection import ID_COLUMNS
+from app.facts import pivot_visitors
+
+# ============================================
+# 定数
+# ============================================
+GRAIN_MONTH = 'month'
+GRAIN_QUARTER = 'quarter'
+GRAIN_YEAR = 'year'
+GRAIN_FISCAL_YEAR = 'fiscal_year'
+GRAIN_ROLLING_12M = 'rolling_12m'
+
+GRAIN_LABELS = {
+    GRAIN_MONTH: '月次',
+    GRAIN_QUARTER: '四半期',
+    GRAIN_YEAR: '暦年',
+    GRAIN_FISCAL_YEAR: '年度 (4月〜翌3月)',
+    GRAIN_ROLLING_12M: '12か月移動合計',
+}
+
+# 1期間あたりの月数（この月数がそろった期間のみ集計値を採用する）
+GRAIN_MONTHS = {
+    GRAIN_MONTH: 1,
+    GRAIN_QUARTER: 3,
+    GRAIN_YEAR: 12,
+    GRAIN_FISCAL_YEAR: 12,
+    GRAIN_ROLLING_12M: 12,
+}
+
+FISCAL_YEAR_START_MONTH = 4 # 年度の開始月
+
+
+def get_fiscal_year(dates):
+    """
+    日付（DatetimeIndex / Series）から年度（4月始まり。1〜3月は前年の年度）を返す。
+    """
+    dates = pd.DatetimeIndex(dates)
+    return dates.year - (dates.month < FISCAL_YEAR_START_MONTH).astype(int)
+
+
+# ============================================
+# 累積和キューブ
+# ============================================
+
+@st.cache_data(show_spinner=False)
+def build_visitor_cube(df_jnto_pivot):
+    """
+    月次の訪日客数（行: 月, 列: 国）から、全ての国について月方向の累積和と観測月数の累積を作成する。
+    欠けている月は 0 として累積し、観測月数で欠測を判定します。
+    任意の月の範囲 [start, end) の合計は cumsum[end] - cumsum[start] の1回の引き算で求まります。
+
+    Returns:
+        dict: months (DatetimeIndex, 欠けのない月初の系列), countries, cumsum [月数 + 1, 国], cumcount [月数 + 1, 国]
+    """
+    months = pd.date_range(df_jnto_pivot.index.min(), df_jnto_pivot.index.max(), freq='MS')
+    values = df_jnto_pivot.reindex(months).to_numpy(dtype=float)
+    observed = ~np.isnan(values)
+
+    n_countries = values.shape[1]
+    cumsum = np.vstack([np.zeros((1, n_countries)), np.cumsum(np.where(observed, values, 0.0), axis=0)])
+    cumcount = np.vstack([np.zeros((1, n_countries), dtype=int), np.cumsum(observed, axis=0)])
+
+    return {
+        'months': months,
+        'countries': df_jnto_pivot.columns.tolist(),
+        'cumsum': cumsum,
+        'cumcount': cumcount,
+    }
+
+
+def range_totals(cube, start, end):
+    """
+    月インデックスの範囲 [start, end)（配列可）について、全ての国の合計と観測月数を返す。
+
+    Returns:
+        (ndarray, ndarray): 合計 [範囲, 国], 観測月数 [範囲, 国]
+    """
+    start = np.asarray(start)
+    end = np.asarray(end)
+    return cube['cumsum'][end] - cube['cumsum'][start], cube['cumcount'][end] - cube['cumcount'][start]
+
+
+def _period_bounds(months, grain):
+    """
+    集計単位ごとの期間の代表日（期間の開始月。移動合計は終了月）と、月インデックスの範囲 [start, end) を返す。
+    """
+    n_months = len(months)
+    if grain == GRAIN_ROLLING_12M:
+        end = np.arange(GRAIN_MONTHS[grain], n_months + 1)
+        return months[end - 1], end - GRAIN_MONTHS[grain], end
+
+    if grain == GRAIN_MONTH:
+        keys = np.arange(n_months)
+    elif grain == GRAIN_QUARTER:
+        keys = months.year * 4 + (months.month - 1) // 3
+    elif grain == GRAIN_YEAR:
+        keys = months.year
+    elif grain == GRAIN_FISCAL_YEAR:
+        keys = get_fiscal_year(months)
+    else:
+        raise ValueError(f"未対応の集計単位です: {grain}")
+
+    # 月は連続しているため、キーが変わる位置が期間の境界になる
+    keys = np.asarray(keys)
+    start = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    end = np.r_[start[1:], n_months]
+    return months[start], start, end
+
+
+def rollup_visitors(cube, grain, complete_only=True):
+    """
+    累積和キューブから、指定した集計単位の訪日客数（行: 期間, 列: 国）を一括で作成する。
+    complete_only の場合、期間内の月がそろっていない（データの最初・最後の途中の期間や欠測がある）値は NaN とします。
+
+    Returns:
+        DataFrame: index は期間の代表日（月次・四半期・暦年・年度は開始月、12か月移動合計は終了月）
+    """
+    period_dates, start, end = _period_bounds(cube['months'], grain)
+    totals, counts = range_totals(cube, start, end)
+
+    if complete_only:
+        totals = np.where(counts == GRAIN_MONTHS[grain], totals, np.nan)
+    else:
+        totals = np.where(counts > 0, totals, np.nan)
+
+    return pd.DataFrame(totals, index=pd.DatetimeIndex(period_dates, name='date'), columns=cube['countries'])
+
+
+def get_period_labels(period_dates, grain):
+    """
+    期間の代表日を、集計単位に応じた表示用ラベル（例: '2024年', '2024年度', '2024-Q3'）に変換する。
+    """
+    period_dates = pd.DatetimeIndex(period_dates)
+    if grain == GRAIN_YEAR:
+        return [f"{y}年" for y in period_dates.year]
+    if grain == GRAIN_FISCAL_YEAR:
+        return [f"{y}年度" for y in get_fiscal_year(period_dates)]
+    if grain == GRAIN_QUARTER:
+        return [f"{y}-Q{q}" for y, q in zip(period_dates.year, period_dates.quarter)]
+    if grain == GRAIN_ROLLING_12M:
+        return [f"{d:%Y年%m月}までの12か月" for d in period_dates]
+    return [f"{d:%Y年%m月}" for d in period_dates]
+
+
+# ============================================
+# 年度単位の市場ポテンシャル
+# ============================================
+
+@st.cache_data(show_spinner=False)
+def build_fiscal_year_potential(data_version, _fact_store=None, _df_market_potential_quarterly=None):
+    """
+    年度（4月〜翌3月）単位の市場ポテンシャル分析データを作成する。
+    訪日客数は累積和キューブによる年度合計、消費単価は年度に含まれる4四半期（当年 2Q〜4Q と翌年 1Q）の平均とし、
+    4四半期がそろった年度のみを採用します。列構成は年次のポテンシャル分析データと同じ（year は年度）です。
+    結果は data_version（入力を取得したデータのバージョン。st.session_state.data_version）単位でキャッシュします。
+    """
+    df_market_potential_quarterly = _df_market_potential_quarterly
+    cube = build_visitor_cube(pivot_visitors(_fact_store))
+    df_visitors = rollup_visitors(cube, GRAIN_FISCAL_YEAR)
+    df_visitors.index = get_fiscal_year(df_visitors.index)
+    df_visitors = (
+        df_visitors.rename_axis(index='year', columns='country')
+        .stack()
+        .rename('Annual_Visitors')
+        .reset_index()
+    )
+
+    spend_columns = [col for col in df_market_potential_quarterly.columns if col not in ID_COLUMNS]
+    df_spend = df_market_potential_quarterly[['year', 'Quarter', 'country'] + spend_columns].copy()
+    df_spend['year'] = df_spend['year'] - (df_spend['Quarter'] == '1Q').astype(int)
+    grouped = df_spend.groupby(['year', 'country'])
+    df_spend_fiscal = grouped[spend_columns].mean()
+    df_spend_fiscal = df_spend_fiscal[grouped['Quarter'].nunique() == 4].reset_index()
+
+    df_fiscal = df_visitors.merge(df_spend_fiscal, on=['year', 'country'], how='inner')
+    df_fiscal['Market_Potential_Total'] = df_fiscal['Annual_Visitors'] * df_fiscal['Avg_Total_Spend']
+    return df_fiscal.sort_values(['year', 'country']).reset_index(drop=True)
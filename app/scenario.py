@@ -0,0 +1,160 @@
+import streamlit as st
+import numpy as np
+from app.projection import classify_quadrants, compute_quadrant_thresholds, AGGREGATE_COUNTRY, ID_COLUMNS
+
+# ============================================
+# 定数
+# ============================================
+TOTAL_SPEND_COL = 'Avg_Total_Spend'
+
+# 国・地域の地域区分（該当しない国は「その他地域」）
+REGION_MAP = {
+    '韓国': '東アジア', '中国': '東アジア', '台湾': '東アジア', '香港': '東アジア',
+    'タイ': '東南アジア・インド', 'シンガポール': '東南アジア・インド', 'マレーシア': '東南アジア・インド',
+    'インドネシア': '東南アジア・インド', 'フィリピン': '東南アジア・インド', 'ベトナム': '東南アジア・インド',
+    'インド': '東南アジア・インド',
+    '英国': '欧州', 'ドイツ': '欧州', 'フランス': '欧州', 'イタリア': '欧州', 'スペイン': '欧州',
+    'ロシア': '欧州', '北欧地域': '欧州',
+    '米国': '北米', 'カナダ': '北米', 'メキシコ': '北米',
+    'オーストラリア': 'オセアニア',
+}
+OTHER_REGION = 'その他地域'
+
+# 感度分析の変化率グリッド（%）
+SENSITIVITY_GRID = np.arange(-30, 31, 5)
+
+
+def get_region(country):
+    return REGION_MAP.get(country, OTHER_REGION)
+
+
+def get_parent_item(spend_col):
+    """
+    消費単価の列名から費目（大分類）を返す（例: '宿泊費 [ホテル]' → '宿泊費'）。
+    """
+    return spend_col.split(' [')[0]
+
+
+# ============================================
+# シナリオ計算の基礎データ
+# ============================================
+
+@st.cache_data(show_spinner=False)
+def build_scenario_base(df_period, visitors_col):
+    """
+    1期間分のポテンシャル分析データから、シナリオ計算に使う配列を作成する。
+
+    Returns:
+        dict:
+            countries, regions: 国・地域と地域区分
+            spend_columns: 消費単価の列（先頭が Avg_Total_Spend）
+            major_items: 費目（大分類）のリスト
+            visitors [国], spend [国, 列]
+            item_parent [列]: 各列の費目のインデックス（Avg_Total_Spend は -1）
+            major_spend [国, 費目]: 費目（[全体]）の消費単価
+    """
+    df = df_period[df_period['country'] != AGGREGATE_COUNTRY].sort_values('country')
+    item_columns = [col for col in df.columns if col not in ID_COLUMNS and col != TOTAL_SPEND_COL]
+    spend_columns = [TOTAL_SPEND_COL] + item_columns
+
+    major_items = list(dict.fromkeys(get_parent_item(col) for col in item_columns))
+    item_parent = np.array([-1] + [major_items.index(get_parent_item(col)) for col in item_columns])
+
+    major_columns = [f"{item} [全体]" for item in major_items]
+    major_spend = df.reindex(columns=major_columns).fillna(0).to_numpy(dtype=float)
+
+    return {
+        'countries': df['country'].tolist(),
+        'regions': [get_region(c) for c in df['country']],
+        'spend_columns': spend_columns,
+        'major_items': major_items,
+        'visitors': df[visitors_col].to_numpy(dtype=float),
+        'spend': df[spend_columns].to_numpy(dtype=float),
+        'item_parent': item_parent,
+        'major_spend': major_spend,
+    }
+
+
+# ============================================
+# シナリオの一括計算
+# ============================================
+
+def evaluate_scenarios(base, visitor_multipliers, spend_multipliers):
+    """
+    K 個のシナリオ（訪日客数の倍率 [K, 国]、費目別消費単価の倍率 [K, 費目]）について、
+    消費単価・市場ポテンシャル・対数中央値の基準線・象限を配列のブロードキャストで一括計算する。
+
+    費目の倍率は、その費目の全ての細目に適用します。消費単価の総額（Avg_Total_Spend）は、
+    費目（[全体]）の消費単価の増減分を加算して求めます。
+
+    Returns:
+        dict: visitors [K, 国], spend [K, 国, 列], potential [K, 国, 列], quadrant [K, 国, 列],
+              threshold_visitors [K, 1, 列], threshold_spend [K, 1, 列]（象限の基準線）
+    """
+    visitor_multipliers = np.asarray(visitor_multipliers, dtype=float)
+    spend_multipliers = np.asarray(spend_multipliers, dtype=float)
+
+    V = base['visitors'][None, :] * visitor_multipliers
+
+    # 細目・費目の列: 所属する費目の倍率を掛ける（総額の列は後で置き換える）
+    column_multipliers = spend_multipliers[:, np.maximum(base['item_parent'], 0)]
+    S = base['spend'][None, :, :] * column_multipliers[:, None, :]
+
+    # 総額: 元の総額 + Σ(倍率 - 1) × 費目の消費単価
+    total_delta = np.einsum('cm,km->kc', base['major_spend'], spend_multipliers - 1)
+    S[:, :, 0] = base['spend'][None, :, 0] + total_delta
+
+    threshold_V, threshold_S = compute_quadrant_thresholds(V, S)
+    return {
+        'visitors': V,
+        'spend': S,
+        'potential': V[:, :, None] * S,
+        'quadrant': classify_quadrants(V, S),
+        'threshold_visitors': threshold_V,
+        'threshold_spend': threshold_S,
+    }
+
+
+def build_multipliers(base, visitor_changes, spend_changes):
+    """
+    UI で指定した変化率（%）から、1シナリオ分の倍率を作成する。
+
+    Args:
+        visitor_changes: {国・地域名 または 地域区分: 変化率(%)}（国の指定が地域の指定より優先）
+        spend_changes: {費目: 変化率(%)}
+
+    Returns:
+        (ndarray, ndarray): 訪日客数の倍率 [国], 費目の倍率 [費目]
+    """
+    visitor_multipliers = np.array([
+        1 + visitor_changes.get(country, visitor_changes.get(region, 0)) / 100
+        for country, region in zip(base['countries'], base['regions'])
+    ])
+    spend_multipliers = np.array([1 + spend_changes.get(item, 0) / 100 for item in base['major_items']])
+    return visitor_multipliers, spend_multipliers
+
+
+def build_sensitivity_grid(base, visitor_multipliers, spend_multipliers, visitor_target, spend_target, grid=SENSITIVITY_GRID):
+    """
+    指定シナリオを起点に、訪日客数（国・地域または地域区分）と費目の変化率をそれぞれ grid の範囲で動かした
+    全ての組み合わせのシナリオの倍率を作成する。
+
+    Returns:
+        (ndarray, ndarray): 訪日客数の倍率 [グリッド², 国], 費目の倍率 [グリッド², 費目]
+        （訪日客数の変化率が外側、費目の変化率が内側の順）
+    """
+    factors = 1 + grid / 100
+    n_grid = len(grid)
+
+    if visitor_target is None:
+        target_countries = np.ones(len(base['countries']), dtype=bool)
+    else:
+        target_countries = np.array([
+            visitor_target in (country, region) for country, region in zip(base['countries'], base['regions'])
+        ])
+    grid_visitor = np.where(target_countries[None, :], factors[:, None], 1.0) * visitor_multipliers[None, :]
+
+    target_items = np.array([item == spend_target for item in base['major_items']])
+    grid_spend = np.where(target_items[None, :], factors[:, None], 1.0) * spend_multipliers[None, :]
+
+    return np.repeat(grid_visitor, n_grid, axis=0), np.tile(grid_spend, (n_grid, 1))
@@ -0,0 +1,174 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+from concurrent.futures import ThreadPoolExecutor
+from sklearn.cluster import KMeans
+from sklearn.metrics import silhouette_score, calinski_harabasz_score, davies_bouldin_score
+from app.countries import AGGREGATE_COUNTRY, OTHER_COUNTRY
+
+# ============================================
+# 定数
+# ============================================
+K_MIN = 2
+K_MAX = 8
+N_INIT = 10
+RANDOM_STATE = 0
+EXCLUDED_COUNTRIES = [AGGREGATE_COUNTRY, OTHER_COUNTRY]
+PC_COLUMNS = ['PC1', 'PC2', 'PC3']
+
+FEATURE_GROUP_VOLUME = '訪日客数'
+FEATURE_GROUP_SPEND = '消費単価・消費構造'
+FEATURE_GROUP_BEHAVIOR = '行動傾向 (PC1〜PC3)'
+
+
+# ============================================
+# 国 × 年 の特徴量
+# ============================================
+
+@st.cache_data(show_spinner=False)
+def build_segmentation_features(df_jnto_yearly, df_avg_spend, df_pca_scores):
+    """
+    国 × 年 単位で、訪日客数（対数）、消費単価（対数）と費目構成比、行動PCスコアを結合した特徴量表を作成する。
+    訪日客数と消費データは両方がある国・年のみ、行動PCスコアはある場合のみ結合します。
+
+    Returns:
+        (DataFrame, dict): 特徴量表（country, year, 各特徴量）, {特徴量グループ名: [列名]}
+    """
+    df_volume = df_jnto_yearly[['year', 'country', 'Annual_Visitors']].copy()
+    df_volume['log_visitors'] = np.log1p(df_volume['Annual_Visitors'])
+
+    ratio_columns = [col for col in df_avg_spend.columns if col.endswith('_ratio')]
+    df_spend = df_avg_spend.groupby(level=['year', 'country'])[ratio_columns + ['avg_total_spend_official']].mean().reset_index()
+    df_spend['log_total_spend'] = np.log(df_spend['avg_total_spend_official'].where(df_spend['avg_total_spend_official'] > 0))
+
+    df_features = df_volume[['year', 'country', 'log_visitors']].merge(
+        df_spend[['year', 'country', 'log_total_spend'] + ratio_columns], on=['year', 'country'], how='inner'
+    )
+
+    feature_groups = {
+        FEATURE_GROUP_VOLUME: ['log_visitors'],
+        FEATURE_GROUP_SPEND: ['log_total_spend'] + ratio_columns,
+    }
+
+    pc_columns = [col for col in PC_COLUMNS if col in df_pca_scores.columns]
+    if pc_columns:
+        df_pcs = df_pca_scores.rename(columns={'Year': 'year'})[['year', 'country'] + pc_columns]
+        df_features = df_features.merge(df_pcs, on=['year', 'country'], how='left')
+        feature_groups[FEATURE_GROUP_BEHAVIOR] = pc_columns
+
+    df_features = df_features[~df_features['country'].isin(EXCLUDED_COUNTRIES)]
+    return df_features.sort_values(['year', 'country']).reset_index(drop=True), feature_groups
+
+
+# ============================================
+# クラスタリング
+# ============================================
+
+def _fit_kmeans(X, k):
+    """
+    k クラスタの KMeans を学習し、ラベル・中心と品質指標を返す。
+    """
+    model = KMeans(n_clusters=k, n_init=N_INIT, random_state=RANDOM_STATE).fit(X)
+    labels = model.labels_
+    return {
+        'labels': labels,
+        'centers': model.cluster_centers_,
+        'inertia': model.inertia_,
+        'silhouette': silhouette_score(X, labels),
+        'calinski_harabasz': calinski_harabasz_score(X, labels),
+        'davies_bouldin': davies_bouldin_score(X, labels),
+    }
+
+
+@st.cache_data(show_spinner=False)
+def run_segmentation(df_features, feature_groups, k_min=K_MIN, k_max=K_MAX):
+    """
+    選択した特徴量グループで、全ての国 × 年 をまとめてクラスタリングする（k_min〜k_max をスレッドで並列に計算）。
+    全ての年で共通のセグメント定義を使うため、年ごとのラベルを比較してセグメント間の移動を追跡できます。
+
+    各特徴量は標準化し、グループ内の特徴量数の平方根で割ることで、特徴量の多いグループ（費目構成比など）が
+    距離を支配しないようにグループ間の重みを揃えます。
+    セグメント番号は、所属する国 × 年 の数が多い順に 1 から振り直します。
+
+    Returns:
+        dict:
+            scores: k, silhouette, calinski_harabasz, davies_bouldin, inertia
+            labels: {k: DataFrame(country, year, segment)}
+            centers: {k: DataFrame(index: segment, columns: 特徴量, 値: 標準化後の中心)}
+            best_k: シルエット係数が最大の k
+        データが不足する場合は None
+    """
+    feature_columns = [col for columns in feature_groups.values() for col in columns]
+    df = df_features.dropna(subset=feature_columns).reset_index(drop=True)
+
+    k_values = [k for k in range(k_min, k_max + 1) if k < len(df)]
+    if not k_values:
+        return None
+
+    X = df[feature_columns].to_numpy(dtype=float)
+    std = X.std(axis=0)
+    std[std == 0] = 1.0
+    Z = (X - X.mean(axis=0)) / std
+    group_weights = np.concatenate([np.full(len(columns), 1 / np.sqrt(len(columns))) for columns in feature_groups.values()])
+    Z_weighted = Z * group_weights
+
+    with ThreadPoolExecutor(max_workers=min(len(k_values), os.cpu_count() or 1)) as executor:
+        results = list(executor.map(lambda k: _fit_kmeans(Z_weighted, k), k_values))
+
+    score_rows = []
+    labels_by_k = {}
+    centers_by_k = {}
+    for k, result in zip(k_values, results):
+        # 所属数の多い順にセグメント番号を振り直す
+        counts = np.bincount(result['labels'], minlength=k)
+        order = np.argsort(-counts, kind='stable')
+        relabel = np.empty(k, dtype=int)
+        relabel[order] = np.arange(1, k + 1)
+        segments = relabel[result['labels']]
+
+        labels_by_k[k] = pd.DataFrame({'country': df['country'], 'year': df['year'], 'segment': segments})
+        # 中心は重みを外した標準化後の値（セグメントの特徴の比較用）
+        centers_by_k[k] = pd.DataFrame(
+            result['centers'][order] / group_weights, columns=feature_columns, index=np.arange(1, k + 1)
+        ).rename_axis('segment')
+
+        score_rows.append({
+            'k': k,
+            'silhouette': result['silhouette'],
+            'calinski_harabasz': result['calinski_harabasz'],
+            'davies_bouldin': result['davies_bouldin'],
+            'inertia': result['inertia'],
+        })
+
+    df_scores = pd.DataFrame(score_rows)
+    return {
+        'scores': df_scores,
+        'labels': labels_by_k,
+        'centers': centers_by_k,
+        'best_k': int(df_scores.loc[df_scores['silhouette'].idxmax(), 'k']),
+    }
+
+
+def get_segment_labels_by_year(segmentation, k):
+    """
+    国 × 年 のセグメント表（行: 国, 列: 年）を返す。
+    """
+    return segmentation['labels'][k].pivot(index='country', columns='year', values='segment')
+
+
+def compute_segment_migrations(segmentation, k, from_year, to_year):
+    """
+    2つの年の間のセグメント間の移動（国数）と、移動した国の一覧を返す。
+
+    Returns:
+        (DataFrame, DataFrame): 移動元 × 移動先 の国数, country, from_segment, to_segment（両年に存在する国のみ）
+    """
+    df_by_year = get_segment_labels_by_year(segmentation, k)
+    df_pair = df_by_year[[from_year, to_year]].dropna().astype(int)
+    df_pair.columns = ['from_segment', 'to_segment']
+
+    df_matrix = pd.crosstab(df_pair['from_segment'], df_pair['to_segment']).reindex(
+        index=range(1, k + 1), columns=range(1, k + 1), fill_value=0
+    )
+    return df_matrix, df_pair.reset_index()
@@ -0,0 +1,123 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+from app.countries import AGGREGATE_COUNTRY
+
+# ============================================
+# 定数
+# ============================================
+ANNUAL_PERIOD = '年全体集計' # 年全体（全四半期の平均）を表す四半期ラベル
+EXCLUDED_COUNTRIES = [AGGREGATE_COUNTRY]
+DEFAULT_TOP_K = 5
+
+# 距離の計算に使用する特徴量
+FEATURE_SETS = {
+    '構成比': ('_ratio',),
+    '消費単価': ('_unit',),
+    '構成比 + 消費単価': ('_ratio', '_unit'),
+}
+
+
+# ============================================
+# 国 × 国 の距離行列（全期間を一括計算）
+# ============================================
+
+def _build_feature_tensor(df_avg_spend, suffixes):
+    """
+    df_avg_spend から [期間, 国, 特徴量] の3次元配列を作成する。
+    期間は (年, 四半期) と、年ごとの全四半期平均 (年, ANNUAL_PERIOD) です。データがない国・期間は NaN とします。
+    """
+    feature_columns = [col for col in df_avg_spend.columns if col.endswith(suffixes)]
+    df = df_avg_spend[feature_columns]
+    df = df[~df.index.get_level_values('country').isin(EXCLUDED_COUNTRIES)]
+
+    df_annual = df.groupby(level=['year', 'country']).mean()
+    df_annual['Quarter'] = ANNUAL_PERIOD
+    df_annual = df_annual.set_index('Quarter', append=True).reorder_levels(['year', 'country', 'Quarter'])
+    df_all = pd.concat([df, df_annual])
+
+    df_wide = df_all.unstack('country')
+    periods = df_wide.index.tolist()
+    countries = df_wide.columns.get_level_values('country').unique().tolist()
+    df_wide = df_wide.reindex(columns=pd.MultiIndex.from_product([feature_columns, countries]))
+
+    X = df_wide.to_numpy(dtype=float).reshape(len(periods), len(feature_columns), len(countries))
+    return periods, countries, feature_columns, np.swapaxes(X, 1, 2)
+
+
+@st.cache_data(show_spinner=False)
+def compute_distance_matrices(df_avg_spend, feature_set='構成比'):
+    """
+    全ての (年, 四半期) について、国 × 国 のユークリッド距離行列を一括で計算する。
+    特徴量が1種類の場合は元の単位（構成比は %pt、消費単価は円）、
+    構成比と消費単価を併用する場合は期間ごとに国間で標準化した値の距離とします。
+
+    距離は ||x||² + ||y||² - 2x·y を [期間, 国, 国] の配列演算で求めるため、国のペアごとのループは行いません。
+
+    Returns:
+        dict: periods [(year, Quarter)], countries, features, distances [期間, 国, 国]（データがない国は NaN）
+    """
+    periods, countries, feature_columns, X = _build_feature_tensor(df_avg_spend, FEATURE_SETS[feature_set])
+
+    if len(FEATURE_SETS[feature_set]) > 1:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.nanmean(X, axis=1, keepdims=True)
+            std = np.nanstd(X, axis=1, keepdims=True)
+            X = np.where(std > 0, (X - mean) / std, 0.0)
+
+    available = ~np.isnan(X).any(axis=-1)
+    X = np.where(available[..., None], X, 0.0)
+
+    squared_norm = np.einsum('pcf,pcf->pc', X, X)
+    gram = np.einsum('pcf,pdf->pcd', X, X)
+    distances = np.sqrt(np.maximum(squared_norm[:, :, None] + squared_norm[:, None, :] - 2 * gram, 0.0))
+
+    # データがない国を含むペアは NaN、自分自身との距離は 0
+    distances = np.where(available[:, :, None] & available[:, None, :], distances, np.nan)
+    diagonal = np.arange(len(countries))
+    distances[:, diagonal, diagonal] = np.where(available, 0.0, np.nan)
+
+    return {
+        'periods': periods,
+        'countries': countries,
+        'features': feature_columns,
+        'distances': distances,
+    }
+
+
+# ============================================
+# 類似市場の検索
+# ============================================
+
+def find_similar_markets(distance_result, country, periods, k=DEFAULT_TOP_K):
+    """
+    指定した国について、各期間で距離が近い上位 k か国を返す（自分自身とデータがない国は除く）。
+    複数の期間をまとめて [期間, 国] の配列上で順位付けします。
+
+    Returns:
+        DataFrame: year, Quarter, rank, country, distance
+    """
+    if country not in distance_result['countries']:
+        return pd.DataFrame(columns=['year', 'Quarter', 'rank', 'country', 'distance'])
+
+    period_index = {period: i for i, period in enumerate(distance_result['periods'])}
+    periods = [period for period in periods if period in period_index]
+    country_index = distance_result['countries'].index(country)
+
+    rows = distance_result['distances'][[period_index[p] for p in periods], country_index, :]
+    rows = rows.copy()
+    rows[:, country_index] = np.nan
+
+    # NaN は末尾に並ぶため、上位 k 件のうち NaN 以外を採用する
+    k = min(k, rows.shape[1])
+    order = np.argsort(rows, axis=1)[:, :k]
+    nearest = np.take_along_axis(rows, order, axis=1)
+
+    df_result = pd.DataFrame({
+        'year': np.repeat([p[0] for p in periods], k),
+        'Quarter': np.repeat([p[1] for p in periods], k),
+        'rank': np.tile(np.arange(1, k + 1), len(periods)),
+        'country': np.array(distance_result['countries'])[order].ravel(),
+        'distance': nearest.ravel(),
+    })
+    return df_result.dropna(subset=['distance']).reset_index(drop=True)
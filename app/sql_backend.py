@@ -0,0 +1,192 @@
+import streamlit as st
+import os
+from app.versioning import get_file_version
+from app.columnar import DATA_PATH, SOURCE_TABLES, get_partition_dir, list_partition_files, has_current_partitions
+from app.countries import build_country_dimension, resolve_country_ids
+
+try:
+    import duckdb
+except ImportError: # 任意の依存関係（未インストールの場合は SQL バックエンドを使用しない）
+    duckdb = None
+
+# ============================================
+# 定数
+# ============================================
+# duckdb がインストールされていても、"0" を指定した場合は使用しない
+SQL_BACKEND_ENABLED = os.environ.get("INBOUND_SQL_BACKEND", "1") == "1"
+
+# 集計の単位として指定できる列 → SQL の式
+VISITOR_DIMENSIONS = {
+    'year': '"Year"',
+    'quarter': '("Month_Numeric" - 1) // 3 + 1',
+    'month': '"Month_Numeric"',
+    'country': '"Country/Area"',
+}
+SPEND_DIMENSIONS = {
+    'year': '"year"',
+    'Quarter': '"Quarter"',
+    'country': '"country"',
+    'expense_items': '"expense_items"',
+    'item_name': "\"expense_items\" || ' [' || CASE WHEN \"details\" = 'all' THEN '全体' ELSE \"details\" END || ']'",
+}
+
+
+# ============================================
+# 接続とテーブルの登録
+# ============================================
+
+def is_sql_backend_available():
+    """
+    SQL バックエンド（duckdb）が使用可能かどうかを返す。
+    """
+    return duckdb is not None and SQL_BACKEND_ENABLED
+
+
+def _source_expression(table):
+    """
+    テーブルの読込元を表す SQL の式を返す。年分割の Parquet（app/columnar.py で作成）があればそれを、
+    なければ（または CSV の方が新しければ）CSV を参照します。
+    Parquet はディレクトリ名（{年の列}={年}）から年の列を復元するため、年での絞り込みは該当する年のファイルだけを読み込みます。
+    どちらも存在しない場合は None を返します。
+    """
+    filename, _, _ = SOURCE_TABLES[table]
+    if has_current_partitions(table):
+        pattern = os.path.join(get_partition_dir(table), '*', '*.parquet').replace("'", "''")
+        return f"read_parquet('{pattern}', hive_partitioning = true)"
+
+    csv_path = os.path.join(DATA_PATH, filename)
+    if os.path.exists(csv_path):
+        return f"read_csv_auto('{csv_path.replace(chr(39), chr(39) * 2)}', header = true)"
+    return None
+
+
+def get_sql_data_version():
+    """
+    SQL バックエンドの入力（CSV と年分割ファイル）のバージョンを返す。接続のキャッシュキーとして使用します。
+    """
+    versions = []
+    for table, (filename, _, _) in SOURCE_TABLES.items():
+        versions.append(get_file_version(os.path.join(DATA_PATH, filename)))
+        versions.extend(get_file_version(path) for path in list_partition_files(table))
+    return tuple(versions)
+
+
+@st.cache_resource(show_spinner=False)
+def get_connection(data_version):
+    """
+    インプロセスの duckdb に接続し、各テーブルをビューとして登録する（データは読み込まず、問い合わせ時に必要な部分だけを読む）。
+    入力ファイルが更新されると data_version が変わり、新しい接続が作成されます。
+    """
+    connection = duckdb.connect(database=':memory:')
+    for table in SOURCE_TABLES:
+        source = _source_expression(table)
+        if source is not None:
+            connection.execute(f'CREATE VIEW "{table}" AS SELECT * FROM {source}')
+    return connection
+
+
+def run_query(sql, params=None):
+    """
+    SQL を実行し、結果を DataFrame で返す（セッション間で接続を共有するため、問い合わせごとにカーソルを作成します）。
+    """
+    cursor = get_connection(get_sql_data_version()).cursor()
+    try:
+        return cursor.execute(sql, params or []).df()
+    finally:
+        cursor.close()
+
+
+# ============================================
+# 絞り込み・集計の問い合わせ
+# ============================================
+
+def _resolve_raw_countries(table, countries):
+    """
+    ダッシュボードでの国・地域名のリストを、テーブル内の元の表記（表記ゆれを含む）のリストに変換する。
+    """
+    _, _, country_col = SOURCE_TABLES[table]
+    raw_names = run_query(f'SELECT DISTINCT "{country_col}" AS name FROM "{table}"')['name']
+    df_dimension = build_country_dimension(raw_names)
+    canonical = resolve_country_ids(raw_names, df_dimension).map(df_dimension.set_index('country_id')['country'])
+    return raw_names[canonical.isin(countries)].tolist()
+
+
+def _build_where(table, years, countries, extra_conditions=()):
+    """
+    年・国の絞り込み条件（WHERE 句）とパラメータを作成する。
+    年は分割の列に対する定数の条件とし、該当しない年のファイルを読み飛ばせるようにします。
+    """
+    _, year_col, country_col = SOURCE_TABLES[table]
+    conditions = list(extra_conditions)
+    params = []
+
+    if years is not None:
+        year_list = ', '.join(str(int(y)) for y in years) or 'NULL'
+        conditions.insert(0, f'"{year_col}" IN ({year_list})')
+
+    if countries is not None:
+        raw_countries = _resolve_raw_countries(table, countries)
+        conditions.append(f'"{country_col}" IN ({", ".join("?" * len(raw_countries)) or "NULL"})')
+        params.extend(raw_countries)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return where, params
+
+
+def _to_canonical_countries(df):
+    """
+    結果の country 列をダッシュボードでの表記に変換する。
+    """
+    df_dimension = build_country_dimension(df['country'])
+    df['country'] = resolve_country_ids(df['country'], df_dimension).map(df_dimension.set_index('country_id')['country'])
+    return df
+
+
+def query_visitor_totals(years=None, countries=None, by=('year', 'country')):
+    """
+    訪日客数（月次）を年・国で絞り込み、by の単位（year, quarter, month, country）で合計する。
+    絞り込みと集計は SQL エンジン側で行い、集計結果のみを DataFrame として受け取ります。
+
+    Returns:
+        DataFrame: by の列, visitors
+    """
+    by = list(by)
+    select = ', '.join(f'{VISITOR_DIMENSIONS[col]} AS "{col}"' for col in by)
+    where, params = _build_where('visitors', years, countries)
+    df = run_query(
+        f'SELECT {select}, CAST(SUM("Visitor_Numeric") AS BIGINT) AS visitors FROM "visitors" {where} GROUP BY ALL',
+        params
+    )
+
+    if 'country' in by:
+        # 表記ゆれで分かれていた行を、ダッシュボードでの表記の単位で合算する
+        df = _to_canonical_countries(df).groupby(by, as_index=False)['visitors'].sum()
+    return df.sort_values(by).reset_index(drop=True)
+
+
+def query_spend(years=None, countries=None, item_names=None, measure='consumption_unit', by=('year', 'country', 'item_name')):
+    """
+    消費データ（四半期）を年・国・費目で絞り込み、by の単位（year, Quarter, country, expense_items, item_name）で平均する。
+    表記ゆれの合算後も正しい平均となるよう、SQL では合計と件数を集計し、平均は最後に計算します。
+
+    Returns:
+        DataFrame: by の列, measure
+    """
+    by = list(by)
+    select = ', '.join(f'{SPEND_DIMENSIONS[col]} AS "{col}"' for col in by)
+    extra_conditions = []
+    extra_params = []
+    if item_names is not None:
+        extra_conditions.append(f'({SPEND_DIMENSIONS["item_name"]}) IN ({", ".join("?" * len(item_names)) or "NULL"})')
+        extra_params.extend(item_names)
+
+    where, params = _build_where('spending', years, countries, extra_conditions)
+    df = run_query(
+        f'SELECT {select}, SUM("{measure}") AS total, COUNT("{measure}") AS n FROM "spending" {where} GROUP BY ALL',
+        extra_params + params
+    )
+
+    if 'country' in by:
+        df = _to_canonical_countries(df).groupby(by, as_index=False)[['total', 'n']].sum()
+    df[measure] = df['total'] / df['n'].where(df['n'] > 0)
+    return df.drop(columns=['total', 'n']).sort_values(by).reset_index(drop=True)
@@ -0,0 +1,133 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import os
+from app.columnar import DATA_PATH, SOURCE_TABLES, TABLE_SCHEMAS, has_current_partitions
+from app.countries import ALIAS_MAP, normalize_country_name
+
+# ============================================
+# 定数
+# ============================================
+# 1回に読み込む行数（ピーク時のメモリはこの行数に比例し、ファイルの大きさには依存しない）
+CHUNK_ROWS = int(os.environ.get("INBOUND_CHUNK_ROWS", "200000"))
+
+# このサイズ（MB）以上の CSV は、全体を読み込まずにチャンクごとの集計で読み込む
+STREAMING_THRESHOLD_MB = float(os.environ.get("INBOUND_STREAMING_THRESHOLD_MB", "256"))
+
+# 部分集計をこのチャンク数ごとに統合する（部分集計の数を抑えるため）
+COMBINE_EVERY = 8
+
+# テーブル名: (集計キーの列, 合計する列, 平均する列)
+# キーは load_data の集計・ピボットの最小単位（訪日客数は 年 × 月 × 国、消費は 年 × 国 × 四半期 × 費目 × 細目）
+AGGREGATION_SPECS = {
+    'visitors': (['Year', 'Month_Numeric', 'Country/Area'], ['Visitor_Numeric'], []),
+    'spending': (['year', 'country', 'Quarter', 'expense_items', 'details'], [], ['consumption_unit', 'composition_ratio']),
+}
+
+COUNTRY_KEY_COL = '_country_key'
+
+
+# ============================================
+# チャンクごとの部分集計
+# ============================================
+
+def should_stream(table, data_path=DATA_PATH):
+    """
+    テーブルをチャンクごとの集計で読み込むべきかを返す（CSV より新しい列指向ファイルがなく、CSV が閾値以上の大きさの場合）。
+    """
+    if table not in AGGREGATION_SPECS or has_current_partitions(table, data_path):
+        return False
+    filename, _, _ = SOURCE_TABLES[table]
+    try:
+        size = os.path.getsize(os.path.join(data_path, filename))
+    except FileNotFoundError:
+        return False
+    return size >= STREAMING_THRESHOLD_MB * 1024 * 1024
+
+
+def _read_dtypes(table):
+    """
+    チャンク読込時の型を返す（値の列は欠損を扱えるよう float64 で読み込み、集計後に定義の型へ戻す）。
+    """
+    keys, sum_columns, mean_columns = AGGREGATION_SPECS[table]
+    schema = TABLE_SCHEMAS[table]
+    dtypes = {}
+    for col in keys:
+        dtypes[col] = object if pa.types.is_string(schema.field(col).type) else schema.field(col).type.to_pandas_dtype()
+    for col in sum_columns + mean_columns:
+        dtypes[col] = 'float64'
+    return dtypes
+
+
+def _aggregate_chunk(df_chunk, keys, country_col, value_columns):
+    """
+    1チャンクを集計キーごとの 合計・件数 に集計する。
+    国・地域は国マスタのID（マスタにない場合は正規化キー）で集計し（表記ゆれがチャンクをまたいでも同じ行に集まる）、
+    元の表記は最初に現れたものを残します。
+    """
+    codes, uniques = pd.factorize(df_chunk[country_col])
+    unique_keys = np.array([ALIAS_MAP.get(normalize_country_name(name), normalize_country_name(name)) for name in uniques], dtype=object)
+    df_chunk = df_chunk.assign(**{COUNTRY_KEY_COL: np.where(codes >= 0, unique_keys[np.maximum(codes, 0)], '')})
+
+    group_keys = [COUNTRY_KEY_COL if col == country_col else col for col in keys]
+    grouped = df_chunk.groupby(group_keys, sort=False, dropna=False)
+    df_partial = grouped[value_columns].sum()
+    df_partial = df_partial.join(grouped[value_columns].count().add_suffix('_n'))
+    df_partial[country_col] = grouped[country_col].first()
+    return df_partial
+
+
+def _combine_partials(partials, keys, country_col):
+    """
+    部分集計（合計・件数）を集計キーごとに合算する。合計と件数の和はそのまま全体の合計と件数になります。
+    """
+    df_all = pd.concat(partials)
+    group_keys = [COUNTRY_KEY_COL if col == country_col else col for col in keys]
+    grouped = df_all.groupby(level=group_keys, sort=False, dropna=False)
+    df_combined = grouped.sum(numeric_only=True)
+    df_combined[country_col] = grouped[country_col].first()
+    return df_combined
+
+
+def stream_aggregate(table, chunk_rows=CHUNK_ROWS, data_path=DATA_PATH):
+    """
+    CSV をチャンクごとに読み込み、集計キーごとの部分集計（合計と件数）を合算して、キーごとに1行の DataFrame を返す。
+    合計する列は全体の合計、平均する列は 合計 / 件数 となるため、ファイル全体を読み込んだ場合の
+    groupby().sum() / pivot_table(aggfunc='mean') と同じ値を、チャンクの大きさに比例するメモリで求められます。
+
+    Returns:
+        DataFrame: read_table と同じ列構成（キーの並びはファイル内の初出順）
+    """
+    filename, _, country_col = SOURCE_TABLES[table]
+    keys, sum_columns, mean_columns = AGGREGATION_SPECS[table]
+    value_columns = sum_columns + mean_columns
+
+    reader = pd.read_csv(
+        os.path.join(data_path, filename),
+        usecols=keys + value_columns,
+        dtype=_read_dtypes(table),
+        encoding='utf_8_sig',
+        chunksize=chunk_rows,
+    )
+
+    partials = []
+    for df_chunk in reader:
+        partials.append(_aggregate_chunk(df_chunk, keys, country_col, value_columns))
+        if len(partials) >= COMBINE_EVERY:
+            partials = [_combine_partials(partials, keys, country_col)]
+
+    if not partials:
+        return pd.DataFrame({col: pd.Series(dtype=object) for col in TABLE_SCHEMAS[table].names})
+
+    df_result = _combine_partials(partials, keys, country_col)
+    for col in sum_columns:
+        # 値が1件もないキーは（0ではなく）欠損とする
+        df_result[col] = df_result[col].where(df_result[col + '_n'] > 0)
+        target_dtype = TABLE_SCHEMAS[table].field(col).type.to_pandas_dtype()
+        if df_result[col].notna().all():
+            df_result[col] = df_result[col].astype(target_dtype)
+    for col in mean_columns:
+        df_result[col] = df_result[col] / df_result[col + '_n'].where(df_result[col + '_n'] > 0)
+
+    df_result = df_result.reset_index()
+    return df_result[[col for col in TABLE_SCHEMAS[table].names if col in df_result.columns]]
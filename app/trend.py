@@ -0,0 +1,91 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+
+# ============================================
+# 定数（notebooks/032_Behavior_Timeseries.ipynb と同一の定義）
+# ============================================
+PC_COLUMNS = ['PC1', 'PC2', 'PC3']
+MIN_YEARS = 3 # 観測年数がこれ未満の国はトレンド判定から除外
+
+
+# ============================================
+# トレンド（単回帰）の一括計算
+# ============================================
+@st.cache_data(show_spinner=False)
+def compute_score_trends(df_scores, country_col='country', year_col='Year', pc_columns=None):
+    """
+    全ての国 × 全てのPC軸について、年に対するPCスコアの単回帰（傾き・切片・R²・観測年数）を一括で計算する。
+    スコア表を [国, PC, 年] の3次元配列に展開し、欠測（その年のデータがない国）はマスクして
+    最小二乗法の閉形式解を配列演算で求めるため、国・PCごとのループや np.polyfit は使用しません。
+
+    Returns:
+        DataFrame: country_col, 'pc', 'slope', 'intercept', 'r2', 'n_years'
+                   （観測年数が2未満、または全ての年が同一の場合の slope 等は NaN）
+    """
+    if pc_columns is None:
+        pc_columns = [col for col in PC_COLUMNS if col in df_scores.columns]
+
+    year_values = np.sort(df_scores[year_col].unique())
+    years = year_values.astype(float)
+    df_wide = (
+        df_scores
+        .pivot_table(index=country_col, columns=year_col, values=pc_columns)
+        .reindex(columns=pd.MultiIndex.from_product([pc_columns, year_values]))
+    )
+    countries = df_wide.index.tolist()
+
+    # Y: [国, PC, 年]。観測がない年は mask=False
+    Y = df_wide.to_numpy(dtype=float).reshape(len(countries), len(pc_columns), len(years))
+    mask = ~np.isnan(Y)
+    w = mask.astype(float)
+    Y = np.where(mask, Y, 0.0)
+
+    # 数値安定性のため、年は平均年を原点として扱う
+    x_origin = years.mean()
+    x = years - x_origin
+
+    n = w.sum(axis=-1)
+    sum_x = w @ x
+    sum_xx = w @ (x * x)
+    sum_y = Y.sum(axis=-1)
+    sum_xy = Y @ x
+    sum_yy = (Y * Y).sum(axis=-1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s_xx = sum_xx - sum_x * sum_x / n
+        s_xy = sum_xy - sum_x * sum_y / n
+        s_yy = sum_yy - sum_y * sum_y / n
+
+        slope = s_xy / s_xx
+        intercept_centered = (sum_y - slope * sum_x) / n
+        r2 = np.where(s_yy > 0, (slope * s_xy) / s_yy, np.nan)
+
+    valid = (n >= 2) & (s_xx > 0)
+    slope = np.where(valid, slope, np.nan)
+    # np.polyfit と同じく、切片は西暦0年時点の値として返す
+    intercept = np.where(valid, intercept_centered - slope * x_origin, np.nan)
+    r2 = np.where(valid, r2, np.nan)
+
+    return pd.DataFrame({
+        country_col: np.repeat(countries, len(pc_columns)),
+        'pc': np.tile(pc_columns, len(countries)),
+        'slope': slope.ravel(),
+        'intercept': intercept.ravel(),
+        'r2': r2.ravel(),
+        'n_years': n.astype(int).ravel(),
+    })
+
+
+def classify_trends(df_trends, min_years=MIN_YEARS):
+    """
+    PC軸ごとに、傾きの母標準偏差（1σ）を閾値として Up / Down / Flat に分類する。
+    観測年数が min_years 未満の国は除外します。
+    """
+    df = df_trends[(df_trends['n_years'] >= min_years)].dropna(subset=['slope']).copy()
+    threshold = df.groupby('pc')['slope'].transform(lambda s: s.std(ddof=0))
+
+    df['trend_type'] = np.where(df['slope'] >= threshold, "Up",
+                       np.where(df['slope'] <= -threshold, "Down", "Flat"))
+    df['threshold'] = threshold
+    return df
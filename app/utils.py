@@ -2,89 +2,119 @@ import streamlit as st
 import pandas as pd
 import numpy as np 
 import os
+import hashlib
 from datetime import timedelta
 from itertools import product 
+from app.pca import load_pca_model, load_action_data, refresh_pca_scores
+from app.countries import build_country_dimension, apply_country_dimension
+from app.facts import build_fact_store, query_facts, pivot_facts
+from app.columnar import read_table
+from app.streaming import should_stream, stream_aggregate
+from app.pipeline import run_stages
+from app.reload import DataStore, RELOAD_ENABLED
+from app.vintage import read_table_as_of, get_vintage_version, VINTAGE_TABLES
 
 # ============================================
 # データ読込関数
 # ============================================
-@st.cache_data
-def load_data():
-    """
-    必要なデータファイルを読み込み、分析しやすい形式に前処理する関数。
-    費目別および細目別の消費単価をポテンシャル分析データに追加します。
-    """
-    
-    df_destination = pd.DataFrame()
-    df_pca_scores = pd.DataFrame()
+# 各段階は load_data から app/pipeline.py の run_stages で実行する（依存先の結果を位置引数で受け取る）
+LOAD_PIPELINE_NAME = "load_data"
+
+
+def _read_visitors():
+    if should_stream('visitors'):
+        return stream_aggregate('visitors')
+    return read_table('visitors', columns=['Year', 'Month_Numeric', 'Country/Area', 'Visitor_Numeric'])
+
 
+def _read_spend():
+    if should_stream('spending'):
+        return stream_aggregate('spending')
+    return read_table('spending', columns=['year', 'country', 'Quarter', 'expense_items', 'details', 'consumption_unit', 'composition_ratio'])
+
+
+def _read_destination_pivot():
     try:
-        # 必須ファイル ---
-        file_jnto = "data/inbound_visiter.csv"
-        file_spend = "data/inbound_spending.csv"
+        df_destination = read_table('destination', columns=['Year', 'Prefecture', 'Visit Rate(%)'])
+    except FileNotFoundError:
+        return pd.DataFrame()
+    if df_destination.empty:
+        return pd.DataFrame()
+    return df_destination.pivot_table(index='Year', columns='Prefecture', values='Visit Rate(%)')
 
-        df_jnto = pd.read_csv(file_jnto)
-        df_spend = pd.read_csv(file_spend)
-        
-        # その他のファイル ---
-        try:
-            df_destination = pd.read_csv("data/inbound_destination.csv")
-        except FileNotFoundError:
-            df_destination = pd.DataFrame() 
-        
-        try:
-            df_pca_scores = pd.read_csv("data/pca_scores_timeseries.csv")
-        except FileNotFoundError:
-            df_pca_scores = pd.DataFrame() 
-            
-    except FileNotFoundError as e:
-        st.error(f"必須ファイルが見つかりません: {e.filename}。ファイル名またはパスを確認してください。")
-        st.stop()
-        return None, None, None, None, None, None, None, None, None
-    
-    # --- df_jnto (訪日客数) 前処理 ---
-    df_jnto["date"] = pd.to_datetime(df_jnto["Year"].astype(str) + "-" + df_jnto["Month_Numeric"].astype(str))
-    df_jnto_pivot = df_jnto.pivot_table(index="date", columns="Country/Area", values="Visitor_Numeric")
-    
-    df_jnto_yearly = df_jnto.groupby(['Year', 'Country/Area'])['Visitor_Numeric'].sum().reset_index()
-    df_jnto_yearly.rename(columns={'Visitor_Numeric': 'Annual_Visitors', 'Country/Area': 'country', 'Year': 'year'}, inplace=True)
-    
-    df_jnto['Quarter_Numeric'] = df_jnto['Month_Numeric'].apply(lambda m: (m - 1) // 3 + 1)
-    df_jnto['Quarter'] = df_jnto['Quarter_Numeric'].astype(str) + 'Q'
-    
-    df_jnto_quarterly = df_jnto.groupby(['Year', 'Quarter', 'Country/Area'])['Visitor_Numeric'].sum().reset_index()
-    df_jnto_quarterly.rename(columns={'Visitor_Numeric': 'Quarterly_Visitors', 'Country/Area': 'country', 'Year': 'year'}, inplace=True)
-    
-    
-    # --- df_spend (消費額) 前処理 ---
-    pattern_to_exclude = '全体|TOTAL|ALL'
-    
-    df_spend_items_all = df_spend[
-        (~df_spend['expense_items'].str.contains(pattern_to_exclude, case=False, na=False, regex=True))
-    ].copy()
-    
-    df_spend_items_all['item_name'] = df_spend_items_all.apply(
-        lambda row: f"{row['expense_items']} [{row['details']}]" if row['details'] != 'all' 
-            else f"{row['expense_items']} [全体]",
-        axis=1
+
+def _read_pca_scores():
+    try:
+        return pd.read_csv("data/pca_scores_timeseries.csv")
+    except FileNotFoundError:
+        return pd.DataFrame()
+
+
+def _refresh_pca_scores(pca_model, df_pca_scores):
+    # 保存済みのPCAモデルがあれば、スコア未計算の年の行動データのみを固定軸へ射影して追加
+    if pca_model is None:
+        return df_pca_scores
+    try:
+        return refresh_pca_scores(pca_model, df_pca_scores, load_action_data())
+    except FileNotFoundError:
+        return df_pca_scores
+
+
+def _build_countries(df_jnto, df_spend, df_pca_scores):
+    # 国ディメンション（表記ゆれの解決と国IDの付与）
+    return build_country_dimension(
+        df_jnto['Country/Area'],
+        df_spend['country'],
+        df_pca_scores['Country/Area'] if 'Country/Area' in df_pca_scores.columns else None
     )
+
+
+def _apply_visitor_countries(df_jnto, df_countries):
+    return apply_country_dimension(df_jnto, df_countries, country_col='Country/Area')
+
+
+def _build_visitor_frames(fact_store):
+    """
+    市場ポテンシャルの計算に使用する、訪日客数の年次・四半期の国別合計（country_id 付き）を作成する。
+    月次のピボットは保持せず、各ページが表示する部分だけを app/facts.py の pivot_visitors で作成します。
+    """
+    country_names = fact_store['dimensions']['country'].set_index('country_id')['country']
+
+    df_jnto_yearly = query_facts(fact_store, 'visitors', 'visitors', by=['year', 'country_id'])
+    df_jnto_yearly.rename(columns={'visitors': 'Annual_Visitors'}, inplace=True)
+    df_jnto_yearly.insert(2, 'country', df_jnto_yearly['country_id'].map(country_names))
+    df_jnto_yearly = df_jnto_yearly.sort_values(['year', 'country']).reset_index(drop=True)
     
-    all_consumption_items_ordered = df_spend_items_all['item_name'].drop_duplicates().tolist()
-    
-    df_spend_items_major = df_spend_items_all[df_spend_items_all['details'] == 'all'].copy()
+    df_jnto_quarterly = query_facts(fact_store, 'visitors', 'visitors', by=['year', 'Quarter', 'country_id'])
+    df_jnto_quarterly.rename(columns={'visitors': 'Quarterly_Visitors'}, inplace=True)
+    df_jnto_quarterly.insert(3, 'country', df_jnto_quarterly['country_id'].map(country_names))
+    df_jnto_quarterly = df_jnto_quarterly.sort_values(['year', 'Quarter', 'country']).reset_index(drop=True)
 
+    return df_jnto_yearly, df_jnto_quarterly
+
+
+def _build_spend_frames(fact_store):
+    """
+    費目一覧と、四半期・年次の消費単価（全体 + 費目・細目別）を作成する。
+    """
+    df_items = fact_store['dimensions']['item']
+
+    all_consumption_items_ordered = df_items.loc[~df_items['is_total'], 'item_name'].tolist()
     
-    df_total_all = df_spend[
-        (df_spend['expense_items'].str.contains(pattern_to_exclude, case=False, na=False, regex=True)) & 
-        (df_spend['details'] == 'all')
-    ]
-    df_total_all = df_total_all.groupby(['year', 'country', 'Quarter'])['consumption_unit'].mean().reset_index()
+    df_total_all = query_facts(
+        fact_store, 'spend', 'consumption_unit',
+        filters={'is_total': True, 'details': 'all'},
+        by=['year', 'country_id', 'Quarter'],
+        agg='mean'
+    )
     df_total_all.rename(columns={'consumption_unit': 'Avg_Total_Spend'}, inplace=True)
 
-    df_unit_pivot_all = df_spend_items_all.pivot_table(
-        index=['year', 'country', 'Quarter'], 
-        columns='item_name', 
-        values='consumption_unit'
+    df_unit_pivot_all = pivot_facts(
+        fact_store, 'spend', 'consumption_unit',
+        index=['year', 'country_id', 'Quarter'],
+        columns='item_name',
+        filters={'is_total': False},
+        agg='mean'
     ).fillna(0)
 
     df_unit_pivot_all.reset_index(inplace=True)
@@ -93,54 +123,204 @@ def load_data():
     # 四半期ポテンシャル分析用データフレームの構築
     df_avg_spend_quarterly = df_total_all.merge(
         df_unit_pivot_all, 
-        on=['year', 'country', 'Quarter'],
+        on=['year', 'country_id', 'Quarter'],
         how='left'
     ).fillna(0)
     
     # 年次ポテンシャル分析用データフレームの構築
     df_avg_spend_yearly_temp = df_avg_spend_quarterly.drop(columns=['Quarter'], errors='ignore')
-    df_avg_spend_yearly_data = df_avg_spend_yearly_temp.groupby(['year', 'country']).mean().reset_index()
-    
-    df_avg_spend_yearly_old = df_avg_spend_yearly_data[['year', 'country', 'Avg_Total_Spend']].copy()
-    df_avg_spend_yearly_old.rename(columns={'Avg_Total_Spend': 'Avg_Spend_Per_Visitor'}, inplace=True)
+    df_avg_spend_yearly_data = df_avg_spend_yearly_temp.groupby(['year', 'country_id']).mean().reset_index()
+
+    return all_consumption_items_ordered, df_total_all, df_avg_spend_quarterly, df_avg_spend_yearly_data
+
+
+def _build_market_potential(visitor_frames, spend_frames):
+    """
+    訪日客数と消費単価を結合し、四半期・年次の市場ポテンシャルを計算する。
+    """
+    df_jnto_yearly, df_jnto_quarterly = visitor_frames
+    _, _, df_avg_spend_quarterly, df_avg_spend_yearly_data = spend_frames
 
     # 結合とポテンシャル計算 (四半期)
     df_market_potential_quarterly = df_jnto_quarterly.merge(
         df_avg_spend_quarterly, 
-        on=['year', 'country', 'Quarter'],
+        on=['year', 'country_id', 'Quarter'],
         how='inner'
-    ).dropna(subset=['Quarterly_Visitors', 'Avg_Total_Spend'])
+    ).dropna(subset=['Quarterly_Visitors', 'Avg_Total_Spend']).drop(columns=['country_id'])
 
     df_market_potential_quarterly['Market_Potential_Total'] = df_market_potential_quarterly['Quarterly_Visitors'] * df_market_potential_quarterly['Avg_Total_Spend']
 
     # 結合とポテンシャル計算 (年次)
     df_market_potential_yearly = df_jnto_yearly.merge(
         df_avg_spend_yearly_data,
-        on=['year', 'country'],
+        on=['year', 'country_id'],
         how='inner'
-    ).dropna(subset=['Annual_Visitors', 'Avg_Total_Spend'])
+    ).dropna(subset=['Annual_Visitors', 'Avg_Total_Spend']).drop(columns=['country_id'])
 
     df_market_potential_yearly['Market_Potential_Total'] = df_market_potential_yearly['Annual_Visitors'] * df_market_potential_yearly['Avg_Total_Spend']
 
-    # df_avg_spend (費目割合/推移分析用)
-    df_ratio_pivot = df_spend_items_major.pivot_table(index=['year', 'country', 'Quarter'], columns='expense_items', values='composition_ratio').fillna(0)
-    df_unit_pivot_original = df_spend_items_major.pivot_table(index=['year', 'country', 'Quarter'], columns='expense_items', values='consumption_unit').fillna(0)
+    return df_market_potential_quarterly, df_market_potential_yearly
+
+
+def _build_avg_spend(fact_store, spend_frames):
+    """
+    費目割合/推移分析用の、主要費目の構成比・消費単価（四半期）を作成する。
+    """
+    country_names = fact_store['dimensions']['country'].set_index('country_id')['country']
+    df_total_all = spend_frames[1]
+
+    major_item_filter = {'is_major': True}
+    df_ratio_pivot = pivot_facts(fact_store, 'spend', 'composition_ratio', index=['year', 'country_id', 'Quarter'], columns='expense_items', filters=major_item_filter, agg='mean').fillna(0)
+    df_unit_pivot_original = pivot_facts(fact_store, 'spend', 'consumption_unit', index=['year', 'country_id', 'Quarter'], columns='expense_items', filters=major_item_filter, agg='mean').fillna(0)
     df_ratio_pivot = df_ratio_pivot.add_suffix('_ratio')
     df_unit_pivot_original = df_unit_pivot_original.add_suffix('_unit')
-    df_merged = df_ratio_pivot.merge(df_unit_pivot_original, on=['year', 'country', 'Quarter'], how='outer').fillna(0).reset_index()
+    df_merged = df_ratio_pivot.merge(df_unit_pivot_original, on=['year', 'country_id', 'Quarter'], how='outer').fillna(0).reset_index()
     
-    df_avg_spend = df_merged.merge(df_total_all.rename(columns={'Avg_Total_Spend': 'avg_total_spend_official'}), on=['year', 'country', 'Quarter'], how='left').set_index(['year', 'country', 'Quarter'])
+    df_avg_spend = df_merged.merge(df_total_all.rename(columns={'Avg_Total_Spend': 'avg_total_spend_official'}), on=['year', 'country_id', 'Quarter'], how='left')
+    df_avg_spend['country'] = df_avg_spend.pop('country_id').map(country_names)
+    return df_avg_spend.set_index(['year', 'country', 'Quarter']).sort_index()
 
-    # df_destination/df_pca_scores
-    if not df_destination.empty:
-        df_destination_pivot = df_destination.pivot_table(index='Year', columns='Prefecture', values='Visit Rate(%)')
-    else:
-        df_destination_pivot = pd.DataFrame()
 
-    if not df_pca_scores.empty:
-        df_pca_scores.rename(columns={'Country/Area': 'country'}, inplace=True)
-    
-    return df_jnto_pivot, df_avg_spend, df_destination_pivot, df_pca_scores, df_jnto_yearly, df_avg_spend_yearly_old, df_market_potential_quarterly, df_market_potential_yearly, all_consumption_items_ordered
+def _apply_pca_countries(df_pca_scores, df_countries):
+    if df_pca_scores.empty:
+        return df_pca_scores
+    df_pca_scores = apply_country_dimension(df_pca_scores, df_countries, country_col='Country/Area')
+    return df_pca_scores[['country'] + [col for col in df_pca_scores.columns if col not in ['country', 'country_id']]]
+
+
+# 段階名: (関数, [依存先の段階名])
+# ファイルの読込は互いに独立なため並列に実行され、国ディメンション以降は依存先がそろった段階から実行される
+LOAD_STAGES = {
+    'read_visitors': (_read_visitors, []),
+    'read_spend': (_read_spend, []),
+    'read_destination': (_read_destination_pivot, []),
+    'read_pca_scores': (_read_pca_scores, []),
+    'load_pca_model': (load_pca_model, []),
+    'refresh_pca_scores': (_refresh_pca_scores, ['load_pca_model', 'read_pca_scores']),
+    'countries': (_build_countries, ['read_visitors', 'read_spend', 'refresh_pca_scores']),
+    'visitors_with_ids': (_apply_visitor_countries, ['read_visitors', 'countries']),
+    'spend_with_ids': (apply_country_dimension, ['read_spend', 'countries']),
+    'fact_store': (build_fact_store, ['visitors_with_ids', 'spend_with_ids', 'countries']),
+    'visitor_frames': (_build_visitor_frames, ['fact_store']),
+    'spend_frames': (_build_spend_frames, ['fact_store']),
+    'avg_spend': (_build_avg_spend, ['fact_store', 'spend_frames']),
+    'market_potential': (_build_market_potential, ['visitor_frames', 'spend_frames']),
+    'pca_scores': (_apply_pca_countries, ['refresh_pca_scores', 'countries']),
+}
+
+
+def build_data(as_of=None):
+    """
+    必要なデータファイルを読み込み、分析しやすい形式に前処理する関数（load_data の結果を作成する。キャッシュはしない）。
+    費目別および細目別の消費単価をポテンシャル分析データに追加します。
+    国・地域名は読込直後に国ディメンション（app/countries.py）で表記ゆれを解決し、データ間の結合は国IDで行います。
+    読み込んだデータはファクトストア（app/facts.py）にまとめ、結合・計算済みのデータフレーム（消費単価・市場ポテンシャル）のみを
+    その問い合わせ結果として作成します。訪日客数の月次・年次の集計は保持せず、各ページが表示する部分だけをストアに問い合わせます。
+    data/columnar に年分割の列指向ファイル（app/columnar.py で作成）があれば、CSVの代わりに必要な列のみを読み込みます。
+    大きな CSV は全体を読み込まず、チャンクごとの部分集計（app/streaming.py）で集計キーごとに1行へまとめてから使用します。
+    読込と前処理は LOAD_STAGES の依存関係に沿って並列に実行し、段階別の所要時間は get_last_timings(LOAD_PIPELINE_NAME) で参照できます。
+    as_of を指定した場合、訪日客数と消費データはその時点で記録されていた版（app/vintage.py）を使用します（他のデータは現在の値）。
+    必須ファイルがない場合は FileNotFoundError を送出します。
+    """
+
+    stages = dict(LOAD_STAGES)
+    if as_of is not None:
+        stages['read_visitors'] = (lambda: read_table_as_of('visitors', as_of), [])
+        stages['read_spend'] = (lambda: read_table_as_of('spending', as_of), [])
+
+    results, _ = run_stages(stages, pipeline_name=LOAD_PIPELINE_NAME if as_of is None else None)
+
+    all_consumption_items_ordered = results['spend_frames'][0]
+    df_market_potential_quarterly, df_market_potential_yearly = results['market_potential']
+
+    return (
+        results['avg_spend'],
+        results['read_destination'],
+        results['pca_scores'],
+        df_market_potential_quarterly,
+        df_market_potential_yearly,
+        all_consumption_items_ordered,
+        results['countries'],
+        results['fact_store'],
+    )
+
+
+@st.cache_resource(show_spinner="データを読み込んでいます...")
+def get_data_store():
+    """
+    全セッションで共有するデータストア（app/reload.py）を返す。初回のみ同期的に読み込み、
+    以降は data/ の変更をバックグラウンドで確認して、再構築が完了したデータに差し替えます（サーバーの再起動は不要）。
+    """
+    store = DataStore(build_data)
+    if RELOAD_ENABLED:
+        store.start_polling()
+    return store
+
+
+def is_data_version_current(data_version):
+    """
+    data_version（セッションが表示しているデータのバージョン）が共有データストアの現在のデータと同じで、
+    data/ のファイルもその構築時から変わっていないかを返す。基準日時点（as_of）のデータは常に False です。
+    ファイルを直接読む処理（SQL バックエンドなど）を、セッションのデータと同じ版を読む場合に限って使用するための確認です。
+    """
+    if data_version is None:
+        return False
+    return get_data_store().is_current(data_version)
+
+
+def load_data_snapshot():
+    """
+    共有データストアの現在のデータを (バージョン, load_data の結果, 読込時刻) で返す。
+    結果は同じバージョンの組として受け取るため、途中で差し替えが起きても新旧のデータが混在しません。
+    """
+    try:
+        return get_data_store().snapshot()
+    except FileNotFoundError as e:
+        st.error(f"必須ファイルが見つかりません: {e.filename}。ファイル名またはパスを確認してください。")
+        st.stop()
+        return None, (None, None, None, None, None, None, None, None), None
+
+
+@st.cache_data(show_spinner="基準日時点のデータを読み込んでいます...", max_entries=16)
+def load_data_as_of(as_of, vintage_versions):
+    """
+    基準日時点のデータ（build_data(as_of) の結果）を返す。記録が追加されると vintage_versions が変わり、再作成されます。
+    """
+    return build_data(as_of)
+
+
+def _get_vintage_versions():
+    return tuple(get_vintage_version(table) for table in VINTAGE_TABLES)
+
+
+def get_as_of_data_version(as_of):
+    """
+    基準日時点のデータのバージョン（「as_of:{基準日時}:{版の記録のハッシュ}」）を返す。
+    load_data_as_of のキャッシュキーと同じく、版が追記されるとバージョンも変わります。
+    """
+    digest = hashlib.sha256(repr(_get_vintage_versions()).encode('utf-8')).hexdigest()[:12]
+    return f"as_of:{pd.Timestamp(as_of).isoformat()}:{digest}"
+
+
+def load_data(as_of=None):
+    """
+    現在のデータ（build_data の結果）を返す。データは共有データストアで保持し、data/ の更新時は自動的に差し替わります。
+    as_of（日付・日時）を指定した場合は、その時点で公表されていた訪日客数・消費データ（暫定値・改訂値の版）で作成します。
+    """
+    if as_of is not None:
+        try:
+            return load_data_as_of(pd.Timestamp(as_of), _get_vintage_versions())
+        except FileNotFoundError as e:
+            st.error(f"基準日時点のデータの記録が見つかりません: {e.filename}。python -m app.vintage record で記録を作成してください。")
+            st.stop()
+            return None, None, None, None, None, None, None, None
+        except ValueError as e:
+            st.error(f"基準日時点のデータを作成できません: {e}")
+            st.stop()
+            return None, None, None, None, None, None, None, None
+
+    _, results, _ = load_data_snapshot()
+    return results
 
 
 # ============================================
@@ -0,0 +1,26 @@
+import os
+import hashlib
+
+
+def get_file_version(path):
+    """
+    ファイルのバージョン（更新時刻とサイズ）を返す。キャッシュキーとして使用します。
+    ファイルが存在しない場合は None を返します。
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def get_file_fingerprint(path):
+    """
+    ファイル内容の SHA-256 を返す（大きなファイルもブロック単位で読み込む）。
+    更新時刻だけが変わった（内容は同じ）ファイルを、変更なしと判定するために使用します。
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,245 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+import sys
+import glob
+from app.columnar import DATA_PATH, SOURCE_TABLES, TABLE_SCHEMAS, read_table
+from app.versioning import get_file_version
+
+# ============================================
+# 定数
+# ============================================
+# 記録の配置先: {VINTAGE_DIR}/{テーブル名}/{記録日時}.parquet（追記のみ。既存のファイルは変更しない）
+VINTAGE_DIR = os.environ.get("INBOUND_VINTAGE_DIR", os.path.join(DATA_PATH, "vintages"))
+
+# テーブル名: (行のキー, 値の列)
+VINTAGE_TABLES = {
+    'visitors': (['Year', 'Month_Numeric', 'Country/Area'], ['Visitor_Numeric']),
+    'spending': (['year', 'country', 'Quarter', 'expense_items', 'details'], ['consumption_unit', 'composition_ratio']),
+}
+
+MEASURE_COL = 'measure'
+VALUE_COL = 'value'
+DELETED_COL = 'deleted' # 前回の記録にあり、今回の CSV にない値
+VINTAGE_COL = 'vintage' # 記録日時
+
+
+# ============================================
+# 記録の読込と as-of 索引
+# ============================================
+
+def get_vintage_dir(table):
+    return os.path.join(VINTAGE_DIR, table)
+
+
+def list_vintage_files(table):
+    """
+    テーブルの記録ファイルの一覧を返す（ファイル名が記録日時のため、名前順が記録順）。
+    """
+    return sorted(glob.glob(os.path.join(get_vintage_dir(table), '*.parquet')))
+
+
+def get_vintage_version(table):
+    """
+    記録ファイルのバージョン（ファイルごとの更新時刻・サイズ）を返す。索引のキャッシュキーとして使用します。
+    """
+    return tuple(get_file_version(path) for path in list_vintage_files(table))
+
+
+def build_vintage_index(table):
+    """
+    全ての記録を、セル（行のキー × 値の列）ごとに記録日時の昇順で並べた as-of 索引を作成する。
+    セルID × 記録日時の順位 を1つの整数キーとして昇順に並べるため、任意の基準日時について
+    全てのセルの「基準日時以前で最新の記録」を1回の二分探索（searchsorted）で求められます。
+
+    Returns:
+        dict:
+            rows: 行のキー（初出順。row_id の順）
+            cells: row_id, measure（セルID の順）
+            vintages: 記録日時の一覧（昇順）
+            sort_key, cell_id, value, deleted: 記録（sort_key の昇順）
+    """
+    keys, _ = VINTAGE_TABLES[table]
+    paths = list_vintage_files(table)
+    if not paths:
+        raise FileNotFoundError(get_vintage_dir(table))
+
+    df_log = pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+
+    # 行・セルのIDは初出順（最初の記録での CSV の行順）とする
+    row_codes, df_rows = pd.MultiIndex.from_frame(df_log[keys]).factorize()
+    df_rows = df_rows.to_frame(index=False, name=keys)
+    cell_codes, cell_uniques = pd.MultiIndex.from_arrays([row_codes, df_log[MEASURE_COL]]).factorize()
+    df_cells = cell_uniques.to_frame(index=False, name=['row_id', MEASURE_COL])
+
+    vintages = np.sort(df_log[VINTAGE_COL].unique())
+    vintage_rank = np.searchsorted(vintages, df_log[VINTAGE_COL].to_numpy())
+    sort_key = cell_codes.astype(np.int64) * len(vintages) + vintage_rank
+    order = np.argsort(sort_key, kind='stable')
+
+    return {
+        'rows': df_rows,
+        'cells': df_cells,
+        'vintages': vintages,
+        'sort_key': sort_key[order],
+        'cell_id': cell_codes[order],
+        'value': df_log[VALUE_COL].to_numpy(dtype=float)[order],
+        'deleted': df_log[DELETED_COL].to_numpy(dtype=bool)[order],
+    }
+
+
+@st.cache_data(show_spinner=False)
+def build_vintage_index_cached(table, vintage_version):
+    return build_vintage_index(table)
+
+
+def _to_cutoff(as_of):
+    """
+    基準日時を、記録日時と比較する上限に変換する（日付のみの場合はその日の終わりまでを含む）。
+    """
+    as_of = pd.Timestamp(as_of)
+    if as_of == as_of.normalize():
+        return as_of + pd.Timedelta(days=1) - pd.Timedelta(1, unit='ns')
+    return as_of
+
+
+def query_as_of(index, as_of=None):
+    """
+    as-of 索引から、基準日時の時点で記録されていた値を行のキー × 値の列のワイド形式で返す（as_of が None の場合は最新）。
+    基準日時より後に追加された行や、基準日時の時点で削除されていた行は含みません。
+    """
+    n_cells = len(index['cells'])
+    n_vintages = len(index['vintages'])
+    if as_of is None:
+        n_visible = n_vintages
+    else:
+        cutoff = np.datetime64(_to_cutoff(as_of).to_datetime64(), 'ns')
+        n_visible = int(np.searchsorted(index['vintages'].astype('datetime64[ns]'), cutoff, side='right'))
+
+    # セルごとに「基準日時以前で最新の記録」の位置（sort_key が セルID × 記録数 + 記録順位 未満で最大の位置）
+    cell_ids = np.arange(n_cells, dtype=np.int64)
+    positions = np.searchsorted(index['sort_key'], cell_ids * n_vintages + n_visible, side='left') - 1
+    found = positions >= 0
+    found[found] = index['cell_id'][positions[found]] == cell_ids[found]
+    visible = found.copy()
+    visible[found] = ~index['deleted'][positions[found]]
+
+    df_cells = index['cells'][visible].copy()
+    df_cells[VALUE_COL] = index['value'][positions[visible]]
+    df_wide = df_cells.pivot(index='row_id', columns=MEASURE_COL, values=VALUE_COL)
+    df_wide = df_wide.reindex(columns=pd.unique(index['cells'][MEASURE_COL]))
+    df_wide.columns.name = None
+    return index['rows'].iloc[df_wide.index].reset_index(drop=True).join(df_wide.reset_index(drop=True))
+
+
+def read_table_as_of(table, as_of):
+    """
+    テーブルを、基準日時の時点で記録されていた値で読み込む（列構成は read_table と同じ）。
+    記録がない場合は FileNotFoundError、基準日時が最初の記録より前の場合は ValueError を送出します。
+    """
+    index = build_vintage_index_cached(table, get_vintage_version(table))
+    if _to_cutoff(as_of) < pd.Timestamp(index['vintages'][0]):
+        raise ValueError(f"'{table}' の最初の記録（{pd.Timestamp(index['vintages'][0]):%Y-%m-%d}）より前の基準日時です: {as_of}")
+    df = query_as_of(index, as_of)
+    for col in VINTAGE_TABLES[table][1]:
+        # 記録では値を float で保持するため、整数の列は欠損がなければ定義の型に戻す
+        target_dtype = TABLE_SCHEMAS[table].field(col).type.to_pandas_dtype()
+        if df[col].notna().all():
+            df[col] = df[col].astype(target_dtype)
+    return df[TABLE_SCHEMAS[table].names]
+
+
+# ============================================
+# 記録の追加（変更があったセルのみ）
+# ============================================
+
+def _to_long(df, keys, measures):
+    df_long = df[keys + measures].melt(id_vars=keys, value_vars=measures, var_name=MEASURE_COL, value_name=VALUE_COL)
+    df_long[VALUE_COL] = df_long[VALUE_COL].astype(float)
+    return df_long
+
+
+def record_vintage(table, df_current=None, vintage=None):
+    """
+    現在の CSV（または df_current）の値を、記録日時 vintage（省略時は現在時刻）の版として追記する。
+    最新の記録と比べて値が変わったセル・新しいセル・なくなったセル（削除の印）のみを1つのファイルとして書き出し、
+    既存の記録ファイルは変更しません。
+
+    Returns:
+        int: 追記したセル数（変更がない場合は 0 で、ファイルも作成しない）
+    """
+    keys, measures = VINTAGE_TABLES[table]
+    if df_current is None:
+        df_current = read_table(table, columns=TABLE_SCHEMAS[table].names)
+    if df_current.duplicated(subset=keys).any():
+        raise ValueError(f"'{table}' に同じキーの行が複数あります。版の記録にはキーごとに1行のデータが必要です。")
+
+    vintage = pd.Timestamp.now() if vintage is None else pd.Timestamp(vintage)
+    df_new = _to_long(df_current, keys, measures)
+
+    if list_vintage_files(table):
+        index = build_vintage_index(table)
+        if vintage <= pd.Timestamp(index['vintages'][-1]):
+            # 追記のみとするため、最新の記録より前の日時の版は追加できない
+            raise ValueError(f"記録日時 {vintage} は、最新の記録 {pd.Timestamp(index['vintages'][-1])} より後である必要があります。")
+        cell_keys = keys + [MEASURE_COL]
+        df_latest = _to_long(query_as_of(index), keys, measures)
+
+        # 新しいセル・値が変わったセル（CSV の行順を保つため、今回の値を左にして結合する）
+        df_merged = df_new.merge(df_latest, on=cell_keys, how='left', suffixes=('', '_latest'), indicator=True)
+        new_values = df_merged[VALUE_COL]
+        latest_values = df_merged[VALUE_COL + '_latest']
+        same_value = (new_values == latest_values) | (new_values.isna() & latest_values.isna())
+        changed = (df_merged['_merge'] == 'left_only') | ~same_value
+        df_changed = df_merged.loc[changed, cell_keys + [VALUE_COL]].assign(**{DELETED_COL: False})
+
+        # なくなったセル（値は持たず、削除の印のみを記録する）
+        df_removed = df_latest.merge(df_new[cell_keys], on=cell_keys, how='left', indicator=True)
+        df_removed = df_removed.loc[(df_removed['_merge'] == 'left_only') & df_removed[VALUE_COL].notna(), cell_keys]
+        df_removed = df_removed.assign(**{VALUE_COL: np.nan, DELETED_COL: True})
+
+        df_changes = pd.concat([df_changed, df_removed], ignore_index=True)
+    else:
+        df_changes = df_new.copy()
+        df_changes[DELETED_COL] = False
+
+    if df_changes.empty:
+        return 0
+
+    df_changes[VINTAGE_COL] = vintage
+    os.makedirs(get_vintage_dir(table), exist_ok=True)
+    path = os.path.join(get_vintage_dir(table), f"{vintage:%Y%m%dT%H%M%S%f}.parquet")
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    df_changes.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+    return len(df_changes)
+
+
+def record_all_vintages(vintage=None, data_path=DATA_PATH):
+    """
+    CSV が存在する全ての版管理対象テーブルについて、現在の値を記録する。
+
+    Returns:
+        dict: {テーブル名: 追記したセル数}
+    """
+    results = {}
+    for table in VINTAGE_TABLES:
+        filename, _, _ = SOURCE_TABLES[table]
+        if os.path.exists(os.path.join(data_path, filename)):
+            results[table] = record_vintage(table, vintage=vintage)
+    return results
+
+
+if __name__ == "__main__":
+    # 使い方:
+    #   python -m app.vintage record              ... 現在の CSV の値を現在時刻の版として記録する
+    #   python -m app.vintage record 2025-06-30   ... 指定した日付の版として記録する（過去の公表値の取り込み用）
+    command = sys.argv[1] if len(sys.argv) > 1 else "record"
+    if command != "record":
+        sys.exit(f"不明なコマンドです: {command}（record を指定してください）")
+
+    results = record_all_vintages(vintage=sys.argv[2] if len(sys.argv) > 2 else None)
+    for table, n_cells in results.items():
+        print(f"{table}: {n_cells} セルを '{get_vintage_dir(table)}' に追記しました。")
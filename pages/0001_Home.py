@@ -1,5 +1,8 @@
 import streamlit as st
-from app.utils import load_data, get_pc_label, COLOR_MAP, ITEM_ORDER
+import pandas as pd
+from app.utils import load_data, load_data_snapshot, get_as_of_data_version, get_pc_label, COLOR_MAP, ITEM_ORDER, LOAD_PIPELINE_NAME
+from app.pipeline import get_last_timings
+from app.profiling import PROFILE_ADMIN_ENABLED
 
 # ============================================
 # UIレイアウト (共通設定)
@@ -12,33 +15,57 @@ st.set_page_config(
 # ============================================
 # データ読込とセッションステートへの格納
 # ============================================
-load_results = load_data()
+# 「?as_of=YYYY-MM-DD」を指定した場合は、その日に公表されていた訪日客数・消費データ（暫定値・改訂値の版）で表示する
+as_of = st.query_params.get("as_of")
+if as_of:
+    try:
+        as_of = pd.Timestamp(as_of)
+        if pd.isna(as_of):
+            raise ValueError(as_of)
+    except ValueError:
+        st.warning(f"基準日の形式が正しくありません: {as_of}（例: ?as_of=2025-06-30）。最新のデータを表示します。")
+        as_of = None
 
-# 戻り値が9つであることを確認
-if load_results is None or len(load_results) != 9:
+if as_of:
+    # data_version は予測などの共有キャッシュのキーにもなるため、基準日時と版の記録の両方で区別する
+    load_results = load_data(as_of=as_of)
+    data_version, data_loaded_at = get_as_of_data_version(as_of), pd.Timestamp.now()
+else:
+    # 共有データストアから、同じバージョンのデータの組を取得する（data/ の更新はバックグラウンドで反映される）
+    data_version, load_results, data_loaded_at = load_data_snapshot()
+
+# 戻り値が8個であることを確認
+if load_results is None or len(load_results) != 8:
     st.stop()    
 (
-    df_jnto_pivot, 
     df_avg_spend, 
     df_destination_pivot, 
     df_pca_scores, 
-    df_jnto_yearly, 
-    df_avg_spend_yearly, 
     df_market_potential_quarterly, 
     df_market_potential_yearly, 
-    all_consumption_items_ordered 
+    all_consumption_items_ordered,
+    df_countries,
+    fact_store
 ) = load_results
 
 # 共通データとヘルパー関数をセッションステートに格納
-st.session_state.df_jnto_pivot = df_jnto_pivot
+# （訪日客数は fact_store のみを保持し、各ページが表示する部分だけを問い合わせる）
 st.session_state.df_avg_spend = df_avg_spend
 st.session_state.df_destination_pivot = df_destination_pivot
 st.session_state.df_pca_scores = df_pca_scores
-st.session_state.df_jnto_yearly = df_jnto_yearly
-st.session_state.df_avg_spend_yearly = df_avg_spend_yearly
 st.session_state.df_market_potential_quarterly = df_market_potential_quarterly
 st.session_state.df_market_potential_yearly = df_market_potential_yearly
 st.session_state.all_consumption_items_ordered = all_consumption_items_ordered
+st.session_state.df_countries = df_countries
+st.session_state.fact_store = fact_store
+
+# このセッションが前回 Home で受け取ったデータから更新されていれば通知する
+# （他のページはセッションステートのデータを使うため、Home を開くまでは同じバージョンのまま表示される）
+previous_version = st.session_state.get('data_version')
+if previous_version is not None and previous_version != data_version:
+    st.toast(f"データが更新されました（{data_loaded_at:%Y-%m-%d %H:%M} 読込）")
+st.session_state.data_version = data_version
+st.session_state.data_loaded_at = data_loaded_at
 
 st.session_state.SOURCE_CAPTION = "出典: 観光庁「訪日外国人消費動向調査」より作成"
 if 'year' in df_market_potential_yearly.columns:
@@ -51,9 +78,24 @@ st.session_state.get_pc_label = get_pc_label
 st.session_state.COLOR_MAP = COLOR_MAP
 st.session_state.ITEM_ORDER = ITEM_ORDER
 
+# データ読込の段階別の所要時間（管理者向け。キャッシュから返した場合は最後に読み込んだときの値）
+if PROFILE_ADMIN_ENABLED:
+    df_load_timings = get_last_timings(LOAD_PIPELINE_NAME)
+    if df_load_timings is not None:
+        with st.sidebar.expander("データ読込の所要時間（段階別）"):
+            st.caption(f"全体: {df_load_timings.attrs.get('total_sec', 0):.2f} 秒 / データバージョン: {data_version}（{data_loaded_at:%Y-%m-%d %H:%M:%S} 読込）")
+            st.dataframe(
+                df_load_timings[['stage', 'start_sec', 'elapsed_sec']].round(3),
+                hide_index=True,
+                use_container_width=True
+            )
+
 
 st.title("観光×消費 インバウンドデータ分析基盤")
 
+if as_of:
+    st.info(f"{as_of:%Y年%m月%d日} 時点で公表されていた訪日客数・消費データで表示しています（行動・訪問率データは最新の値）。")
+
 st.markdown("""
     #### インバウンド市場を「戦略」「消費」「行動」の三側面から多角的に分析
 
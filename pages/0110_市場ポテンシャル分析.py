@@ -4,6 +4,10 @@ import numpy as np
 import plotly.express as px
 from itertools import product 
 from app.utils import get_country_list_sorted, get_safe_default_countries
+from app.profiling import profile_rerun
+from app.projection import get_market_potential_projection, QUADRANT_NAME_MAP, QUADRANT_ORDER
+from app.montecarlo import simulate_market_potential, VISITORS_ERROR, SPEND_ERROR, N_DRAWS, INTERVAL_LEVEL
+from app.rollup import build_fiscal_year_potential
 
 # セッションステートからデータを取得
 if 'df_market_potential_yearly' not in st.session_state:
@@ -13,6 +17,12 @@ if 'df_market_potential_yearly' not in st.session_state:
 # 必要なデータをセッションステートから取得
 df_market_potential_yearly = st.session_state.df_market_potential_yearly
 df_market_potential_quarterly = st.session_state.df_market_potential_quarterly
+fact_store = st.session_state.fact_store
+
+# 分析期間の単位
+LEVEL_YEARLY = "年次 (年間総計)"
+LEVEL_FISCAL_YEAR = "年度 (4月〜翌3月)"
+LEVEL_QUARTERLY = "四半期別"
 
 ALL_CONSUMPTION_ITEMS_ORDERED = st.session_state.all_consumption_items_ordered
 
@@ -25,6 +35,122 @@ POTENTIAL_ITEMS_DICT = {
     '細目別': ['全体'] + ALL_CONSUMPTION_ITEMS_ORDERED 
 }
 
+def render_quadrant_migration(projection, analysis_level, spend_col, selected_item, selected_countries, selected_quarters):
+    """
+    基準年（実績の最終年）から翌年予測への象限の移動を、選択した国・項目について表示する。
+    象限は全ての国 × 項目について事前に一括計算済みの結果（キャッシュ）から抽出します。
+    """
+    base_year = projection['base_year']
+    target_year = projection['target_year']
+    st.subheader(f"象限の移動（{base_year}年 実績 → {target_year}年 予測）")
+
+    if analysis_level == LEVEL_YEARLY:
+        df_migration = projection['migration_yearly']
+        key_cols = ['country']
+    else:
+        df_migration = projection['migration_quarterly']
+        df_migration = df_migration[df_migration['Quarter'].isin(selected_quarters)]
+        key_cols = ['Quarter', 'country']
+
+    df_migration = df_migration[
+        (df_migration['item'] == spend_col) & (df_migration['country'].isin(selected_countries))
+    ].dropna(subset=['base_quadrant', 'projected_quadrant'], how='all')
+
+    if df_migration.empty:
+        st.info(f"選択された国・地域と項目（{selected_item}）では、象限の移動を判定できるデータがありません。")
+        return
+
+    col_matrix, col_table = st.columns([2, 3])
+
+    with col_matrix:
+        # 基準年の象限 × 予測の象限 の国数
+        df_matrix = (
+            pd.crosstab(df_migration['base_quadrant'], df_migration['projected_quadrant'])
+            .reindex(index=QUADRANT_ORDER, columns=QUADRANT_ORDER, fill_value=0)
+            .rename_axis(index=f"{base_year}年", columns=f"{target_year}年（予測）")
+        )
+        st.markdown("<h5 style='font-size: 1.1rem;'>象限の遷移（国数）</h5>", unsafe_allow_html=True)
+        st.dataframe(df_matrix, use_container_width=True)
+
+    with col_table:
+        df_show = df_migration.copy()
+        df_show['Migration'] = np.where(
+            df_show['base_quadrant'] == df_show['projected_quadrant'],
+            "変化なし",
+            df_show['base_quadrant'].fillna('—') + " → " + df_show['projected_quadrant'].fillna('—')
+        )
+        df_show['Potential_Change'] = df_show['projected_potential'] / df_show['base_potential'] - 1
+        df_show = df_show.sort_values(key_cols).rename(columns={
+            'base_quadrant': f'{base_year}年',
+            'projected_quadrant': f'{target_year}年（予測）',
+            'base_potential': f'Market_Potential_{base_year}',
+            'projected_potential': f'Market_Potential_{target_year}',
+        })
+        st.markdown("<h5 style='font-size: 1.1rem;'>国別の象限と市場ポテンシャル</h5>", unsafe_allow_html=True)
+        st.dataframe(
+            df_show.drop(columns=['item']).style.format({
+                f'Market_Potential_{base_year}': "¥{:,.0f}",
+                f'Market_Potential_{target_year}': "¥{:,.0f}",
+                'Potential_Change': "{:+.1%}",
+            }, na_rep='—'),
+            use_container_width=True,
+            hide_index=True
+        )
+
+
+def render_uncertainty_section(df_plot, visitors_col, spend_col, selected_item, selected_countries, time_title, uncertainty_settings):
+    """
+    訪日客数・消費単価の誤差を考慮したモンテカルロ試行による、象限の所属確率と市場ポテンシャルの区間を表示する。
+    """
+    df_simulation = simulate_market_potential(df_plot, visitors_col, **uncertainty_settings)
+    df_simulation = df_simulation[
+        (df_simulation['item'] == spend_col) & (df_simulation['country'].isin(selected_countries))
+    ].dropna(subset=[f'P_{q}' for q in QUADRANT_ORDER], how='all')
+
+    if df_simulation.empty:
+        return
+
+    st.markdown(f"<h4 style='font-size: 1.25rem;'>{time_title}｜象限の所属確率と市場ポテンシャルの区間</h4>", unsafe_allow_html=True)
+    col_probability, col_interval = st.columns(2)
+
+    with col_probability:
+        df_probability = df_simulation.melt(
+            id_vars='country', value_vars=[f'P_{q}' for q in QUADRANT_ORDER], var_name='Quadrant', value_name='Probability'
+        )
+        df_probability['Quadrant'] = df_probability['Quadrant'].str.replace('P_', '', regex=False)
+        fig_probability = px.bar(
+            df_probability,
+            x='Probability',
+            y='country',
+            color='Quadrant',
+            orientation='h',
+            category_orders={'Quadrant': QUADRANT_ORDER},
+            title=f"象限の所属確率 ({selected_item})",
+            labels={'Probability': '確率', 'country': '国・地域', 'Quadrant': '象限'},
+            height=max(300, 40 * df_simulation['country'].nunique() + 120)
+        )
+        fig_probability.update_xaxes(tickformat='.0%', range=[0, 1])
+        st.plotly_chart(fig_probability, use_container_width=True)
+
+    with col_interval:
+        df_show = df_simulation[['country', 'potential', 'potential_lower', 'potential_upper'] + [f'P_{q}' for q in QUADRANT_ORDER]]
+        df_show = df_show.sort_values('potential', ascending=False).rename(columns={
+            'potential': 'Market_Potential',
+            'potential_lower': 'Lower',
+            'potential_upper': 'Upper',
+        })
+        st.dataframe(
+            df_show.style.format({
+                'Market_Potential': "¥{:,.0f}",
+                'Lower': "¥{:,.0f}",
+                'Upper': "¥{:,.0f}",
+                **{f'P_{q}': "{:.0%}" for q in QUADRANT_ORDER},
+            }, na_rep='—'),
+            use_container_width=True,
+            hide_index=True
+        )
+
+
 def page_market_potential_analysis():
     st.header("市場ポテンシャル分析")
     st.markdown("""
@@ -38,10 +164,10 @@ def page_market_potential_analysis():
     
     col_level_1, col_level_2 = st.columns(2)
     
-    analysis_level_options = ("年次 (年間総計)", "四半期別")
+    analysis_level_options = (LEVEL_YEARLY, LEVEL_FISCAL_YEAR, LEVEL_QUARTERLY)
     
     if 'potential_analysis_level_state' not in st.session_state:
-        st.session_state.potential_analysis_level_state = "年次 (年間総計)"
+        st.session_state.potential_analysis_level_state = LEVEL_YEARLY
     
     try:
         level_default_index = analysis_level_options.index(st.session_state.potential_analysis_level_state)
@@ -78,8 +204,25 @@ def page_market_potential_analysis():
         )
         st.session_state.potential_analysis_level_state = item_category 
 
+    view_mode_options = ("実績", "翌年予測")
+    view_mode = st.radio(
+        "表示モード",
+        view_mode_options,
+        key="potential_view_mode_key",
+        horizontal=True,
+        help="翌年予測では、訪日客数の予測値 × 消費単価のトレンドから翌年の市場ポテンシャルと象限を推計します。"
+    )
+    projection = None
+    if view_mode == "翌年予測":
+        if analysis_level == LEVEL_FISCAL_YEAR:
+            st.info("翌年予測は、分析期間の単位が「年次」または「四半期別」の場合に表示できます。年度単位では実績を表示します。")
+        else:
+            projection = get_market_potential_projection(
+                st.session_state.get('data_version'), fact_store, df_market_potential_yearly, df_market_potential_quarterly
+            )
+
     # 使用データと軸の設定 ---
-    if analysis_level == "年次 (年間総計)":
+    if analysis_level == LEVEL_YEARLY:
         df_market_potential_base = df_market_potential_yearly.copy()
         visitors_col = 'Annual_Visitors'
         visitors_label = '年間訪日客数 (人) [対数]'
@@ -87,6 +230,17 @@ def page_market_potential_analysis():
         # 時系列グラフのベースデータは年次データ全体
         df_time_series_base_all = df_market_potential_yearly.copy()
         df_time_series_base_all['Time_Index'] = df_time_series_base_all['year'].astype(str)
+
+    elif analysis_level == LEVEL_FISCAL_YEAR:
+        # 年度のデータは月次の訪日客数の累積和と四半期の消費単価から作成する
+        df_market_potential_base = build_fiscal_year_potential(
+            st.session_state.get('data_version'), _fact_store=fact_store, _df_market_potential_quarterly=df_market_potential_quarterly
+        )
+        visitors_col = 'Annual_Visitors'
+        visitors_label = '年度訪日客数 (人) [対数]'
+        title_suffix = '年度'
+        df_time_series_base_all = df_market_potential_base.copy()
+        df_time_series_base_all['Time_Index'] = df_time_series_base_all['year'].astype(str) + '年度'
         
     else: # 四半期別
         df_market_potential_base = df_market_potential_quarterly.copy()
@@ -97,6 +251,17 @@ def page_market_potential_analysis():
         df_time_series_base_all = df_market_potential_quarterly.copy()
         df_time_series_base_all['Time_Index'] = df_time_series_base_all['year'].astype(str) + '-' + df_time_series_base_all['Quarter']
 
+    # 翌年予測モード：予測年のデータを実績に追加する
+    if projection is not None:
+        df_projected = projection['yearly'] if analysis_level == LEVEL_YEARLY else projection['quarterly']
+        df_market_potential_base = pd.concat([df_market_potential_base, df_projected], ignore_index=True)
+        df_projected_time_series = df_projected.copy()
+        if analysis_level == LEVEL_YEARLY:
+            df_projected_time_series['Time_Index'] = df_projected_time_series['year'].astype(str)
+        else:
+            df_projected_time_series['Time_Index'] = df_projected_time_series['year'].astype(str) + '-' + df_projected_time_series['Quarter']
+        df_time_series_base_all = pd.concat([df_time_series_base_all, df_projected_time_series], ignore_index=True)
+
 
     if df_market_potential_base.empty:
         st.warning("ポテンシャル分析に必要なデータが不足しています。データファイルの内容を確認してください。")
@@ -115,6 +280,12 @@ def page_market_potential_analysis():
     
     if 'potential_selected_years_state' not in st.session_state:
         st.session_state.potential_selected_years_state = [latest_year] if latest_year else []
+
+    # 表示モードを切り替えた場合は、対象年を初期化する（翌年予測では予測年を選択）
+    if st.session_state.get('potential_view_mode_state') != view_mode:
+        st.session_state.potential_view_mode_state = view_mode
+        st.session_state.pop('potential_selected_years_key', None)
+        st.session_state.potential_selected_years_state = [latest_year] if latest_year else []
     
     valid_years = [y for y in st.session_state.potential_selected_years_state if y in available_years]
     if not valid_years:
@@ -139,7 +310,7 @@ def page_market_potential_analysis():
     # Quarter Selection (Only for Quarterly Analysis) - 複数選択
     selected_quarters = [''] 
     
-    if analysis_level == "四半期別":
+    if analysis_level == LEVEL_QUARTERLY:
         available_quarters = sorted(df_filtered_years['Quarter'].unique().tolist())
         
         if 'potential_selected_quarters_state' not in st.session_state:
@@ -219,6 +390,27 @@ def page_market_potential_analysis():
     if not selected_countries:
         st.warning("分析対象国・地域を少なくとも1つ選択してください。")
         st.stop()
+
+    # 不確実性（モンテカルロ）の設定
+    show_uncertainty = st.checkbox(
+        "調査誤差を考慮した不確実性を表示（モンテカルロ）",
+        value=False,
+        key='potential_show_uncertainty_key'
+    )
+    uncertainty_settings = None
+    if show_uncertainty:
+        col_visitors_error, col_spend_error, col_draws = st.columns(3)
+        with col_visitors_error:
+            visitors_error = st.slider("訪日客数の相対誤差 (%)", min_value=0, max_value=10, value=int(VISITORS_ERROR * 100), key='potential_visitors_error_key')
+        with col_spend_error:
+            spend_error = st.slider("消費単価の相対誤差 (%)", min_value=0, max_value=30, value=int(SPEND_ERROR * 100), key='potential_spend_error_key')
+        with col_draws:
+            n_draws = st.selectbox("試行回数", [1000, N_DRAWS, 10000], index=1, key='potential_n_draws_key')
+        uncertainty_settings = {
+            'visitors_error': visitors_error / 100,
+            'spend_error': spend_error / 100,
+            'n_draws': n_draws,
+        }
         
     # グラフ描画のためのデータ準備とループ
     
@@ -235,12 +427,14 @@ def page_market_potential_analysis():
     # df_time_series_base_allは年次または四半期すべての期間のデータを持つ
     df_time_series_base = df_time_series_base_all.copy()
     
-    if analysis_level == "年次 (年間総計)":
-        # バブルチャート用に選択された年のみのデータリストを構築
+    if analysis_level != LEVEL_QUARTERLY:
+        # バブルチャート用に選択された年（年度）のみのデータリストを構築
+        year_suffix = '年度' if analysis_level == LEVEL_FISCAL_YEAR else '年'
         for y in selected_years:
             df_plot_y = df_market_potential_base[df_market_potential_base['year'] == y].copy()
             if not df_plot_y.empty:
-                list_of_dataframes.append((f"{y}年", df_plot_y))
+                time_title = f"{y}年（予測）" if projection is not None and y == projection['target_year'] else f"{y}{year_suffix}"
+                list_of_dataframes.append((time_title, df_plot_y))
         
     else: # 四半期別
         # バブルチャート用に選択された年と四半期の組み合わせのデータリストを構築 (ユーザー選択に限定)
@@ -253,7 +447,8 @@ def page_market_potential_analysis():
             ].copy()
             
             if not df_plot_yq.empty:
-                list_of_dataframes.append((f"{y}年 {q}", df_plot_yq))
+                time_title = f"{y}年（予測） {q}" if projection is not None and y == projection['target_year'] else f"{y}年 {q}"
+                list_of_dataframes.append((time_title, df_plot_yq))
     
     if not list_of_dataframes and df_time_series_base.empty:
         st.warning(f"選択された期間、費目、および国・地域で有効なデータが見つかりませんでした。データが連続していない可能性があります。")
@@ -284,6 +479,27 @@ def page_market_potential_analysis():
             ※ポテンシャル値は「訪日客数 × 選択された項目（{item_category}）の消費単価」として計算しています。 
         </p> 
         """
+    if analysis_level == LEVEL_FISCAL_YEAR:
+        DETAIL_NOTES_HTML += """
+        <p style='font-size: small; color: #888888;'>
+            ※年度（4月〜翌3月）の訪日客数は月次データの累積和による12か月の合計、消費単価は年度に含まれる4四半期（当年 2Q〜4Q と翌年 1Q）の平均です。4四半期と12か月がそろった年度のみ表示しています。
+        </p>
+        """
+    if uncertainty_settings is not None:
+        DETAIL_NOTES_HTML += f"""
+        <p style='font-size: small; color: #888888;'>
+            ※不確実性は、訪日客数と各消費単価に対数正規の相対誤差（標準偏差：訪日客数 {uncertainty_settings['visitors_error']:.0%}、消費単価 {uncertainty_settings['spend_error']:.0%}）を与えた {uncertainty_settings['n_draws']:,} 回の試行から算出しています。<br>
+            ※象限の所属確率は、試行ごとに基準線（全対象国の対数中央値）を再計算して判定した割合、市場ポテンシャルの区間は試行の {INTERVAL_LEVEL:.0%} 区間です。
+        </p>
+        """
+    if projection is not None:
+        DETAIL_NOTES_HTML += f"""
+        <p style='font-size: small; color: #888888;'>
+            ※{projection['target_year']}年（予測）の訪日客数は、月次データに季節モデルを当てはめた予測値の合計です（インバウンド推移ページの予測と同じモデル）。<br>
+            ※{projection['target_year']}年（予測）の消費単価は、国・項目ごとに直近の消費単価の伸び（年率±20%を上限）を延長した推計値です。<br>
+            ※象限の基準線は、各期間の全対象国の対数中央値です（予測年は予測値の対数中央値）。
+        </p>
+        """
     
     # ============================================
     # グラフ描画
@@ -431,12 +647,7 @@ def page_market_potential_analysis():
             axis=1
         )
 
-        quadrant_name_map = {
-            "HH": "戦略的中核市場（量×質）",
-            "LH": "高付加価値市場（質重視）",
-            "HL": "量主導市場（単価改善余地）",
-            "LL": "限定対応市場（探索・維持）"
-        }
+        quadrant_name_map = QUADRANT_NAME_MAP
         df_plot_final['Quadrant_Name'] = df_plot_final['Quadrant'].map(quadrant_name_map)
 
         # ----------------------------------------------------------------------
@@ -469,6 +680,9 @@ def page_market_potential_analysis():
             hide_index=True
         )
 
+        if uncertainty_settings is not None:
+            render_uncertainty_section(df_plot, visitors_col, spend_col, selected_item, selected_countries, time_title, uncertainty_settings)
+
         # ----------------------------------------------------------------------
         # 象限別：国リスト
         # ----------------------------------------------------------------------
@@ -506,12 +720,17 @@ def page_market_potential_analysis():
     if is_bubble_chart_displayed:
         st.markdown("---")
 
+    # 翌年予測モード：基準年からの象限の移動
+    if projection is not None:
+        render_quadrant_migration(projection, analysis_level, spend_col, selected_item, selected_countries, selected_quarters)
+        st.markdown("---")
+
 
     # 時系列推移グラフの描画 (時系列推移データがある場合のみ)
     if not df_time_series_final.empty:
         
         # 四半期分析の場合は、Time_Indexを正しい順序でソートする
-        if analysis_level == "四半期別":
+        if analysis_level == LEVEL_QUARTERLY:
             quarters_order = ['Q1', 'Q2', 'Q3', 'Q4']
             
             # データ内の全ての年と四半期を取得し、適切な順序で Time_Index を作成
@@ -583,4 +802,5 @@ def page_market_potential_analysis():
 
 # ページ関数を実行
 if 'df_market_potential_yearly' in st.session_state:
-    page_market_potential_analysis()
\ No newline at end of file
+    with profile_rerun("0110_市場ポテンシャル分析"):
+        page_market_potential_analysis()
\ No newline at end of file
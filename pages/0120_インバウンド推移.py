@@ -1,21 +1,139 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import numpy as np 
 from app.utils import get_country_list_sorted_for_inbound, get_safe_default_countries, calculate_delta, format_delta_abs, format_delta_percent 
+from app.profiling import profile_rerun
+from app.concentration import compute_source_market_concentration
+from app.forecast import forecast_visitors, PREDICTION_LEVEL
+from app.rollup import build_visitor_cube, rollup_visitors, get_period_labels, GRAIN_LABELS, GRAIN_MONTH, GRAIN_QUARTER, GRAIN_ROLLING_12M
+from app.facts import pivot_visitors, list_fact_countries
 
-if 'df_jnto_pivot' not in st.session_state:
+if 'fact_store' not in st.session_state:
     st.error("必要なデータがロードされていません。Homeに戻ってデータロードを確認してください。")
     st.stop()
 
-df_jnto = st.session_state.df_jnto_pivot
+# 訪日客数はファクトストアから、選択した国の月次のみをピボットして使用する
+fact_store = st.session_state.fact_store
+
+def render_source_market_concentration():
+    """
+    訪日客数の国籍・地域（送客市場）別の集中度（HHI・ジニ係数・上位k市場シェア）の月次推移を表示する。
+    """
+    st.subheader("送客市場の集中度（月次）")
+
+    window_options = {"単月": 1, "3か月ローリング合計": 3, "12か月ローリング合計": 12}
+    col_window, col_top_k = st.columns(2)
+    with col_window:
+        window_label = st.radio("集計期間", list(window_options.keys()), horizontal=True, key='inbound_concentration_window_key')
+    with col_top_k:
+        top_k = st.slider("上位k市場シェアの k", min_value=1, max_value=10, value=5, key='inbound_concentration_top_k_key')
+
+    df_concentration, df_share = compute_source_market_concentration(
+        st.session_state.get('data_version'), window=window_options[window_label], top_n_list=(top_k,), _fact_store=fact_store
+    )
+
+    if df_concentration.empty:
+        st.info("集中度を計算できる期間がありません。")
+        return
+
+    col_index, col_share = st.columns(2)
+
+    with col_index:
+        df_index_melted = (
+            df_concentration[['hhi', 'gini']]
+            .rename(columns={'hhi': 'HHI', 'gini': 'ジニ係数'})
+            .rename_axis('年月')
+            .reset_index()
+            .melt(id_vars='年月', var_name='指標', value_name='値')
+        )
+        fig_index = px.line(
+            df_index_melted,
+            x='年月',
+            y='値',
+            color='指標',
+            title=f"HHI・ジニ係数の推移（{window_label}）",
+            height=420
+        )
+        st.plotly_chart(fig_index, use_container_width=True)
+
+    with col_share:
+        fig_top_k = px.line(
+            (df_concentration[f'top{top_k}_share'] * 100).rename('シェア (%)').rename_axis('年月').reset_index(),
+            x='年月',
+            y='シェア (%)',
+            title=f"上位{top_k}市場が訪日客数に占めるシェア（{window_label}）",
+            height=420
+        )
+        st.plotly_chart(fig_top_k, use_container_width=True)
+
+    # 構成比の推移（直近の構成比が大きい順に積み上げ）
+    latest_order = df_share.iloc[-1].sort_values(ascending=False).index.tolist()
+    fig_share = px.area(
+        (df_share[latest_order] * 100).rename_axis('年月'),
+        title=f"国籍・地域別 構成比の推移（{window_label}）",
+        labels={'value': '構成比 (%)', 'variable': '国・地域'},
+        height=500
+    )
+    st.plotly_chart(fig_share, use_container_width=True)
+
+    st.markdown(
+        """
+        <p style='font-size: small; color: #888888;'>
+        ※「全国籍･地域」（合計）を除く国籍・地域別の訪日客数を対象に算出しています。<br>
+        ※HHI・上位k市場シェアが高いほど、訪日需要が少数の市場に依存していることを示します。
+        </p>
+        """,
+        unsafe_allow_html=True
+    )
+
+
+def add_forecast_traces(fig, selected_countries, horizon):
+    """
+    選択した国の予測値（破線）と予測区間（塗りつぶし）を折れ線グラフに重ねる。
+    予測は全ての国について一括で計算済みの結果（キャッシュ）から抽出します。
+    """
+    df_forecast = forecast_visitors(st.session_state.get('data_version'), horizon, _fact_store=fact_store)
+    colors = {trace.name: trace.line.color for trace in fig.data}
+
+    for country in selected_countries:
+        df_country = df_forecast[df_forecast['country'] == country]
+        if df_country.empty:
+            continue
+        color = colors.get(country)
+
+        fig.add_trace(go.Scatter(
+            x=pd.concat([df_country['date'], df_country['date'][::-1]]),
+            y=pd.concat([df_country['upper'], df_country['lower'][::-1]]),
+            fill='toself',
+            fillcolor=color,
+            opacity=0.15,
+            line=dict(width=0),
+            hoverinfo='skip',
+            showlegend=False,
+            legendgroup=country
+        ))
+        fig.add_trace(go.Scatter(
+            x=df_country['date'],
+            y=df_country['forecast'],
+            mode='lines',
+            line=dict(color=color, dash='dash'),
+            name=f"{country}（予測）",
+            legendgroup=country,
+            customdata=df_country[['lower', 'upper']],
+            hovertemplate="%{x|%Y年%m月}<br>予測: %{y:,.0f} 人<br>予測区間: %{customdata[0]:,.0f} 〜 %{customdata[1]:,.0f} 人"
+        ))
+
+    return fig
+
 
 def page_inbound_trend():
     st.header("インバウンド推移（複数国・月別比較）")
     
-    all_countries = df_jnto.columns.tolist()
+    all_countries = list_fact_countries(fact_store, 'visitors')
     all_countries_sorted = get_country_list_sorted_for_inbound(all_countries)
-    all_dates = df_jnto.index.tolist()
+    all_dates = fact_store['dimensions']['period']['date'].tolist()
     
     if 'inbound_countries_multiselect' not in st.session_state:
         initial_default_countries = get_safe_default_countries(all_countries_sorted, max_list_count=9)
@@ -37,18 +155,45 @@ def page_inbound_trend():
         st.info("表示したい国を1つ以上選択してください。")
         # st.stop() は関数を完全に停止させるため、ここでは return で処理を中断させます
         return
+
+    df_jnto = pivot_visitors(fact_store, selected_countries)
         
     # 折れ線グラフの表示
     st.subheader("訪日観光客数 時系列推移 (人)")
+
+    col_grain, col_forecast, col_horizon = st.columns([2, 1, 1])
+    with col_grain:
+        grain = st.radio(
+            "集計単位",
+            list(GRAIN_LABELS.keys()),
+            format_func=GRAIN_LABELS.get,
+            horizontal=True,
+            key='inbound_grain_key'
+        )
+    is_monthly = grain == GRAIN_MONTH
+    with col_forecast:
+        show_forecast = st.checkbox("予測を表示", value=False, key='inbound_show_forecast_key', disabled=not is_monthly, help="予測は月次でのみ表示できます。")
+        show_forecast = show_forecast and is_monthly
+    with col_horizon:
+        horizon = st.radio("予測期間", [12, 24], format_func=lambda m: f"{m}か月", horizontal=True, key='inbound_forecast_horizon_key', disabled=not show_forecast)
     
-    df_plot = df_jnto[selected_countries]
+    if is_monthly:
+        df_plot = df_jnto[selected_countries]
+    else:
+        # 累積和キューブから、選択した集計単位の合計を取り出す（月がそろっていない期間は表示しない）
+        df_plot = rollup_visitors(build_visitor_cube(df_jnto), grain)[selected_countries].dropna(how='all')
+        if grain not in (GRAIN_QUARTER, GRAIN_ROLLING_12M):
+            df_plot.index = pd.Index(get_period_labels(df_plot.index, grain), name='date')
 
     fig = px.line(
         df_plot, 
-        title="訪日観光者数推移（国別比較）",
-        labels={'value': '訪日観光者数 (人)', 'date': '年月', 'variable': '国'}
+        title=f"訪日観光者数推移（国別比較・{GRAIN_LABELS[grain]}）",
+        labels={'value': '訪日観光者数 (人)', 'date': '期間' if not is_monthly else '年月', 'variable': '国'},
+        markers=not is_monthly
     )
     # 
+    if show_forecast:
+        fig = add_forecast_traces(fig, selected_countries, horizon)
 
     fig.update_yaxes(tickformat=',d')
 
@@ -68,6 +213,29 @@ def page_inbound_trend():
         margin=dict(b=10) 
     )
     st.plotly_chart(fig, use_container_width=True)
+    if not is_monthly:
+        st.markdown(
+            """
+            <p style='font-size: small; color: #888888;'>
+            ※四半期・暦年・年度（4月〜翌3月）・12か月移動合計は、月次データの累積和から集計しています。対象の月がそろっていない期間は表示していません。<br>
+            ※12か月移動合計は、各月を終点とする直近12か月の合計です。
+            </p>
+            """,
+            unsafe_allow_html=True
+        )
+    if show_forecast:
+        st.markdown(
+            f"""
+            <p style='font-size: small; color: #888888;'>
+            ※予測は、直近の月次データ（入国制限期間の2020年2月〜2022年12月を除く）の対数値に「トレンド + 月別の季節性」を当てはめたものです。将来のトレンドは徐々に減衰させています。<br>
+            ※塗りつぶしは {PREDICTION_LEVEL:.0%} 予測区間です。観測月数が不足する国・地域は予測を表示しません。
+            </p>
+            """,
+            unsafe_allow_html=True
+        )
+    st.markdown("---")
+
+    render_source_market_concentration()
     st.markdown("---")
 
     # メトリックの表示
@@ -172,5 +340,6 @@ def page_inbound_trend():
     )
 
 # ページ関数を実行
-if 'df_jnto_pivot' in st.session_state:
-    page_inbound_trend()
\ No newline at end of file
+if 'fact_store' in st.session_state:
+    with profile_rerun("0120_インバウンド推移"):
+        page_inbound_trend()
\ No newline at end of file
@@ -0,0 +1,341 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+from app.profiling import profile_rerun
+from app.projection import QUADRANT_NAME_MAP
+from app.scenario import (
+    build_scenario_base, build_multipliers, build_sensitivity_grid, evaluate_scenarios, SENSITIVITY_GRID
+)
+
+# セッションステートからデータを取得
+if 'df_market_potential_yearly' not in st.session_state:
+    st.error("必要なデータがロードされていません。Homeに戻ってデータロードを確認してください。")
+    st.stop()
+
+df_market_potential_yearly = st.session_state.df_market_potential_yearly
+df_market_potential_quarterly = st.session_state.df_market_potential_quarterly
+ALL_CONSUMPTION_ITEMS_ORDERED = st.session_state.all_consumption_items_ordered
+
+SOURCE_CAPTION = "出典：日本政府観光局（JNTO）/観光庁より作成"
+ALL_COUNTRIES_LABEL = "全ての国・地域"
+
+
+def render_scenario_bubble_chart(result, base, col_index, selected_item, visitors_label):
+    """
+    シナリオ適用後の位置（色付き）と現状の位置（灰色の白抜き）を対数軸のバブルチャートで表示する。
+    基準線はシナリオ適用後の全対象国の対数中央値です。
+    """
+    df_positions = pd.DataFrame({
+        'country': base['countries'],
+        'Visitors': result['visitors'][1],
+        'Spend': result['spend'][1, :, col_index],
+        'Potential': result['potential'][1, :, col_index],
+        'Baseline_Visitors': result['visitors'][0],
+        'Baseline_Spend': result['spend'][0, :, col_index],
+    })
+    df_positions = df_positions[(df_positions['Visitors'] > 0) & (df_positions['Spend'] > 0)]
+
+    if df_positions.empty:
+        st.info(f"選択された項目（{selected_item}）で、対数表示に必要な正の値データがありません。")
+        return
+
+    fig = px.scatter(
+        df_positions,
+        x='Visitors',
+        y='Spend',
+        size='Potential',
+        color='country',
+        hover_name='country',
+        log_x=True,
+        log_y=True,
+        title=f"シナリオ適用後のマーケットポテンシャル ({selected_item})",
+        labels={
+            'Visitors': visitors_label,
+            'Spend': '消費単価 (円) [対数]',
+            'Potential': '市場ポテンシャル (訪日客数 × 消費単価)'
+        },
+        height=650
+    )
+    max_potential = df_positions['Potential'].max()
+    sizeref_value = 2 * max_potential / (70**2) if max_potential > 0 else 1
+    fig.update_traces(marker=dict(sizemode='area', sizeref=sizeref_value, sizemin=4))
+
+    # 現状の位置
+    fig.add_trace(go.Scatter(
+        x=df_positions['Baseline_Visitors'],
+        y=df_positions['Baseline_Spend'],
+        mode='markers',
+        marker=dict(symbol='circle-open', size=10, color='gray'),
+        name='現状',
+        text=df_positions['country'],
+        hovertemplate="%{text}（現状）<br>訪日客数: %{x:,.0f}<br>消費単価: ¥%{y:,.0f}<extra></extra>"
+    ))
+
+    threshold_visitors = result['threshold_visitors'][1, 0, col_index]
+    threshold_spend = result['threshold_spend'][1, 0, col_index]
+    fig.add_vline(
+        x=threshold_visitors,
+        line_dash="dash",
+        line_color="red",
+        annotation_text=f"訪日客数（全対象国・対数中央値）({threshold_visitors:,.0f})",
+        annotation_position="top"
+    )
+    fig.add_hline(
+        y=threshold_spend,
+        line_dash="dash",
+        line_color="blue",
+        annotation_text=f"消費単価（全対象国・対数中央値）(¥{threshold_spend:,.0f})"
+    )
+
+    fig.update_xaxes(tickformat=',.0f', automargin=True)
+    fig.update_yaxes(tickformat=',.0f', tickprefix='¥', automargin=True)
+    fig = fig.update_layout(
+        margin=dict(b=100),
+        legend_title_text='国・地域',
+        annotations=[
+            dict(
+                text=SOURCE_CAPTION,
+                showarrow=False,
+                xref="paper",
+                yref="paper",
+                x=1,
+                y=-0.15,
+                xanchor='right',
+                yanchor='top',
+                font=dict(size=10, color="gray")
+            )
+        ]
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def render_scenario_table(result, base, col_index):
+    """
+    国ごとの現状とシナリオ適用後の象限・市場ポテンシャルを表示する。
+    """
+    df_table = pd.DataFrame({
+        'country': base['countries'],
+        'Quadrant_Baseline': result['quadrant'][0, :, col_index],
+        'Quadrant_Scenario': result['quadrant'][1, :, col_index],
+        'Potential_Baseline': result['potential'][0, :, col_index],
+        'Potential_Scenario': result['potential'][1, :, col_index],
+    }).dropna(subset=['Quadrant_Baseline', 'Quadrant_Scenario'], how='all')
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df_table['Potential_Change'] = df_table['Potential_Scenario'] / df_table['Potential_Baseline'] - 1
+    df_table['Migration'] = np.where(
+        df_table['Quadrant_Baseline'] == df_table['Quadrant_Scenario'],
+        "変化なし",
+        df_table['Quadrant_Baseline'].fillna('—') + " → " + df_table['Quadrant_Scenario'].fillna('—')
+    )
+    df_table['Quadrant_Name'] = df_table['Quadrant_Scenario'].map(QUADRANT_NAME_MAP)
+    df_table = df_table.sort_values('Potential_Scenario', ascending=False)
+
+    st.markdown("<h4 style='font-size: 1.25rem;'>国別の象限と市場ポテンシャル（現状 → シナリオ）</h4>", unsafe_allow_html=True)
+    st.dataframe(
+        df_table.style.format({
+            'Potential_Baseline': "¥{:,.0f}",
+            'Potential_Scenario': "¥{:,.0f}",
+            'Potential_Change': "{:+.1%}",
+        }, na_rep='—'),
+        use_container_width=True,
+        hide_index=True
+    )
+
+
+def render_sensitivity_heatmap(result, base, col_index, selected_item, focus_country, visitor_axis_label, spend_axis_label):
+    """
+    感度分析グリッド（訪日客数の変化率 × 費目の変化率）の市場ポテンシャルの変化率と象限をヒートマップで表示する。
+    """
+    n_grid = len(SENSITIVITY_GRID)
+    potential_grid = result['potential'][2:, :, col_index]
+    quadrant_grid = result['quadrant'][2:, :, col_index]
+    scenario_potential = result['potential'][1, :, col_index]
+
+    metric = st.radio(
+        "ヒートマップの指標",
+        ("選択した国・地域のポテンシャル", "全対象国の合計ポテンシャル"),
+        horizontal=True,
+        key='scenario_heatmap_metric_key'
+    )
+
+    if metric == "選択した国・地域のポテンシャル":
+        country_index = base['countries'].index(focus_country)
+        values = potential_grid[:, country_index]
+        reference = scenario_potential[country_index]
+        text = np.where(quadrant_grid[:, country_index] == None, '—', quadrant_grid[:, country_index]).astype(str)
+        title = f"{focus_country} の市場ポテンシャル ({selected_item}) の変化率と象限"
+    else:
+        values = np.nansum(potential_grid, axis=1)
+        reference = np.nansum(scenario_potential)
+        text = np.full(values.shape, '', dtype=object)
+        title = f"全対象国の合計市場ポテンシャル ({selected_item}) の変化率"
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (values / reference - 1) * 100
+
+    grid_labels = [f"{g:+d}%" for g in SENSITIVITY_GRID]
+    fig = go.Figure(go.Heatmap(
+        z=change.reshape(n_grid, n_grid),
+        x=grid_labels,
+        y=grid_labels,
+        text=text.reshape(n_grid, n_grid),
+        texttemplate="%{text}",
+        colorscale='RdBu',
+        zmid=0,
+        colorbar=dict(title='変化率 (%)'),
+        hovertemplate=f"{spend_axis_label}: %{{x}}<br>{visitor_axis_label}: %{{y}}<br>変化率: %{{z:+.1f}}%<br>象限: %{{text}}<extra></extra>"
+    ))
+    fig.update_layout(
+        title=title,
+        xaxis_title=f"{spend_axis_label} の追加変化率",
+        yaxis_title=f"{visitor_axis_label} の追加変化率",
+        height=600
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def page_scenario_analysis():
+    st.header("シナリオ分析（市場ポテンシャル）")
+    st.markdown("""
+        国・地域（または地域区分）ごとの**訪日客数**と、費目ごとの**消費単価**に変化率を設定し、
+        市場ポテンシャル・象限の基準線（対数中央値）・各国の象限がどのように変わるかを試算します。
+    """)
+
+    # 対象期間と評価項目
+    col_level, col_year, col_quarter = st.columns(3)
+
+    with col_level:
+        analysis_level = st.radio(
+            "分析期間の単位",
+            ("年次 (年間総計)", "四半期別"),
+            horizontal=True,
+            key='scenario_analysis_level_key'
+        )
+
+    if analysis_level == "年次 (年間総計)":
+        df_base_all = df_market_potential_yearly
+        visitors_col = 'Annual_Visitors'
+        visitors_label = '年間訪日客数 (人) [対数]'
+    else:
+        df_base_all = df_market_potential_quarterly
+        visitors_col = 'Quarterly_Visitors'
+        visitors_label = '四半期訪日客数 (人) [対数]'
+
+    if df_base_all.empty:
+        st.warning("シナリオ分析に必要なデータが不足しています。データファイルの内容を確認してください。")
+        return
+
+    available_years = sorted(df_base_all['year'].unique().tolist(), reverse=True)
+    with col_year:
+        selected_year = st.selectbox("基準年", available_years, key='scenario_year_key')
+    df_period = df_base_all[df_base_all['year'] == selected_year]
+
+    if analysis_level == "四半期別":
+        with col_quarter:
+            selected_quarter = st.selectbox("基準四半期", sorted(df_period['Quarter'].unique().tolist()), key='scenario_quarter_key')
+        df_period = df_period[df_period['Quarter'] == selected_quarter]
+
+    base = build_scenario_base(df_period, visitors_col)
+    if not base['countries']:
+        st.warning("選択した期間に有効なデータがありません。")
+        return
+
+    selected_item = st.selectbox(
+        "評価する消費単価項目",
+        ['全体'] + [item for item in ALL_CONSUMPTION_ITEMS_ORDERED if item in base['spend_columns']],
+        key='scenario_item_key'
+    )
+    spend_col = 'Avg_Total_Spend' if selected_item == '全体' else selected_item
+    col_index = base['spend_columns'].index(spend_col)
+
+    # シナリオの設定
+    st.subheader("シナリオの設定")
+    regions = sorted(set(base['regions']))
+    col_visitor, col_spend = st.columns(2)
+
+    with col_visitor:
+        visitor_targets = st.multiselect(
+            "訪日客数を変化させる地域区分・国・地域",
+            regions + base['countries'],
+            key='scenario_visitor_targets_key',
+            help="国・地域の指定は、所属する地域区分の指定より優先されます。"
+        )
+        visitor_changes = {
+            target: st.slider(
+                f"{target} の訪日客数", min_value=-50, max_value=100, value=0, step=5, format="%d%%",
+                key=f"scenario_visitor_change_{target}_key"
+            )
+            for target in visitor_targets
+        }
+
+    with col_spend:
+        spend_targets = st.multiselect(
+            "消費単価を変化させる費目",
+            base['major_items'],
+            key='scenario_spend_targets_key',
+            help="費目の変化率は、その費目の全ての細目と消費単価の総額に反映されます。"
+        )
+        spend_changes = {
+            target: st.slider(
+                f"{target} の消費単価", min_value=-50, max_value=100, value=0, step=5, format="%d%%",
+                key=f"scenario_spend_change_{target}_key"
+            )
+            for target in spend_targets
+        }
+
+    visitor_multipliers, spend_multipliers = build_multipliers(base, visitor_changes, spend_changes)
+
+    # 感度分析の設定
+    col_focus, col_visitor_axis, col_spend_axis = st.columns(3)
+    with col_focus:
+        focus_country = st.selectbox("感度分析の対象国・地域", base['countries'], key='scenario_focus_country_key')
+    with col_visitor_axis:
+        visitor_axis = st.selectbox(
+            "縦軸：訪日客数を動かす範囲",
+            [ALL_COUNTRIES_LABEL] + regions + base['countries'],
+            key='scenario_visitor_axis_key'
+        )
+    with col_spend_axis:
+        spend_axis = st.selectbox("横軸：消費単価を動かす費目", base['major_items'], key='scenario_spend_axis_key')
+
+    grid_visitor, grid_spend = build_sensitivity_grid(
+        base, visitor_multipliers, spend_multipliers,
+        None if visitor_axis == ALL_COUNTRIES_LABEL else visitor_axis, spend_axis
+    )
+
+    # 現状・シナリオ・感度分析グリッドを1回の配列演算でまとめて計算する
+    result = evaluate_scenarios(
+        base,
+        np.vstack([np.ones_like(visitor_multipliers), visitor_multipliers, grid_visitor]),
+        np.vstack([np.ones_like(spend_multipliers), spend_multipliers, grid_spend])
+    )
+
+    st.markdown("---")
+    render_scenario_bubble_chart(result, base, col_index, selected_item, visitors_label)
+    render_scenario_table(result, base, col_index)
+
+    st.markdown("---")
+    st.subheader("感度分析")
+    render_sensitivity_heatmap(
+        result, base, col_index, selected_item, focus_country,
+        f"訪日客数（{visitor_axis}）", f"{spend_axis}の消費単価"
+    )
+
+    st.markdown(
+        """
+        <p style='font-size: small; color: #888888;'>
+        ※市場ポテンシャルは「訪日客数 × 消費単価」、象限の基準線は各シナリオにおける全対象国の対数中央値です（市場ポテンシャル分析ページと同じ基準）。<br>
+        ※感度分析は、上で設定したシナリオを起点に、縦軸・横軸の対象の変化率をさらに追加した場合の試算です。変化率はシナリオ適用後の値に対する比率、セルの文字は対象国・地域の象限です。<br>
+        ※消費単価の総額は、費目（全体）の消費単価の増減分を加算して求めています。
+        </p>
+        """,
+        unsafe_allow_html=True
+    )
+
+# ページ関数を実行
+if 'df_market_potential_yearly' in st.session_state:
+    with profile_rerun("0130_シナリオ分析"):
+        page_scenario_analysis()
@@ -4,6 +4,8 @@ import plotly.express as px
 import numpy as np 
 # app.utils から必要な関数をインポート
 from app.utils import get_country_list_sorted, get_safe_default_countries 
+from app.profiling import profile_rerun
+from app.similarity import compute_distance_matrices, find_similar_markets, FEATURE_SETS, ANNUAL_PERIOD, DEFAULT_TOP_K, EXCLUDED_COUNTRIES
 
 # データのロード確認とセッションステートからの取得
 if 'df_avg_spend' not in st.session_state:
@@ -16,6 +18,80 @@ else:
 ITEM_ORDER = st.session_state.get('ITEM_ORDER', [])
 COLOR_MAP = st.session_state.get('COLOR_MAP', {})
 
+def render_similar_markets(selected_year, display_periods, selected_countries):
+    """
+    選択した国と消費構造（費目構成比・消費単価）が近い市場を、事前計算した国 × 国 の距離行列から表示する。
+    """
+    st.markdown("---")
+    st.subheader("消費構造が類似する市場")
+
+    query_countries = [c for c in selected_countries if c not in EXCLUDED_COUNTRIES]
+    if not query_countries:
+        st.info("類似市場を検索するには、「全国籍･地域」以外の国を1つ以上選択してください。")
+        return
+
+    col_country, col_period, col_feature, col_k = st.columns(4)
+    with col_country:
+        query_country = st.selectbox("基準とする国", query_countries, key='similar_country_key')
+    with col_period:
+        period_key = st.selectbox("期間", display_periods, key='similar_period_key')
+    with col_feature:
+        feature_set = st.radio("比較する指標", list(FEATURE_SETS.keys()), key='similar_feature_key')
+    with col_k:
+        top_k = st.slider("表示する市場数", min_value=1, max_value=10, value=DEFAULT_TOP_K, key='similar_top_k_key')
+
+    distance_result = compute_distance_matrices(df_spend, feature_set)
+    df_similar = find_similar_markets(distance_result, query_country, [(selected_year, period_key)], top_k)
+
+    if df_similar.empty:
+        st.info(f"{selected_year}年 {period_key} の {query_country} のデータがないため、類似市場を検索できません。")
+        return
+
+    col_table, col_chart = st.columns([2, 3])
+
+    with col_table:
+        st.dataframe(
+            df_similar[['rank', 'country', 'distance']].rename(columns={'rank': '順位', 'country': '国・地域', 'distance': '距離'}),
+            use_container_width=True,
+            hide_index=True
+        )
+
+    with col_chart:
+        # 基準国と類似市場の費目構成比を並べて比較
+        compare_countries = [query_country] + df_similar['country'].tolist()
+        df_year = df_spend.loc[selected_year]
+        ratio_columns = [c + '_ratio' for c in ITEM_ORDER if c + '_ratio' in df_spend.columns]
+        if period_key == ANNUAL_PERIOD:
+            df_ratio = df_year[ratio_columns].groupby(level='country').mean()
+        else:
+            df_ratio = df_year.xs(period_key, level='Quarter')[ratio_columns]
+        df_ratio = df_ratio.reindex(compare_countries)
+        df_ratio.columns = [col.replace('_ratio', '') for col in df_ratio.columns]
+
+        fig_compare = px.bar(
+            df_ratio.rename_axis('国・地域').reset_index().melt(id_vars='国・地域', var_name='費目', value_name='構成比 (%)'),
+            x='構成比 (%)',
+            y='国・地域',
+            color='費目',
+            orientation='h',
+            category_orders={'国・地域': compare_countries, '費目': ITEM_ORDER},
+            color_discrete_map=COLOR_MAP,
+            title=f"{query_country} と類似市場の費目構成比（{selected_year}年 {period_key}）",
+            height=max(300, 40 * len(compare_countries) + 150)
+        )
+        st.plotly_chart(fig_compare, use_container_width=True)
+
+    st.markdown(
+        """
+        <p style='font-size: small; color: #888888;'>
+        ※距離は費目ごとの値を並べたベクトルのユークリッド距離です（構成比は %pt、消費単価は円。両方を使う場合は期間ごとに国間で標準化しています）。<br>
+        ※「年全体集計」では、選択年における全四半期の平均値で比較しています。
+        </p>
+        """,
+        unsafe_allow_html=True
+    )
+
+
 def page_expense_ratio_analysis():
     st.header("観光消費構造（年別・複数国・四半期別比較）")
     
@@ -229,6 +305,8 @@ def page_expense_ratio_analysis():
                     ) 
                     
                     st.plotly_chart(fig_pie, use_container_width=True, key=unique_key)
+
+    render_similar_markets(selected_year, display_periods, selected_countries)
     
     # 注釈
     st.markdown(
@@ -247,4 +325,5 @@ def page_expense_ratio_analysis():
 
 # ページ関数を実行
 if 'df_avg_spend' in st.session_state:
-    page_expense_ratio_analysis()
\ No newline at end of file
+    with profile_rerun("0210_消費構造の費目割合"):
+        page_expense_ratio_analysis()
\ No newline at end of file
@@ -3,6 +3,8 @@ import pandas as pd
 import plotly.express as px
 import numpy as np
 from app.utils import get_country_list_sorted, get_safe_default_countries 
+from app.profiling import profile_rerun
+from app.similarity import compute_distance_matrices, find_similar_markets, FEATURE_SETS, DEFAULT_TOP_K, EXCLUDED_COUNTRIES
 
 # データのロード確認とセッションステートからの取得
 if 'df_avg_spend' not in st.session_state:
@@ -16,6 +18,69 @@ else:
 ITEM_ORDER = st.session_state.get('ITEM_ORDER', [])
 COLOR_MAP = st.session_state.get('COLOR_MAP', {})
 
+def render_similar_markets_over_time(df_filtered_ts, selected_countries):
+    """
+    選択した国と消費構造が近い市場の、四半期ごとの上位k か国とその出現回数を表示する。
+    """
+    st.subheader("類似市場の推移")
+
+    query_countries = [c for c in selected_countries if c not in EXCLUDED_COUNTRIES]
+    if not query_countries:
+        st.info("類似市場を表示するには、「全国籍･地域」以外の国を1つ以上選択してください。")
+        return
+
+    col_country, col_feature, col_k = st.columns(3)
+    with col_country:
+        query_country = st.selectbox("基準とする国", query_countries, key='ts_similar_country_key')
+    with col_feature:
+        feature_set = st.radio("比較する指標", list(FEATURE_SETS.keys()), key='ts_similar_feature_key')
+    with col_k:
+        top_k = st.slider("表示する市場数", min_value=1, max_value=10, value=DEFAULT_TOP_K, key='ts_similar_top_k_key')
+
+    periods = (
+        df_filtered_ts[['year', 'Quarter', 'period']]
+        .drop_duplicates()
+        .sort_values('period')
+    )
+    distance_result = compute_distance_matrices(df_spend, feature_set)
+    df_similar = find_similar_markets(distance_result, query_country, list(zip(periods['year'], periods['Quarter'])), top_k)
+
+    if df_similar.empty:
+        st.info(f"選択期間に {query_country} のデータがないため、類似市場を表示できません。")
+        return
+
+    df_similar['period'] = df_similar['year'].astype(str) + '-' + df_similar['Quarter']
+
+    col_table, col_count = st.columns([3, 2])
+    with col_table:
+        df_rank_table = df_similar.pivot(index='period', columns='rank', values='country')
+        df_rank_table.columns = [f"{rank}位" for rank in df_rank_table.columns]
+        st.dataframe(df_rank_table, use_container_width=True)
+
+    with col_count:
+        df_count = df_similar['country'].value_counts().rename_axis('国・地域').reset_index(name='出現回数')
+        fig_count = px.bar(
+            df_count,
+            x='出現回数',
+            y='国・地域',
+            orientation='h',
+            title=f"{query_country} の類似市場（上位{top_k}）への出現回数",
+            height=max(300, 35 * len(df_count) + 150)
+        )
+        fig_count.update_yaxes(autorange='reversed')
+        st.plotly_chart(fig_count, use_container_width=True)
+
+    st.markdown(
+        """
+        <p style='font-size: small; color: #888888;'>
+        ※各四半期の費目別の値を並べたベクトルのユークリッド距離が小さい順に表示しています（構成比は %pt、消費単価は円。両方を使う場合は期間ごとに国間で標準化しています）。
+        </p>
+        """,
+        unsafe_allow_html=True
+    )
+    st.markdown("---")
+
+
 def page_expense_time_series():
     st.header("観光消費構造時系列推移（国別比較）")
     
@@ -171,6 +236,8 @@ def page_expense_time_series():
             st.plotly_chart(fig_ratio, use_container_width=True)
             
         st.markdown("---") # 国ごとの区切り線
+
+    render_similar_markets_over_time(df_filtered_ts, selected_countries)
         
     # キャプション
     st.markdown(
@@ -185,4 +252,5 @@ def page_expense_time_series():
 
 # ページ関数を実行
 if 'df_avg_spend' in st.session_state:
-    page_expense_time_series()
\ No newline at end of file
+    with profile_rerun("0220_消費構造の推移"):
+        page_expense_time_series()
\ No newline at end of file
@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from app.utils import get_country_list_sorted, get_safe_default_countries
+from app.utils import get_country_list_sorted, get_safe_default_countries, is_data_version_current
+from app.profiling import profile_rerun
+from app.facts import pivot_facts, query_facts, ALL_DETAILS
+from app.countries import AGGREGATE_COUNTRY, OTHER_COUNTRY
+from app.sql_backend import is_sql_backend_available, query_spend
 
 # データのロード確認とセッションステートからの取得
 if 'df_avg_spend' not in st.session_state:
@@ -10,16 +14,52 @@ if 'df_avg_spend' not in st.session_state:
 else:
     df_spend = st.session_state.df_avg_spend
 
+def get_yearly_item_units(fact_store, year, item_names, use_sql_backend):
+    """
+    選択された年・費目の消費単価を 国 × 費目 の表として返す。
+    年の値は他のページ（市場ポテンシャル分析・消費構造）と同じく、全体の消費単価がある四半期の平均とし、
+    その四半期に費目・細目のデータがない場合は 0 として平均します（df_market_potential_yearly と同じ値）。
+    対象は、その年の訪日客数がある国・地域のみです。
+    """
+    df_items = fact_store['dimensions']['item']
+    total_item_names = df_items.loc[df_items['is_total'] & (df_items['details'] == ALL_DETAILS), 'item_name'].tolist()
+    query_item_names = list(dict.fromkeys(total_item_names + item_names))
+
+    # 国 × 四半期 × 費目 の消費単価（四半期内の平均）
+    if use_sql_backend:
+        # 年・費目の絞り込みと集計を SQL エンジン側で行う（該当する年のファイルのみ読み込む）
+        df_quarterly = query_spend(
+            years=[year],
+            item_names=query_item_names,
+            measure='consumption_unit',
+            by=('country', 'Quarter', 'item_name')
+        ).pivot(index=['country', 'Quarter'], columns='item_name', values='consumption_unit')
+    else:
+        df_quarterly = pivot_facts(
+            fact_store, 'spend', 'consumption_unit',
+            index=['country', 'Quarter'],
+            columns='item_name',
+            filters={'year': year, 'item_name': query_item_names},
+            agg='mean'
+        )
+
+    has_total = df_quarterly.reindex(columns=total_item_names).notna().any(axis=1)
+    df_yearly = df_quarterly[has_total].reindex(columns=item_names).fillna(0).groupby(level='country').mean()
+
+    visitor_countries = query_facts(fact_store, 'visitors', 'visitors', filters={'year': year}, by=['country'])['country']
+    return df_yearly[df_yearly.index.isin(visitor_countries)]
+
+
 def page_expense_unit_comparison():
     
     # データチェックと取得
-    if 'df_market_potential_yearly' not in st.session_state:
+    if 'fact_store' not in st.session_state:
         st.error("必要なデータがロードされていません。Homeに戻ってデータロードを確認してください。")
         # 関数を終了
         return 
 
-    # 必要なデータをセッションステートから取得
-    df_market_potential_yearly = st.session_state.df_market_potential_yearly
+    # 必要なデータをセッションステートから取得（表示する年・費目のみをファクトストアから取り出す）
+    fact_store = st.session_state.fact_store
 
     ALL_CONSUMPTION_ITEMS_ORDERED = st.session_state.all_consumption_items_ordered
     SOURCE_CAPTION = st.session_state.SOURCE_CAPTION
@@ -62,7 +102,7 @@ def page_expense_unit_comparison():
 
     with col2:
         # 年度の選択 (データに存在する最新年度をデフォルトにする)
-        available_years = sorted(df_market_potential_yearly['year'].unique().tolist(), reverse=True)
+        available_years = sorted(fact_store['facts']['spend']['year'].unique().tolist(), reverse=True)
         selected_year = st.selectbox(
             "対象年度を選択してください",
             options=available_years,
@@ -82,16 +122,12 @@ def page_expense_unit_comparison():
 
     # データのフィルタリングと集計
     
-    # 選択された年度でフィルタリング
-    df_filtered = df_market_potential_yearly[
-        (df_market_potential_yearly['year'] == selected_year)
-        & (df_market_potential_yearly['country'] != '全国籍･地域')
-        & (df_market_potential_yearly['country'] != 'その他')
-    ].copy()
-
-    # 比較に必要な列を抽出: 'country', 選択された主要費目（合計値）、選択された細目
+    # 選択された年度・費目の消費単価（四半期の年平均）を 国 × 費目 の表として取得
     columns_to_keep = ['country', selected_major_item] + target_columns
-    df_chart_data = df_filtered[columns_to_keep].copy()
+    # SQL バックエンドはファイルを直接読むため、セッションのデータが data/ の現在のファイルと同じ版の場合のみ使用する
+    use_sql_backend = is_sql_backend_available() and is_data_version_current(st.session_state.get('data_version'))
+    df_chart_data = get_yearly_item_units(fact_store, selected_year, columns_to_keep[1:], use_sql_backend).reset_index()
+    df_chart_data = df_chart_data[~df_chart_data['country'].isin([AGGREGATE_COUNTRY, OTHER_COUNTRY])]
 
     # 主要費目の合計（積み上げ棒グラフの高さ）を計算し、降順ソートのキーにする
     df_chart_data['Total_Spend_for_Sort'] = df_chart_data[selected_major_item]
@@ -216,4 +252,5 @@ def page_expense_unit_comparison():
 
 # ページ関数を実行
 if 'df_avg_spend' in st.session_state:
-    page_expense_unit_comparison()
\ No newline at end of file
+    with profile_rerun("0230_費目別消費単価比較"):
+        page_expense_unit_comparison()
\ No newline at end of file
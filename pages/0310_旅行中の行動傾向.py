@@ -1,6 +1,13 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from app.profiling import profile_rerun
+from app.pca import (
+    get_action_data_version, get_model_version, load_action_data_cached, load_pca_model_cached,
+    subset_signature, fit_subset_pca, resolve_action_countries, COUNTRY_AREA_COL, YEAR_COL, ACTION_COL
+)
+from app.countries import resolve_country_ids
+from app.pca_bootstrap import get_bootstrap_intervals, to_error_bars, CONFIDENCE_LEVEL, N_BOOTSTRAP
 
 if 'df_pca_scores' not in st.session_state:
     st.error("必要なデータがロードされていません。Homeに戻ってデータロードを確認してください。")
@@ -10,6 +17,90 @@ if 'df_pca_scores' not in st.session_state:
 df_pca_scores = st.session_state.df_pca_scores
 # PCラベル関数もセッションステートから取得
 get_pc_label = st.session_state.get_pc_label
+# 行動データの表記の国・地域は、国ディメンションで解決して country_id で結合する
+df_countries = st.session_state.df_countries
+
+
+def render_subset_pca_section(selected_year, x_axis, y_axis):
+    """
+    選択した国・年・行動項目の部分集合でPCAを再計算し、負荷量とスコアを表示する。
+    """
+    st.subheader("部分集合でのPCA再計算")
+
+    action_data_version = get_action_data_version()
+    if action_data_version is None:
+        st.info("行動データ（`inbound_action.csv` またはその列指向ファイル）が見つからないため、PCAの再計算は利用できません。")
+        return
+
+    df_action = load_action_data_cached(action_data_version)
+    model_version = get_model_version()
+    reference_model = load_pca_model_cached(model_version)
+
+    all_countries = sorted(df_action[COUNTRY_AREA_COL].unique().tolist())
+    all_years = sorted(df_action[YEAR_COL].unique().tolist())
+    all_actions = sorted(df_action[ACTION_COL].unique().tolist())
+
+    with st.expander("再計算の対象（国・年・行動項目）を選択", expanded=False):
+        subset_countries = st.multiselect("対象国・地域", all_countries, default=all_countries, key='pca_subset_countries_key')
+        subset_years = st.multiselect("対象年", all_years, default=all_years, key='pca_subset_years_key')
+        subset_actions = st.multiselect("対象の行動項目", all_actions, default=all_actions, key='pca_subset_actions_key')
+
+    signature = subset_signature(subset_countries, subset_years, subset_actions)
+    result = fit_subset_pca(action_data_version, signature, model_version, _df_action=df_action, _reference_model=reference_model)
+
+    if result is None:
+        st.warning("選択された部分集合ではPCAを計算できません。国・年または行動項目を増やしてください。")
+        return
+
+    # 0320 (行動傾向の推移) で同じ部分集合の軸を利用できるようにする
+    st.session_state.pca_subset_signature = signature
+
+    explained = result['explained_variance_ratio']
+    st.markdown("寄与率: " + " / ".join(f"{pc}: {ratio:.1%}" for pc, ratio in explained.items()))
+
+    col_loadings, col_scores = st.columns(2)
+
+    with col_loadings:
+        fig_loadings = px.imshow(
+            result['loadings'],
+            color_continuous_scale='RdBu',
+            color_continuous_midpoint=0,
+            aspect='auto',
+            title="主成分負荷量（部分集合で再計算）",
+            labels={'x': 'PC軸', 'y': '行動項目', 'color': '負荷量'},
+            height=600
+        )
+        st.plotly_chart(fig_loadings, use_container_width=True)
+
+    with col_scores:
+        df_scores = resolve_action_countries(result['scores'], df_countries)
+        score_year = selected_year if selected_year in df_scores[YEAR_COL].values else df_scores[YEAR_COL].max()
+        df_scores_year = df_scores[df_scores[YEAR_COL] == score_year]
+
+        if x_axis in df_scores_year.columns and y_axis in df_scores_year.columns:
+            fig_scores = px.scatter(
+                df_scores_year,
+                x=x_axis,
+                y=y_axis,
+                text='country',
+                hover_name='country',
+                title=f"{score_year}年: 再計算した軸でのスコア ({x_axis} vs {y_axis})",
+                height=600
+            )
+            fig_scores.update_traces(textposition='top center', marker=dict(size=10, opacity=0.8))
+            fig_scores.add_hline(y=0, line_width=1, line_dash="dash", line_color="gray")
+            fig_scores.add_vline(x=0, line_width=1, line_dash="dash", line_color="gray")
+            st.plotly_chart(fig_scores, use_container_width=True)
+        else:
+            st.info("選択された部分集合では、指定したPC軸のスコアを計算できません。")
+
+    st.markdown("""
+        <p style='font-size: small; color: #888888;'>
+        ※選択した部分集合のみで標準化・主成分分析を行った結果です。軸の向きは全期間の固定軸に揃えていますが、軸の意味（PCラベル）は部分集合によって変わる場合があります。
+        </p>
+        """,
+        unsafe_allow_html=True
+    )
 
 
 def page_travel_action_trend():
@@ -141,6 +232,40 @@ def page_travel_action_trend():
     x_label = get_pc_label(x_axis) + "スコア"
     y_label = get_pc_label(y_axis) + "スコア"
     
+    # ブートストラップ信頼区間（誤差棒）
+    show_bootstrap = st.checkbox(
+        f"ブートストラップ信頼区間（{CONFIDENCE_LEVEL:.0%}）を誤差棒で表示",
+        key='pca_show_bootstrap_key'
+    )
+    error_kwargs = {}
+    bootstrap_result = None
+
+    if show_bootstrap:
+        with st.spinner("ブートストラップ信頼区間を計算しています..."):
+            bootstrap_result = get_bootstrap_intervals()
+
+        if bootstrap_result is None:
+            st.info("行動データ（`inbound_action.csv` またはその列指向ファイル）が見つからないため、信頼区間は表示できません。")
+        else:
+            df_score_intervals = resolve_action_countries(bootstrap_result['scores'], df_countries)
+            plot_country_ids = resolve_country_ids(df_plot_pca['country'], df_countries, allow_unknown=True)
+            for axis, prefix in ((x_axis, 'x'), (y_axis, 'y')):
+                df_axis_intervals = df_score_intervals[
+                    (df_score_intervals['pc'] == axis) & (df_score_intervals[YEAR_COL] == selected_year)
+                ][['country_id', 'lower', 'upper']]
+
+                df_axis_errors = to_error_bars(
+                    df_plot_pca[[axis]].assign(country_id=plot_country_ids.values).merge(df_axis_intervals, on='country_id', how='left'),
+                    value_col=axis
+                )
+                df_plot_pca[f'{prefix}_error_plus'] = df_axis_errors['error_plus'].values
+                df_plot_pca[f'{prefix}_error_minus'] = df_axis_errors['error_minus'].values
+
+            error_kwargs = dict(
+                error_x='x_error_plus', error_x_minus='x_error_minus',
+                error_y='y_error_plus', error_y_minus='y_error_minus'
+            )
+
     # 色軸の設定
     if color_axis != 'なし':
         df_plot_pca['color_value'] = df_plot_pca[color_axis]
@@ -160,7 +285,8 @@ def page_travel_action_trend():
             color_continuous_scale=color_scale,
             color_continuous_midpoint=color_midpoint,
             text='country',
-            height=600
+            height=600,
+            **error_kwargs
         )
         # カラーバーのタイトルを修正
         fig_pca.update_layout(coloraxis_colorbar=dict(title=color_name))
@@ -174,7 +300,8 @@ def page_travel_action_trend():
             labels={x_axis: x_label, y_axis: y_label},
             text='country',
             height=600,
-            color='country' # 色軸なしの場合は国別で色分け
+            color='country', # 色軸なしの場合は国別で色分け
+            **error_kwargs
         )
 
     # テキストラベルの設定とマーカーサイズ調整
@@ -209,6 +336,42 @@ def page_travel_action_trend():
     )
     
     st.plotly_chart(fig_pca, use_container_width=True) 
+
+    if bootstrap_result is not None:
+        with st.expander(f"主成分負荷量の信頼区間（ブートストラップ {N_BOOTSTRAP} 回）"):
+            df_loading_intervals = bootstrap_result['loadings']
+            for axis in (x_axis, y_axis):
+                df_axis_loadings = df_loading_intervals[df_loading_intervals['pc'] == axis].copy()
+                df_axis_loadings = (
+                    df_axis_loadings
+                    .assign(abs_estimate=df_axis_loadings['estimate'].abs())
+                    .nlargest(15, 'abs_estimate')
+                    .sort_values('estimate')
+                )
+                df_axis_loadings = to_error_bars(df_axis_loadings)
+
+                fig_loadings = px.bar(
+                    df_axis_loadings,
+                    x='estimate',
+                    y='Action',
+                    orientation='h',
+                    error_x='error_plus',
+                    error_x_minus='error_minus',
+                    title=f"{get_pc_label(axis)}: 主成分負荷量（絶対値上位15項目）",
+                    labels={'estimate': '主成分負荷量', 'Action': '行動項目'},
+                    height=500
+                )
+                st.plotly_chart(fig_loadings, use_container_width=True)
+
+            st.markdown(
+                """
+                <p style='font-size: small; color: #888888;'>
+                ※国・地域と年をそれぞれ復元抽出してPCAを再計算し、軸の向きを揃えたうえで負荷量・スコアの分布から信頼区間を求めています。<br>
+                ※区間が0をまたぐ項目は、その主成分の解釈に対する寄与が不安定であることを示します。
+                </p>
+                """,
+                unsafe_allow_html=True
+            )
     
     st.markdown("""
         <p style='font-size: small; color: #888888;'>
@@ -222,6 +385,10 @@ def page_travel_action_trend():
     
     st.markdown("---")
 
+    render_subset_pca_section(selected_year, x_axis, y_axis)
+
+    st.markdown("---")
+
     # レーダーチャート (全PC軸の比較)
     st.subheader(f"{selected_year}年: レーダーチャートによる行動傾向の比較")
 
@@ -309,4 +476,5 @@ def page_travel_action_trend():
         unsafe_allow_html=True
     )
     
-page_travel_action_trend()
\ No newline at end of file
+with profile_rerun("0310_旅行中の行動傾向"):
+    page_travel_action_trend()
\ No newline at end of file
@@ -3,6 +3,12 @@ import plotly.express as px
 import pandas as pd
 import plotly.graph_objects as go
 from app.utils import get_country_list_sorted, get_safe_default_countries, get_pc_label
+from app.profiling import profile_rerun
+from app.pca_bootstrap import get_bootstrap_intervals, to_error_bars, CONFIDENCE_LEVEL
+from app.pca_rolling import compute_rolling_pca_cached, summarize_window_scores, DEFAULT_WINDOW_SIZE
+from app.trend import compute_score_trends, classify_trends, MIN_YEARS
+from app.pca import get_action_data_version, get_model_version, load_action_data_cached, load_pca_model_cached, fit_subset_pca, resolve_action_countries
+from app.countries import resolve_country_ids
 
 if 'df_pca_scores' not in st.session_state:
     st.error("必要なデータがロードされていません。Homeに戻ってデータロードを確認してください。")
@@ -10,6 +16,169 @@ if 'df_pca_scores' not in st.session_state:
 
 df_pca_scores = st.session_state.df_pca_scores
 get_pc_label = st.session_state.get_pc_label
+# 行動データの表記の国・地域は、国ディメンションで解決して country_id で結合する
+df_countries = st.session_state.df_countries
+
+
+def render_trend_view(df_scores_view):
+    """
+    全ての国・PC軸について年あたりのPCスコア変化量（傾き）を一括計算し、ランキングと変化タイプを表示する。
+    """
+    df_trends = compute_score_trends(df_scores_view)
+    df_classified = classify_trends(df_trends)
+
+    if df_classified.empty:
+        st.warning(f"観測年数が{MIN_YEARS}年以上の国・地域がないため、トレンドを計算できません。")
+        return
+
+    pc_options = df_classified['pc'].unique().tolist()
+    selected_pc = st.selectbox("PC軸を選択", pc_options, format_func=get_pc_label, key='pca_trend_pc_key')
+
+    df_pc = df_classified[df_classified['pc'] == selected_pc].sort_values('slope', ascending=False)
+
+    fig_slope = px.bar(
+        df_pc,
+        x='country',
+        y='slope',
+        color='trend_type',
+        hover_data={'r2': ':.2f', 'n_years': True, 'intercept': False},
+        color_discrete_map={'Up': '#d62728', 'Flat': '#7f7f7f', 'Down': '#1f77b4'},
+        category_orders={'trend_type': ['Up', 'Flat', 'Down']},
+        title=f"{get_pc_label(selected_pc)}: 年あたりのスコア変化量（傾き）",
+        labels={'country': '国・地域', 'slope': '傾き（スコア/年）', 'trend_type': '変化タイプ', 'r2': 'R²', 'n_years': '観測年数'},
+        height=550
+    )
+    threshold = df_pc['threshold'].iloc[0]
+    fig_slope.add_hline(y=threshold, line_width=1, line_dash="dash", line_color="gray", annotation_text="+1σ")
+    fig_slope.add_hline(y=-threshold, line_width=1, line_dash="dash", line_color="gray", annotation_text="-1σ")
+    st.plotly_chart(fig_slope, use_container_width=True)
+
+    st.markdown("##### PC軸別 変化タイプの件数")
+    df_counts = df_classified.groupby(['pc', 'trend_type']).size().unstack(fill_value=0)
+    df_counts = df_counts.reindex(columns=['Up', 'Flat', 'Down'], fill_value=0)
+    df_counts.index = df_counts.index.map(get_pc_label)
+    st.dataframe(df_counts, use_container_width=True)
+
+    st.markdown("##### 国・地域別 トレンド一覧")
+    st.dataframe(
+        df_pc[['country', 'slope', 'r2', 'n_years', 'trend_type']].style.format({'slope': '{:+.3f}', 'r2': '{:.2f}'}),
+        use_container_width=True,
+        hide_index=True
+    )
+
+    st.markdown(
+        f"""
+        <p style='font-size: small; color: #888888;'>
+        ※傾きは、各国・地域のPCスコアを年に対して単回帰した係数（1年あたりの変化量）です。データのない年は除いて計算しています。<br>
+        ※変化タイプは、PC軸ごとの傾きの標準偏差（1σ）を閾値として Up / Flat / Down に分類しています。観測年数が{MIN_YEARS}年未満の国・地域は除外しています。
+        </p>
+        """,
+        unsafe_allow_html=True
+    )
+
+
+def render_rolling_view():
+    """
+    年のローリングウィンドウごとにPCAを再学習し、軸そのものの変化（ドリフト）と揃えた軸でのスコアを表示する。
+    """
+    action_data_version = get_action_data_version()
+    if action_data_version is None:
+        st.info("行動データ（`inbound_action.csv` またはその列指向ファイル）が見つからないため、ローリングPCAは利用できません。")
+        return
+
+    window_size = st.slider(
+        "ウィンドウ幅（年）", min_value=2, max_value=5, value=DEFAULT_WINDOW_SIZE, key='pca_rolling_window_key'
+    )
+
+    model_version = get_model_version()
+    with st.spinner("ウィンドウごとのPCAを計算しています..."):
+        result = compute_rolling_pca_cached(
+            action_data_version,
+            model_version,
+            window_size,
+            _df_action=load_action_data_cached(action_data_version),
+            _model=load_pca_model_cached(model_version)
+        )
+
+    df_drift = result['drift']
+    skipped_windows = result['skipped_windows']
+    if skipped_windows:
+        skipped_text = "、".join(
+            f"{label}（{'・'.join(str(year) for year in missing_years)}年なし）" for label, missing_years in skipped_windows.items()
+        )
+        st.caption(f"データがない年を含むウィンドウは、期間が他のウィンドウと揃わないため表示していません: {skipped_text}")
+    if df_drift.empty:
+        st.warning("データのある年が連続するウィンドウを作成できません。ウィンドウ幅を小さくしてください。")
+        return
+
+    df_drift = df_drift.assign(PC軸_ラベル=df_drift['pc'].apply(get_pc_label))
+
+    col_congruence, col_angle = st.columns(2)
+
+    with col_congruence:
+        fig_congruence = px.line(
+            df_drift,
+            x='window',
+            y='congruence',
+            color='PC軸_ラベル',
+            markers=True,
+            title="各PC軸と全期間の固定軸との一致度（合同係数）",
+            labels={'window': 'ウィンドウ', 'congruence': '合同係数 (1: 完全一致)', 'PC軸_ラベル': 'PC軸'},
+            height=450
+        )
+        fig_congruence.add_hline(y=0.95, line_width=1, line_dash="dash", line_color="gray", annotation_text="0.95")
+        st.plotly_chart(fig_congruence, use_container_width=True)
+
+    with col_angle:
+        df_angle = df_drift.drop_duplicates('window')
+        fig_angle = px.line(
+            df_angle,
+            x='window',
+            y='subspace_angle',
+            markers=True,
+            title="主成分空間のずれ（固定軸との最大主角度）",
+            labels={'window': 'ウィンドウ', 'subspace_angle': '最大主角度（度）'},
+            height=450
+        )
+        st.plotly_chart(fig_angle, use_container_width=True)
+
+    # 揃えた軸でのスコア推移
+    df_rolling_scores = resolve_action_countries(result['scores'], df_countries)
+    countries_sorted = get_country_list_sorted(df_rolling_scores, country_col_name='country')
+    selected_countries = st.multiselect(
+        "スコア推移を表示する国を選択",
+        countries_sorted,
+        default=get_safe_default_countries(countries_sorted, max_list_count=6),
+        key='pca_rolling_countries_key'
+    )
+
+    if selected_countries:
+        df_window_scores = summarize_window_scores(df_rolling_scores, selected_countries, country_col='country')
+        pc_columns = [col for col in df_window_scores.columns if col.startswith('PC')]
+        selected_pc = st.selectbox("PC軸を選択", pc_columns, format_func=get_pc_label, key='pca_rolling_pc_key')
+
+        fig_scores = px.line(
+            df_window_scores,
+            x='window',
+            y=selected_pc,
+            color='country',
+            markers=True,
+            title=f"{get_pc_label(selected_pc)}: ウィンドウごとの軸で計算したスコア（ウィンドウ内平均）",
+            labels={'window': 'ウィンドウ', selected_pc: 'PCスコア', 'country': '国・地域'},
+            height=500
+        )
+        fig_scores.add_hline(y=0, line_width=1, line_dash="dash", line_color="gray")
+        st.plotly_chart(fig_scores, use_container_width=True)
+
+    st.markdown(
+        """
+        <p style='font-size: small; color: #888888;'>
+        ※各ウィンドウ（連続する複数年）のデータのみでPCAを再学習し、直交プロクラステス回転により全期間の固定軸へ向きを揃えています。<br>
+        ※合同係数が1に近いほど、そのウィンドウでも固定軸と同じ意味の軸が得られていることを示します。値が低下している場合は、行動傾向の軸そのものが変化している可能性があります。
+        </p>
+        """,
+        unsafe_allow_html=True
+    )
 
 
 def page_action_trend_timeseries():
@@ -22,9 +191,52 @@ def page_action_trend_timeseries():
     if df_pca_scores.empty or 'Year' not in df_pca_scores.columns or 'country' not in df_pca_scores.columns:
         st.warning("PCスコアデータが見つかりません。`pca_scores_timeseries.csv`を確認してください。")
         st.stop()
-        
+
+# スコアの基準（全期間の固定軸 / 0310 で再計算した部分集合の軸）
+    df_scores_view = df_pca_scores
+
+    if 'pca_subset_signature' in st.session_state:
+        score_basis = st.radio(
+            "PCスコアの基準",
+            ("全期間の固定軸", "部分集合で再計算した軸（0310で選択）"),
+            horizontal=True,
+            key='pca_ts_score_basis_key'
+        )
+
+        if score_basis != "全期間の固定軸":
+            action_data_version = get_action_data_version()
+            result = None
+            if action_data_version is not None:
+                model_version = get_model_version()
+                result = fit_subset_pca(
+                    action_data_version,
+                    st.session_state.pca_subset_signature,
+                    model_version,
+                    _df_action=load_action_data_cached(action_data_version),
+                    _reference_model=load_pca_model_cached(model_version)
+                )
+            if result is None:
+                st.warning("部分集合のPCAを計算できないため、全期間の固定軸のスコアを表示します。")
+            else:
+                df_scores_view = resolve_action_countries(result['scores'], df_countries).drop(columns=['country_id'])
+
+# 表示内容の選択
+    view_mode = st.radio(
+        "表示内容",
+        ("国別の推移", "トレンド（傾き）", "軸の変化（ローリングPCA）"),
+        horizontal=True,
+        key='pca_ts_view_mode_key'
+    )
+
+    if view_mode == "トレンド（傾き）":
+        render_trend_view(df_scores_view)
+        return
+    if view_mode == "軸の変化（ローリングPCA）":
+        render_rolling_view()
+        return
+
 # 国の選択
-    countries_sorted = get_country_list_sorted(df_pca_scores, country_col_name='country')
+    countries_sorted = get_country_list_sorted(df_scores_view, country_col_name='country')
     
     initial_default_countries = get_safe_default_countries(countries_sorted, max_list_count=8)
 
@@ -51,7 +263,7 @@ def page_action_trend_timeseries():
         
 # データの整形
     
-    df_filtered_pca_ts = df_pca_scores[df_pca_scores['country'].isin(selected_countries)].copy()
+    df_filtered_pca_ts = df_scores_view[df_scores_view['country'].isin(selected_countries)].copy()
     
     if df_filtered_pca_ts.empty:
         st.warning("選択された国のデータが見つかりません。")
@@ -67,7 +279,35 @@ def page_action_trend_timeseries():
     )
     
     df_melted_pca['PC軸_ラベル'] = df_melted_pca['PC軸'].apply(get_pc_label)
-    
+
+# ブートストラップ信頼区間（全期間の固定軸のスコアのみ対象）
+    error_kwargs = {}
+
+    if df_scores_view is df_pca_scores:
+        show_bootstrap = st.checkbox(
+            f"ブートストラップ信頼区間（{CONFIDENCE_LEVEL:.0%}）を誤差棒で表示",
+            key='pca_ts_show_bootstrap_key'
+        )
+
+        if show_bootstrap:
+            with st.spinner("ブートストラップ信頼区間を計算しています..."):
+                bootstrap_result = get_bootstrap_intervals()
+
+            if bootstrap_result is None:
+                st.info("行動データ（`inbound_action.csv` またはその列指向ファイル）が見つからないため、信頼区間は表示できません。")
+            else:
+                df_score_intervals = resolve_action_countries(bootstrap_result['scores'], df_countries).rename(columns={'pc': 'PC軸'})
+                df_melted_pca['country_id'] = resolve_country_ids(df_melted_pca['country'], df_countries, allow_unknown=True)
+                df_melted_pca = to_error_bars(
+                    df_melted_pca.merge(
+                        df_score_intervals[['country_id', 'Year', 'PC軸', 'lower', 'upper']],
+                        on=['country_id', 'Year', 'PC軸'],
+                        how='left'
+                    ),
+                    value_col='PCスコア'
+                )
+                error_kwargs = dict(error_y='error_plus', error_y_minus='error_minus')
+
 # グラフの描画
     
     pc_color_map = {
@@ -95,7 +335,8 @@ def page_action_trend_timeseries():
             line_group='PC軸_ラベル',
             title=f"{country}: 各PCスコアの経年変化（{min_year}年〜{max_year}年）",
             labels={'PCスコア': 'PCスコア (0が平均)', 'Year': '年'},
-            color_discrete_map=pc_color_map
+            color_discrete_map=pc_color_map,
+            **error_kwargs
         )
         
         fig_ts.update_xaxes(tickformat='d')
@@ -137,4 +378,5 @@ def page_action_trend_timeseries():
 
 # ページ関数を実行
 if 'df_pca_scores' in st.session_state:
-    page_action_trend_timeseries()
\ No newline at end of file
+    with profile_rerun("0320_行動傾向の推移"):
+        page_action_trend_timeseries()
\ No newline at end of file
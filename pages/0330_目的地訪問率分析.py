@@ -2,6 +2,8 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
+from app.profiling import profile_rerun
+from app.concentration import compute_concentration, compute_lorenz_curves
 
 if 'df_destination_pivot' not in st.session_state:
     st.error("必要なデータ (df_destination_pivot) がロードされていません。")
@@ -9,6 +11,100 @@ if 'df_destination_pivot' not in st.session_state:
 
 df_destination_pivot = st.session_state.get('df_destination_pivot', pd.DataFrame())
 
+def render_concentration_panel(selected_year):
+    """
+    訪問率の都道府県間の集中度（ジニ係数・HHI・TOP5/TOP10シェア）の推移と、ローレンツ曲線を表示する。
+    """
+    st.subheader("訪問先の集中度の推移")
+
+    df_concentration = compute_concentration(df_destination_pivot)
+    df_lorenz = compute_lorenz_curves(df_destination_pivot)
+
+    col_index, col_share = st.columns(2)
+
+    with col_index:
+        df_index_melted = (
+            df_concentration[['gini', 'hhi_normalized']]
+            .rename(columns={'gini': 'ジニ係数', 'hhi_normalized': 'HHI（正規化）'})
+            .rename_axis('年')
+            .reset_index()
+            .melt(id_vars='年', var_name='指標', value_name='値')
+        )
+        fig_index = px.line(
+            df_index_melted,
+            x='年',
+            y='値',
+            color='指標',
+            markers=True,
+            title="ジニ係数・HHIの推移（高いほど特定の都道府県に集中）",
+            height=420
+        )
+        fig_index.update_xaxes(tickformat='d')
+        st.plotly_chart(fig_index, use_container_width=True)
+
+    with col_share:
+        df_share_melted = (
+            (df_concentration[['top5_share', 'top10_share']] * 100)
+            .rename(columns={'top5_share': 'TOP5シェア', 'top10_share': 'TOP10シェア'})
+            .rename_axis('年')
+            .reset_index()
+            .melt(id_vars='年', var_name='指標', value_name='シェア (%)')
+        )
+        fig_share = px.line(
+            df_share_melted,
+            x='年',
+            y='シェア (%)',
+            color='指標',
+            markers=True,
+            title="上位都道府県が訪問率合計に占めるシェアの推移",
+            height=420
+        )
+        fig_share.update_xaxes(tickformat='d')
+        st.plotly_chart(fig_share, use_container_width=True)
+
+    # ローレンツ曲線（選択年・前年・2019年）
+    compare_years = [y for y in [selected_year, selected_year - 1, 2019] if y in df_destination_pivot.index]
+    compare_years = list(dict.fromkeys(compare_years))
+    df_lorenz_plot = df_lorenz[df_lorenz['period'].isin(compare_years)].copy()
+    df_lorenz_plot['年'] = df_lorenz_plot['period'].astype(str) + '年'
+
+    fig_lorenz = px.line(
+        df_lorenz_plot,
+        x='cum_population_share',
+        y='cum_value_share',
+        color='年',
+        markers=True,
+        title="ローレンツ曲線（訪問率の低い都道府県から累積）",
+        labels={'cum_population_share': '都道府県の累積比率', 'cum_value_share': '訪問率の累積比率'},
+        height=500
+    )
+    fig_lorenz.add_shape(type='line', x0=0, y0=0, x1=1, y1=1, line=dict(color='gray', dash='dash'))
+    fig_lorenz.update_layout(xaxis=dict(tickformat='.0%'), yaxis=dict(tickformat='.0%'))
+    st.plotly_chart(fig_lorenz, use_container_width=True)
+
+    st.dataframe(
+        df_concentration[['n_units', 'gini', 'hhi', 'hhi_normalized', 'top5_share', 'top10_share']]
+        .rename_axis('年')
+        .sort_index(ascending=False)
+        .style.format({
+            'gini': '{:.3f}', 'hhi': '{:.4f}', 'hhi_normalized': '{:.4f}',
+            'top5_share': '{:.1%}', 'top10_share': '{:.1%}'
+        }),
+        use_container_width=True
+    )
+
+    st.markdown(
+        """
+        <p style='font-size: small; color: #888888;'>
+        ※各年の都道府県別訪問率の分布を対象に算出しています（訪問率は複数回答のため、合計は100%になりません）。<br>
+        ※HHI（正規化）は、都道府県数の違いによる影響を除くため 0（均等）〜1（1都道府県に集中）に正規化した値です。<br>
+        ※ローレンツ曲線が対角線（均等分布）から離れるほど、訪問先が特定の都道府県に集中していることを示します。
+        </p>
+        """,
+        unsafe_allow_html=True
+    )
+
+
 def page_destination_analysis():
     st.header("目的地訪問率分析（都道府県別）")
     
@@ -458,6 +554,10 @@ def page_destination_analysis():
                 st.info(f"2019年 ({pre_covid_year}年) のデータが存在しないか、または構成比が2019年を上回る都道府県がありません。")
 
             
+    st.markdown("---")
+
+    render_concentration_panel(selected_year)
+
     st.markdown("---")
     
     # ------------------------------------
@@ -583,4 +683,5 @@ def page_destination_analysis():
 
 # ページ関数を実行
 if 'df_destination_pivot' in st.session_state:
-    page_destination_analysis()
\ No newline at end of file
+    with profile_rerun("0330_目的地訪問率分析"):
+        page_destination_analysis()
\ No newline at end of file
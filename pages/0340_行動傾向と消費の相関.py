@@ -0,0 +1,171 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+from app.profiling import profile_rerun
+from app.correlation import (
+    build_behavior_spend_table, compute_correlation_matrix, get_significance_mark, find_strongest_pair,
+    CORRELATION_METHODS, MIN_OBSERVATIONS, PC_COLUMNS
+)
+
+if 'df_pca_scores' not in st.session_state or 'df_avg_spend' not in st.session_state:
+    st.error("必要なデータがロードされていません。Homeに戻ってデータロードを確認してください。")
+    st.stop()
+
+df_pca_scores = st.session_state.df_pca_scores
+df_avg_spend = st.session_state.df_avg_spend
+df_market_potential_yearly = st.session_state.df_market_potential_yearly
+get_pc_label = st.session_state.get_pc_label
+
+
+def get_item_label(column):
+    if column.endswith('_ratio'):
+        return column.replace('_ratio', '') + ' 構成比'
+    return column
+
+
+def render_correlation_heatmap(correlation, method_label):
+    """
+    PC × 消費項目 の相関係数をヒートマップで表示する（セルに係数と有意水準の記号を表示）。
+    """
+    df_r = correlation['r']
+    df_text = df_r.map(lambda r: f"{r:+.2f}" if pd.notna(r) else '') + correlation['p'].map(get_significance_mark)
+
+    fig = go.Figure(go.Heatmap(
+        z=df_r.to_numpy(),
+        x=[get_item_label(col) for col in df_r.columns],
+        y=[get_pc_label(pc) for pc in df_r.index],
+        text=df_text.to_numpy(),
+        texttemplate="%{text}",
+        customdata=np.dstack([correlation['p'].to_numpy(), correlation['n'].to_numpy()]),
+        hovertemplate="%{y}<br>%{x}<br>相関係数: %{z:.3f}<br>p値: %{customdata[0]:.4f}<br>観測数: %{customdata[1]}<extra></extra>",
+        colorscale='RdBu_r',
+        zmid=0,
+        zmin=-1,
+        zmax=1,
+        colorbar=dict(title='相関係数')
+    ))
+    fig.update_layout(
+        title=f"行動傾向（PC）× 消費項目 の相関係数（{method_label}）",
+        height=400,
+        xaxis=dict(tickangle=-30)
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def render_correlation_drilldown(df_joined, correlation, item_columns):
+    """
+    選択した PC と消費項目について、国 × 年 の散布図と回帰直線を表示する。
+    """
+    st.subheader("組み合わせの詳細")
+
+    pc_options = correlation['r'].index.tolist()
+    strongest = find_strongest_pair(correlation)
+    default_pc, default_item = strongest if strongest is not None else (pc_options[0], item_columns[0])
+
+    col_pc, col_item = st.columns(2)
+    with col_pc:
+        selected_pc = st.selectbox(
+            "PC軸", pc_options, index=pc_options.index(default_pc), format_func=get_pc_label, key='correlation_pc_key'
+        )
+    with col_item:
+        selected_item = st.selectbox(
+            "消費項目", item_columns, index=item_columns.index(default_item), format_func=get_item_label, key='correlation_item_key',
+            help="初期値は相関係数の絶対値が最大の組み合わせです。"
+        )
+
+    r = correlation['r'].loc[selected_pc, selected_item]
+    p = correlation['p'].loc[selected_pc, selected_item]
+    n = correlation['n'].loc[selected_pc, selected_item]
+
+    col_r, col_p, col_n = st.columns(3)
+    col_r.metric("相関係数", f"{r:+.3f}" if pd.notna(r) else "データなし")
+    col_p.metric("p値", f"{p:.4f}" if pd.notna(p) else "データなし")
+    col_n.metric("観測数（国 × 年）", f"{n:,}")
+
+    df_plot = df_joined[['country', 'year', selected_pc, selected_item]].dropna()
+    if df_plot.empty:
+        st.info("表示できるデータがありません。")
+        return
+
+    item_label = get_item_label(selected_item)
+    fig = px.scatter(
+        df_plot,
+        x=selected_pc,
+        y=selected_item,
+        color='country',
+        hover_name='country',
+        hover_data={'year': True},
+        title=f"{get_pc_label(selected_pc)} × {item_label}",
+        labels={selected_pc: get_pc_label(selected_pc), selected_item: item_label, 'country': '国・地域', 'year': '年'},
+        height=550
+    )
+
+    # 全ての国 × 年 に対する単回帰直線
+    if len(df_plot) >= 2 and df_plot[selected_pc].nunique() > 1:
+        slope, intercept = np.polyfit(df_plot[selected_pc], df_plot[selected_item], 1)
+        x_line = np.array([df_plot[selected_pc].min(), df_plot[selected_pc].max()])
+        fig.add_trace(go.Scatter(
+            x=x_line,
+            y=intercept + slope * x_line,
+            mode='lines',
+            line=dict(color='gray', dash='dash'),
+            name='回帰直線'
+        ))
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def page_behavior_spend_correlation():
+    st.header("行動傾向と消費の相関")
+    st.markdown("""
+        旅行中の行動傾向（PCAスコア）と、費目・細目別の消費単価および費目構成比の関係を、国 × 年 のデータで確認します。
+    """)
+
+    df_joined, metric_columns = build_behavior_spend_table(df_pca_scores, df_avg_spend, df_market_potential_yearly)
+    pc_columns = [col for col in PC_COLUMNS if col in df_joined.columns]
+    if df_joined.empty or not pc_columns:
+        st.warning("行動傾向と消費の両方のデータがある国・年がありません。")
+        return
+
+    available_years = sorted(df_joined['year'].unique().tolist())
+
+    col_metric, col_method, col_years = st.columns([1, 1, 2])
+    with col_metric:
+        selected_metric = st.radio("消費の指標", list(metric_columns.keys()), key='correlation_metric_key')
+    with col_method:
+        method_label = st.radio("相関係数", list(CORRELATION_METHODS.keys()), key='correlation_method_key')
+    with col_years:
+        selected_years = st.multiselect("対象年", available_years, default=available_years, key='correlation_years_key')
+
+    if not selected_years:
+        st.info("対象年を1つ以上選択してください。")
+        return
+
+    df_selected = df_joined[df_joined['year'].isin(selected_years)].reset_index(drop=True)
+    item_columns = metric_columns[selected_metric]
+    correlation = compute_correlation_matrix(df_selected, pc_columns, item_columns, CORRELATION_METHODS[method_label])
+
+    render_correlation_heatmap(correlation, method_label)
+
+    st.markdown("---")
+    render_correlation_drilldown(df_selected, correlation, item_columns)
+
+    with st.expander("結合データ（国 × 年）を表示"):
+        st.dataframe(df_selected, use_container_width=True, hide_index=True)
+
+    st.markdown(
+        f"""
+        <p style='font-size: small; color: #888888;'>
+        ※各国・地域の年ごとのPCスコアと、同じ年の消費単価（市場ポテンシャル分析と同じ費目・細目）・費目構成比（四半期の年平均）を結合しています。<br>
+        ※p値は無相関の両側 t 検定によるものです（** : p &lt; 0.01, * : p &lt; 0.05）。同じ国の複数年を含むため、観測は独立ではない点に注意してください。<br>
+        ※観測数が{MIN_OBSERVATIONS}未満の組み合わせは表示していません。
+        </p>
+        """,
+        unsafe_allow_html=True
+    )
+
+# ページ関数を実行
+if 'df_pca_scores' in st.session_state and 'df_avg_spend' in st.session_state:
+    with profile_rerun("0340_行動傾向と消費の相関"):
+        page_behavior_spend_correlation()
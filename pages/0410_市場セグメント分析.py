@@ -0,0 +1,245 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+from app.profiling import profile_rerun
+from app.segmentation import (
+    build_segmentation_features, run_segmentation, get_segment_labels_by_year, compute_segment_migrations, K_MIN, K_MAX
+)
+from app.facts import query_facts
+
+if 'df_avg_spend' not in st.session_state or 'fact_store' not in st.session_state:
+    st.error("必要なデータがロードされていません。Homeに戻ってデータロードを確認してください。")
+    st.stop()
+
+# 年間訪日客数は、ファクトストアに 年 × 国 の合計を問い合わせて作成する
+df_jnto_yearly = query_facts(
+    st.session_state.fact_store, 'visitors', 'visitors', by=['year', 'country']
+).rename(columns={'visitors': 'Annual_Visitors'})
+df_avg_spend = st.session_state.df_avg_spend
+df_pca_scores = st.session_state.get('df_pca_scores', pd.DataFrame())
+
+FEATURE_LABELS = {
+    'log_visitors': '訪日客数（対数）',
+    'log_total_spend': '消費単価（対数）',
+}
+
+
+def get_feature_label(feature):
+    if feature in FEATURE_LABELS:
+        return FEATURE_LABELS[feature]
+    if feature.endswith('_ratio'):
+        return feature.replace('_ratio', '') + ' 構成比'
+    return feature
+
+
+def render_segment_map(df_features, df_labels, selected_year):
+    """
+    選択年の国を、訪日客数 × 消費単価 の平面にセグメント別の色で表示する。
+    """
+    df_year = df_features[df_features['year'] == selected_year].merge(df_labels, on=['country', 'year'], how='inner')
+    if df_year.empty:
+        st.info(f"{selected_year}年のセグメントを表示できるデータがありません。")
+        return
+
+    df_year['訪日客数 (人)'] = np.expm1(df_year['log_visitors'])
+    df_year['消費単価 (円)'] = np.exp(df_year['log_total_spend'])
+    df_year['セグメント'] = 'セグメント' + df_year['segment'].astype(str)
+
+    fig = px.scatter(
+        df_year.sort_values('segment'),
+        x='訪日客数 (人)',
+        y='消費単価 (円)',
+        color='セグメント',
+        text='country',
+        hover_name='country',
+        hover_data={col: ':.2f' for col in ['PC1', 'PC2', 'PC3'] if col in df_year.columns},
+        log_x=True,
+        log_y=True,
+        title=f"{selected_year}年 セグメント別の市場ポジション",
+        height=550
+    )
+    fig.update_traces(textposition='top center', marker=dict(size=12))
+    fig.update_xaxes(tickformat=',.0f')
+    fig.update_yaxes(tickformat=',.0f', tickprefix='¥')
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def render_segment_profiles(df_centers):
+    """
+    セグメントの中心（標準化後の値）をヒートマップで表示する。
+    """
+    df_profile = df_centers.copy()
+    df_profile.index = [f"セグメント{s}" for s in df_profile.index]
+    df_profile.columns = [get_feature_label(col) for col in df_profile.columns]
+
+    fig = px.imshow(
+        df_profile,
+        color_continuous_scale='RdBu_r',
+        color_continuous_midpoint=0,
+        text_auto='.2f',
+        aspect='auto',
+        title="セグメントの特徴（各特徴量の標準化後の平均）",
+        labels={'color': '標準化後の値'},
+        height=max(300, 60 * len(df_profile) + 150)
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def render_segment_migration(segmentation, k, available_years):
+    """
+    国 × 年 のセグメント表と、2つの年の間のセグメント移動（サンキー図）を表示する。
+    """
+    st.subheader("セグメント間の移動")
+
+    df_by_year = get_segment_labels_by_year(segmentation, k)
+    st.dataframe(
+        df_by_year.map(lambda s: f"S{int(s)}" if pd.notna(s) else '—'),
+        use_container_width=True
+    )
+
+    if len(available_years) < 2:
+        return
+
+    col_from, col_to = st.columns(2)
+    with col_from:
+        from_year = st.selectbox("比較元の年", available_years, index=len(available_years) - 2, key='segment_from_year_key')
+    with col_to:
+        to_year = st.selectbox("比較先の年", available_years, index=len(available_years) - 1, key='segment_to_year_key')
+
+    if from_year == to_year:
+        st.info("異なる2つの年を選択してください。")
+        return
+
+    df_matrix, df_pair = compute_segment_migrations(segmentation, k, from_year, to_year)
+    if df_pair.empty:
+        st.info("両方の年にデータがある国がありません。")
+        return
+
+    # サンキー図: 左が比較元の年、右が比較先の年のセグメント
+    sources, targets, values = [], [], []
+    for from_segment in df_matrix.index:
+        for to_segment in df_matrix.columns:
+            count = df_matrix.loc[from_segment, to_segment]
+            if count > 0:
+                sources.append(from_segment - 1)
+                targets.append(k + to_segment - 1)
+                values.append(int(count))
+
+    node_labels = [f"{from_year}年 S{s}" for s in range(1, k + 1)] + [f"{to_year}年 S{s}" for s in range(1, k + 1)]
+    fig = go.Figure(go.Sankey(
+        node=dict(label=node_labels, pad=15, thickness=15),
+        link=dict(source=sources, target=targets, value=values)
+    ))
+    fig.update_layout(title=f"セグメントの移動（{from_year}年 → {to_year}年, 国数）", height=450)
+    st.plotly_chart(fig, use_container_width=True)
+
+    df_moved = df_pair[df_pair['from_segment'] != df_pair['to_segment']]
+    if df_moved.empty:
+        st.markdown(f"{from_year}年から{to_year}年にかけてセグメントが変わった国はありません。")
+    else:
+        st.dataframe(
+            df_moved.rename(columns={'country': '国・地域', 'from_segment': f'{from_year}年', 'to_segment': f'{to_year}年'}),
+            use_container_width=True,
+            hide_index=True
+        )
+
+
+def page_market_segmentation():
+    st.header("市場セグメント分析")
+    st.markdown("""
+        国・地域ごとの**訪日客数**、**消費単価と費目構成比**、**旅行中の行動傾向（PC1〜PC3）**を組み合わせて、
+        市場をクラスタリング（KMeans）によりセグメントに分類し、年ごとのセグメント間の移動を確認します。
+    """)
+
+    df_features, feature_groups = build_segmentation_features(df_jnto_yearly, df_avg_spend, df_pca_scores)
+    if df_features.empty:
+        st.warning("セグメント分析に必要なデータが不足しています。データファイルの内容を確認してください。")
+        return
+
+    col_groups, col_k_range = st.columns(2)
+    with col_groups:
+        selected_groups = st.multiselect(
+            "使用する特徴量",
+            list(feature_groups.keys()),
+            default=list(feature_groups.keys()),
+            key='segment_feature_groups_key'
+        )
+    with col_k_range:
+        k_min, k_max = st.slider("試行するセグメント数 (k) の範囲", min_value=2, max_value=12, value=(K_MIN, K_MAX), key='segment_k_range_key')
+
+    if not selected_groups:
+        st.info("使用する特徴量を1つ以上選択してください。")
+        return
+
+    segmentation = run_segmentation(df_features, {g: feature_groups[g] for g in selected_groups}, k_min, k_max)
+    if segmentation is None:
+        st.warning("選択した特徴量でクラスタリングできるデータが不足しています。")
+        return
+
+    # 品質指標
+    st.subheader("セグメント数の評価")
+    col_score_chart, col_score_table = st.columns([3, 2])
+    with col_score_chart:
+        fig_scores = px.line(
+            segmentation['scores'],
+            x='k',
+            y='silhouette',
+            markers=True,
+            title="シルエット係数（大きいほど分離が良い）",
+            labels={'k': 'セグメント数 (k)', 'silhouette': 'シルエット係数'},
+            height=350
+        )
+        st.plotly_chart(fig_scores, use_container_width=True)
+    with col_score_table:
+        st.dataframe(
+            segmentation['scores'].style.format({
+                'silhouette': "{:.3f}",
+                'calinski_harabasz': "{:,.1f}",
+                'davies_bouldin': "{:.3f}",
+                'inertia': "{:,.1f}",
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+
+    k_options = segmentation['scores']['k'].tolist()
+    selected_k = st.selectbox(
+        "表示するセグメント数 (k)",
+        k_options,
+        index=k_options.index(segmentation['best_k']),
+        key='segment_selected_k_key',
+        help="初期値はシルエット係数が最大の k です。"
+    )
+
+    st.markdown("---")
+
+    df_labels = segmentation['labels'][selected_k]
+    available_years = sorted(df_labels['year'].unique().tolist())
+
+    col_map, col_profile = st.columns(2)
+    with col_map:
+        selected_year = st.selectbox("表示する年", available_years[::-1], key='segment_year_key')
+        render_segment_map(df_features, df_labels, selected_year)
+    with col_profile:
+        render_segment_profiles(segmentation['centers'][selected_k])
+
+    st.markdown("---")
+    render_segment_migration(segmentation, selected_k, available_years)
+
+    st.markdown(
+        """
+        <p style='font-size: small; color: #888888;'>
+        ※訪日客数はJNTOの年間合計、消費単価・費目構成比は観光庁の四半期データの年平均、行動傾向は行動データのPCAスコアを使用しています。<br>
+        ※全ての年の国・地域をまとめてクラスタリングしているため、セグメントの定義は年によらず共通です（年ごとの所属の変化を比較できます）。<br>
+        ※各特徴量は標準化したうえで、特徴量グループごとの重みが等しくなるよう調整しています。セグメント番号は所属数の多い順です。
+        </p>
+        """,
+        unsafe_allow_html=True
+    )
+
+# ページ関数を実行
+if 'df_avg_spend' in st.session_state and 'fact_store' in st.session_state:
+    with profile_rerun("0410_市場セグメント分析"):
+        page_market_segmentation()